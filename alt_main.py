@@ -1,4 +1,5 @@
 import asyncio
+import multiprocessing
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
@@ -6,15 +7,30 @@ from rich.prompt import Prompt
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.text import Text
 from src.json_manager import load_repository, update_repository
-from src.audio import init_mixer, play_playlist
-from src.sorts import random_sort, album_sort, artist_sort
+from src.sorts import shuffle_stream, album_sort, artist_sort
+from src.library_view import LibraryView, browse_library, format_duration
 
 console = Console()
 
-async def main():
-    # Initialize audio mixer
-    init_mixer()
+def cute_page_table(view, number):
+    # Display one page of the song list in a sparkly table
+    table = Table(
+        title="🎵 Your Cute Songies Wist! 🌟",
+        title_style="bold bright_cyan",
+        border_style="bright_magenta",
+        caption=f"✨ Page {number + 1} of {view.page_count} ✨",
+    )
+    table.add_column("✨ Titwe", style="magenta", no_wrap=True)
+    table.add_column("🎤 Awtist", style="bright_cyan")
+    table.add_column("💿 Awbum", style="bright_yellow")
+    table.add_column("⏳ Timey (sec)", justify="right", style="green")
+
+    for path, metadata in view.page(number):
+        title, album, artist, duration = metadata[:4]
+        table.add_row(title or "Sin titwe >w<", artist or "Unknown awtist", album or "No awbum", f"{duration}")
+    return table
 
+async def main():
     # Super cute welcome message with bunny and daisy ASCII art
     console.print(Panel(
         Text(
@@ -43,24 +59,28 @@ async def main():
         default="n"
     ).lower() == 'y':
         ruta = Prompt.ask("🎀 [bold bright_cyan]Pwease give a path for your music fiwes:[/bold bright_cyan]")
-        await update_repository(ruta.strip())
-        repo = await load_repository()  # Reload after modification
+        repo = await update_repository(ruta.strip(), repo=repo)  # Updates the library and its indexes in place
         console.print("\n🌸 [bold magenta]Yay! Songies added to your wibrary! >w<[/bold magenta]")
     else:
         console.print("\n🌼 [bold bright_cyan]Here’s your cute songies wibrary! >w<[/bold bright_cyan]")
 
-    # Display song list in a sparkly table
-    table = Table(title="🎵 Your Cute Songies Wist! 🌟", title_style="bold bright_cyan", border_style="bright_magenta")
-    table.add_column("✨ Titwe", style="magenta", no_wrap=True)
-    table.add_column("🎤 Awtist", style="bright_cyan")
-    table.add_column("💿 Awbum", style="bright_yellow")
-    table.add_column("⏳ Timey (sec)", justify="right", style="green")
-
-    for path, metadata in repo.items():
-        title, album, artist, duration = metadata
-        table.add_row(title or "Sin titwe >w<", artist or "Unknown awtist", album or "No awbum", f"{duration}")
-
-    console.print(table)
+    # Show how big the wibrary is, and only one page of songies at a time
+    summary = repo.summary()
+    console.print(
+        f"🎵 [bold bright_cyan]{summary.tracks} songies, {summary.albums} awbums, {summary.artists} awtists, "
+        f"{format_duration(summary.duration)} of music! 🌟[/bold bright_cyan]"
+    )
+    if repo and Prompt.ask(
+        "🌼 [bold bright_cyan]Wanna peek at your songies?[/bold bright_cyan] >w<",
+        choices=["y", "n"],
+        default="n"
+    ).lower() == 'y':
+        browse_library(
+            console,
+            LibraryView(repo),
+            render=cute_page_table,
+            question="🎀 [bold bright_cyan]n (next), p (pwevious), 1-4 (sowt by titwe, awtist, awbum, timey), 0 (unsowted), q (done)[/bold bright_cyan]",
+        )
 
     # Check if repository is empty
     if not repo:
@@ -92,32 +112,32 @@ async def main():
         playlist = []
         if mode == "r":
             console.print("\n🌸 [bold magenta]Stawting super cute shuffwe pwayback! >w< 🎶[/bold magenta]")
-            playlist = random_sort(repo)
+            playlist = shuffle_stream(repo)  # Shuffled as it plays, so the first songie starts at once
         elif mode == "a":
-            # Get unique albums
-            albums = sorted({metadata[1] or "No awbum" for metadata in repo.values()})
+            # Album facets come from the repository index, not from a pass over every song
+            albums = repo.index.albums()
             console.print("\n🌼 [bold bright_cyan]Choose an awbum! >w<[/bold bright_cyan]")
             for i, album in enumerate(albums, 1):
-                console.print(f"  [bold magenta]{i}:[/bold magenta] {album}")
+                console.print(f"  [bold magenta]{i}:[/bold magenta] {album.name or 'No awbum'} [dim]({album.tracks} songies)[/dim]")
             choice = Prompt.ask(
                 "Pick an awbum numbew (1-{}) >w<: ".format(len(albums)),
                 choices=[str(i) for i in range(1, len(albums) + 1)]
             )
-            selected_album = albums[int(choice) - 1]
-            console.print(f"\n🌸 [bold magenta]Pwaying aww songies fwom {selected_album}! >w< 🎶[/bold magenta]")
+            selected_album = albums[int(choice) - 1].name
+            console.print(f"\n🌸 [bold magenta]Pwaying aww songies fwom {selected_album or 'No awbum'}! >w< 🎶[/bold magenta]")
             playlist = album_sort(repo, selected_album)
         elif mode == "t":
-            # Get unique artists
-            artists = sorted({metadata[2] or "Unknown awtist" for metadata in repo.values()})
+            # Artist facets come from the repository index, not from a pass over every song
+            artists = repo.index.artists()
             console.print("\n🌼 [bold bright_cyan]Choose an awtist! >w<[/bold bright_cyan]")
             for i, artist in enumerate(artists, 1):
-                console.print(f"  [bold magenta]{i}:[/bold magenta] {artist}")
+                console.print(f"  [bold magenta]{i}:[/bold magenta] {artist.name or 'Unknown awtist'} [dim]({artist.tracks} songies)[/dim]")
             choice = Prompt.ask(
                 "Pick an awtist numbew (1-{}) >w<: ".format(len(artists)),
                 choices=[str(i) for i in range(1, len(artists) + 1)]
             )
-            selected_artist = artists[int(choice) - 1]
-            console.print(f"\n🌸 [bold magenta]Pwaying aww songies by {selected_artist}! >w< 🎶[/bold magenta]")
+            selected_artist = artists[int(choice) - 1].name
+            console.print(f"\n🌸 [bold magenta]Pwaying aww songies by {selected_artist or 'Unknown awtist'}! >w< 🎶[/bold magenta]")
             playlist = artist_sort(repo, selected_artist)
 
         if not playlist:
@@ -130,9 +150,11 @@ async def main():
             TextColumn("[progress.description]{task.description}"),
             console=console
         ) as progress:
-            task = progress.add_task("[magenta]Pwaying songies... 🌼✨", total=len(playlist))
+            task = progress.add_task("[magenta]Pwaying songies... 🌼✨", total=len(repo) if mode == "r" else len(playlist))
+            from src.audio import play_playlist  # Imports pygame and opens the mixer on first use
             await play_playlist(playlist)  # Pass entire playlist to audio.py
             progress.update(task, description="[magenta]Done pwaying aww songies! >w< 🌸")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Required by the extraction process pool in frozen builds
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""
+Times the library pipeline on synthetic libraries and writes the results as JSON.
+
+For every library size, each benchmark is run `--repeat` times and the best and
+mean times are kept, then run once more under `tracemalloc` to measure its peak
+memory. Memory allocated by the extraction worker processes is not included.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+from pathlib import Path
+from statistics import mean
+
+from benchmarks.synthetic_library import generate_library
+from src import json_manager
+from src.files_manager import extract_metadata, find_audio_files
+from src.library import Library
+from src.sorts import album_sort, artist_sort, random_sort
+
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REPEAT = 3
+# extract_metadata runs serially, so it is timed on a sample of the library
+EXTRACT_SAMPLE = 2000
+SORT_CALLS = 100
+
+
+class Context:
+    """
+    What the benchmarks of one library size share: the library and a private repository file.
+    """
+
+    def __init__(self, library_root: str, work_dir: str):
+        self.library_root = library_root
+        self.repo_path = os.path.join(work_dir, "za_repository.json")
+        self.snapshot_path = os.path.join(work_dir, "za_repository.zsnap")
+        self.paths = None
+        self.repo = None
+
+
+def _reset_repository(context: Context) -> None:
+    for suffix in ("", ".journal", ".tmp"):
+        Path(context.repo_path + suffix).unlink(missing_ok=True)
+
+
+async def bench_find_audio_files(context: Context) -> int:
+    context.paths = await find_audio_files(context.library_root)
+    return len(context.paths)
+
+
+async def bench_extract_metadata(context: Context) -> int:
+    sample = context.paths[:EXTRACT_SAMPLE]
+    for path in sample:
+        extract_metadata(path)
+    return len(sample)
+
+
+async def bench_update_repository(context: Context) -> int:
+    _reset_repository(context)
+    context.repo = await json_manager.update_repository(context.library_root, repo=Library())
+    return len(context.repo)
+
+
+async def bench_save_repository(context: Context) -> int:
+    await json_manager.save_repository(context.repo)
+    return len(context.repo)
+
+
+async def bench_load_repository(context: Context) -> int:
+    context.repo = await json_manager.load_repository()
+    return len(context.repo)
+
+
+async def bench_save_snapshot(context: Context) -> int:
+    await json_manager.save_repository(context.repo, context.snapshot_path)
+    return len(context.repo)
+
+
+async def bench_open_snapshot(context: Context) -> int:
+    # Opening maps the snapshot without decoding it, so a few tracks are read too
+    repo = await json_manager.load_repository(context.snapshot_path)
+    for row in range(0, len(repo), max(len(repo) // SORT_CALLS, 1)):
+        repo.item_at(row)
+    return len(repo)
+
+
+async def bench_random_sort(context: Context) -> int:
+    return len(random_sort(context.repo))
+
+
+async def bench_album_sort(context: Context) -> int:
+    albums = [facet.name for facet in context.repo.index.albums()]
+    rng = random.Random(0)
+    return sum(len(album_sort(context.repo, rng.choice(albums))) for _ in range(SORT_CALLS))
+
+
+async def bench_artist_sort(context: Context) -> int:
+    artists = [facet.name for facet in context.repo.index.artists()]
+    rng = random.Random(0)
+    return sum(len(artist_sort(context.repo, rng.choice(artists))) for _ in range(SORT_CALLS))
+
+
+# Run in this order: each benchmark prepares the state the next ones need
+BENCHMARKS = (
+    ("find_audio_files", bench_find_audio_files),
+    ("extract_metadata", bench_extract_metadata),
+    ("update_repository", bench_update_repository),
+    ("save_repository", bench_save_repository),
+    ("load_repository", bench_load_repository),
+    ("save_snapshot", bench_save_snapshot),
+    ("open_snapshot", bench_open_snapshot),
+    ("random_sort", bench_random_sort),
+    ("album_sort", bench_album_sort),
+    ("artist_sort", bench_artist_sort),
+)
+
+
+async def run_benchmark(name: str, benchmark, context: Context, size: int, repeat: int, memory: bool) -> dict:
+    """
+    Runs one benchmark `repeat` times, plus once under `tracemalloc` when `memory` is set.
+
+    Returns:
+        dict: The result record written to the JSON output.
+    """
+    times = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = await benchmark(context)
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            await benchmark(context)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "benchmark": name,
+        "library_size": size,
+        "items": items,
+        "best_seconds": round(best, 6),
+        "mean_seconds": round(mean(times), 6),
+        "items_per_second": round(items / best, 1) if best else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def environment() -> dict:
+    """
+    Describes the machine and the code version the results were measured on.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+async def run(sizes, repeat: int, memory: bool, work_dir: str, only=None) -> dict:
+    """
+    Generates a library for every size and runs the benchmarks on it.
+
+    Returns:
+        dict: The environment and the list of result records.
+    """
+    results = []
+    for size in sizes:
+        print(f"[INFO] Generating a library of {size} tracks...", file=sys.stderr)
+        library_root = generate_library(os.path.join(work_dir, f"library_{size}"), size)
+        context = Context(library_root, os.path.join(work_dir, f"repository_{size}"))
+        os.makedirs(os.path.dirname(context.repo_path), exist_ok=True)
+        json_manager.DEFAULT_REPO_PATH = context.repo_path
+
+        for name, benchmark in BENCHMARKS:
+            if only and name not in only:
+                await benchmark(context)  # Not reported, but later benchmarks depend on its state
+                continue
+            record = await run_benchmark(name, benchmark, context, size, repeat, memory)
+            results.append(record)
+            peak = "" if record["peak_memory_bytes"] is None else f", peak {record['peak_memory_bytes'] / 1e6:.1f} MB"
+            print(
+                f"{size:>8} {name:<18} {record['best_seconds']:>10.4f} s"
+                f" {record['items_per_second'] or 0:>12.0f} items/s{peak}",
+                file=sys.stderr,
+            )
+    return {"environment": environment(), "results": results}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark scanning, extraction, repository I/O and playlists.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="library sizes to generate and measure (default: 1000 10000)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"timed runs per benchmark, the best one is reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--only", nargs="+", choices=[name for name, _ in BENCHMARKS],
+                        help="only report these benchmarks")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "za_player_benchmarks"),
+                        help="where libraries are generated and kept between runs")
+    parser.add_argument("--output", default="-", help="JSON output file (default: standard output)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run(args.sizes, args.repeat, not args.no_memory, args.work_dir, args.only))
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Generates synthetic music libraries made of tiny, tagged WAV, FLAC and MP3 files.
+
+Only the standard library is used, so the files do not depend on the tagging
+code under test. Every file holds a fraction of a second of silence and real
+title, artist and album tags, laid out as <root>/<artist>/<album>/<nn> <title>.<ext>.
+
+Usage:
+    python -m benchmarks.synthetic_library DEST --tracks 10000
+"""
+
+import os
+import struct
+import argparse
+from pathlib import Path
+
+FORMATS = ("wav", "flac", "mp3")
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 4
+SAMPLE_RATE = 8000
+SILENCE_SECONDS = 0.25
+
+# Written once the whole library exists, so an interrupted generation is redone
+COMPLETE_MARKER = ".complete"
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes(((value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F))
+
+
+def id3_tag(title: str, album: str, artist: str) -> bytes:
+    """
+    Builds an ID3v2.4 tag with UTF-8 TIT2, TALB and TPE1 frames.
+    """
+    frames = b""
+    for frame_id, text in ((b"TIT2", title), (b"TALB", album), (b"TPE1", artist)):
+        payload = b"\x03" + text.encode("utf-8")
+        frames += frame_id + _syncsafe(len(payload)) + b"\x00\x00" + payload
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frames)) + frames
+
+
+def wav_file(title: str, album: str, artist: str) -> bytes:
+    """
+    Builds an 8-bit mono PCM WAV file with its tags in an "id3 " chunk.
+    """
+    samples = int(SAMPLE_RATE * SILENCE_SECONDS)
+    fmt = struct.pack("<HHIIHH", 1, 1, SAMPLE_RATE, SAMPLE_RATE, 1, 8)
+    tag = id3_tag(title, album, artist)
+    if len(tag) % 2:
+        tag += b"\x00"  # RIFF chunks are word aligned
+    chunks = (
+        b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"data" + struct.pack("<I", samples) + b"\x80" * samples
+        + b"id3 " + struct.pack("<I", len(tag)) + tag
+    )
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+def flac_file(title: str, album: str, artist: str) -> bytes:
+    """
+    Builds a FLAC header: a STREAMINFO block announcing the samples and a VORBIS_COMMENT block.
+
+    No audio frames are written, tag readers only need the metadata blocks.
+    """
+    samples = int(SAMPLE_RATE * SILENCE_SECONDS)
+    # Sample rate (20 bits), channels - 1 (3 bits), bits per sample - 1 (5 bits), total samples (36 bits)
+    packed = (SAMPLE_RATE << 44) | (0 << 41) | (15 << 36) | samples
+    streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00" * 6 + packed.to_bytes(8, "big") + b"\x00" * 16
+
+    vendor = b"za-player benchmarks"
+    comments = [f"TITLE={title}", f"ALBUM={album}", f"ARTIST={artist}"]
+    vorbis = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        data = comment.encode("utf-8")
+        vorbis += struct.pack("<I", len(data)) + data
+
+    def block(block_type: int, data: bytes, last: bool) -> bytes:
+        return bytes((block_type | (0x80 if last else 0),)) + len(data).to_bytes(3, "big") + data
+
+    return b"fLaC" + block(0, streaminfo, False) + block(4, vorbis, True)
+
+
+def mp3_file(title: str, album: str, artist: str) -> bytes:
+    """
+    Builds an MP3 file: an ID3v2.4 tag followed by silent MPEG-1 Layer III frames.
+    """
+    # 128 kbps, 44.1 kHz, no padding: 417 bytes per frame of 1152 samples
+    header = bytes((0xFF, 0xFB, 0x90, 0x64))
+    frames = int(44100 * SILENCE_SECONDS / 1152) + 1
+    return id3_tag(title, album, artist) + (header + b"\x00" * 413) * frames
+
+
+BUILDERS = {"wav": wav_file, "flac": flac_file, "mp3": mp3_file}
+
+
+def track_layout(number: int) -> tuple[str, str, str, str]:
+    """
+    Returns the (relative path, title, album, artist) of the n-th synthetic track.
+    """
+    album_number, track_number = divmod(number, TRACKS_PER_ALBUM)
+    artist_number = album_number // ALBUMS_PER_ARTIST
+    artist = f"Artist {artist_number:05d}"
+    album = f"Album {album_number:06d}"
+    title = f"Song {number:07d}"
+    extension = FORMATS[number % len(FORMATS)]
+    relative = os.path.join(artist, album, f"{track_number + 1:02d} {title}.{extension}")
+    return relative, title, album, artist
+
+
+def generate_library(root: str, tracks: int) -> str:
+    """
+    Creates a synthetic library of `tracks` files under `root`, unless it already exists.
+
+    Args:
+        root (str): The directory to create the library in.
+        tracks (int): Number of audio files.
+
+    Returns:
+        str: The resolved path of the library.
+    """
+    root_path = Path(root).resolve()  # Normalize path for Windows compatibility
+    marker = root_path / COMPLETE_MARKER
+    if marker.exists() and marker.read_text().strip() == str(tracks):
+        return str(root_path)
+
+    for number in range(tracks):
+        relative, title, album, artist = track_layout(number)
+        file_path = root_path / relative
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(BUILDERS[file_path.suffix[1:]](title, album, artist))
+
+    marker.write_text(str(tracks))
+    return str(root_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic, tagged music library.")
+    parser.add_argument("dest", help="directory to create the library in")
+    parser.add_argument("--tracks", type=int, default=1000, help="number of audio files (default: 1000)")
+    args = parser.parse_args()
+    print(generate_library(args.dest, args.tracks))
@@ -1,20 +1,305 @@
+import time
+STARTED = time.perf_counter()  # Taken before any other import, for --profile-startup
+
+import os
+import sys
+import random
+import argparse
 import asyncio
+import multiprocessing
+from functools import partial
 from rich.console import Console
 from rich.panel import Panel
-from rich.table import Table
 from rich.prompt import Prompt
 from rich.text import Text
-from src.json_manager import load_repository, update_repository
-from src.audio_linux import init_mixer, play_playlist
-from src.sorts import random_sort, album_sort, artist_sort
+from src.sorts import shuffle_stream, album_sort, artist_sort
+from src.search import load_search_index
+from src.library_view import LibraryView, browse_library, summary_table
+from src.startup_profile import StartupProfile
+from src.playlist_files import load_playlist, write_m3u
+from src.queue_store import QueueStore
+from src import metrics
+# pygame is only imported by src.audio_linux, on the first playback
 
 console = Console()
+profile = StartupProfile(STARTED)
+profile.record("imports", STARTED)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="A minimalist audio player for your music collection.")
+    parser.add_argument(
+        "--rescan",
+        metavar="PATH",
+        help="re-read changed files, drop deleted ones and track moved ones under PATH, then exit",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="run a headless player controlled through a local socket (see --control), until stopped",
+    )
+    parser.add_argument(
+        "--control",
+        metavar="COMMAND",
+        help="send COMMAND (play [PATH], pause, skip, queue [PATH], status) to a running daemon, then exit",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="control socket of the daemon (default: ~/za_player/za_player.sock)",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="PATH",
+        nargs="+",
+        help="keep the library in sync with the files under PATH, adding, updating and "
+             "removing songs as they change, until Ctrl+C",
+    )
+    parser.add_argument(
+        "--import-playlist",
+        metavar="FILE",
+        help="make the M3U/M3U8 playlist FILE the saved queue, played by the 'continue' mode, then exit",
+    )
+    parser.add_argument(
+        "--export-playlist",
+        metavar="FILE",
+        help="write the saved queue to the M3U/M3U8 playlist FILE, then exit",
+    )
+    parser.add_argument(
+        "--duplicates",
+        action="store_true",
+        help="list the songs stored more than once under different paths, then exit",
+    )
+    parser.add_argument(
+        "--merge-duplicates",
+        action="store_true",
+        help="keep a single library entry for every song stored more than once, then exit; "
+             "files are not deleted",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["json", "sqlite", "sharded", "snapshot"],
+        default="json",
+        help="storage used for the song library (default: json); sharded keeps every "
+             "library folder in its own file and loads only the ones in use; snapshot maps "
+             "a binary file in memory and reads songs as they are used",
+    )
+    parser.add_argument(
+        "--to-snapshot",
+        action="store_true",
+        help="convert the JSON library into the binary snapshot used by --backend snapshot, then exit",
+    )
+    parser.add_argument(
+        "--to-json",
+        action="store_true",
+        help="convert the binary snapshot used by --backend snapshot back into the JSON library, then exit",
+    )
+    parser.add_argument(
+        "--roots",
+        nargs="+",
+        metavar="PATH",
+        help="with the sharded backend, load only the library folders holding or under PATH",
+    )
+    parser.add_argument(
+        "--analyze-loudness",
+        action="store_true",
+        help="measure the loudness of the songs not analysed yet, then exit; "
+             "can be interrupted and resumed",
+    )
+    parser.add_argument(
+        "--build-waveforms",
+        action="store_true",
+        help="compute the waveform of the songs that have none yet, then exit; "
+             "can be interrupted and resumed",
+    )
+    parser.add_argument(
+        "--waveform",
+        metavar="FILE",
+        help="draw the waveform of the song FILE from the ones computed by --build-waveforms, then exit",
+    )
+    parser.add_argument(
+        "--analysis-workers",
+        metavar="N",
+        type=int,
+        default=1,
+        help="worker processes used by --analyze-loudness and --build-waveforms (default: 1)",
+    )
+    parser.add_argument(
+        "--analysis-rate",
+        metavar="SONGS",
+        type=float,
+        help="analyse at most SONGS songs per second, to leave room for playback (default: no limit)",
+    )
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="play every song at the same loudness, using the results of --analyze-loudness",
+    )
+    parser.add_argument(
+        "--gapless",
+        action="store_true",
+        help="queue the next song while the current one plays, so there is no silence between them",
+    )
+    parser.add_argument(
+        "--fade",
+        metavar="SECONDS",
+        type=float,
+        default=0.0,
+        help="fade each song out, then the next one in, over SECONDS (default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--spread",
+        action="store_true",
+        help="in random playback, keep songs of the same artist or album apart",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="show how long each startup phase took once the library is loaded",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="record scan, extraction, repository and playback metrics and write them to FILE "
+             "on exit, as JSON for a .json file and in the Prometheus text format otherwise",
+    )
+    return parser.parse_args()
+
+async def main(args):
+    if args.control:
+        from src.daemon import DEFAULT_SOCKET_PATH, send_command
+        try:
+            response = await send_command(args.control, args.socket or DEFAULT_SOCKET_PATH)
+        except OSError as e:
+            console.print(f"[red]No player daemon is listening: {e}[/red]")
+            return
+        console.print_json(data=response)
+        return
+
+    # All storage backends expose the same load/update/rescan/record_changes API
+    with profile.phase("backend import"):
+        if args.backend == "sqlite":
+            from src import sqlite_manager as repository
+        elif args.backend == "sharded":
+            from src import shard_manager as repository
+        elif args.backend == "snapshot":
+            from src import snapshot_manager as repository
+        else:
+            from src import json_manager as repository
+    if args.backend == "sharded" and args.roots:
+        roots = [path.strip() for path in args.roots]
+        load_repository = partial(repository.load_repository, roots)
+        repository_signature = partial(repository.repository_signature, roots)
+    else:
+        load_repository = repository.load_repository
+        repository_signature = repository.repository_signature
+
+    # Non-interactive maintenance tasks
+    if args.to_snapshot or args.to_json:
+        from src.snapshot_manager import json_to_snapshot, snapshot_to_json
+        if args.to_snapshot:
+            count = await json_to_snapshot()
+        else:
+            count = await snapshot_to_json()
+        console.print(f"[blue]{count} songs converted.[/blue]")
+        return
+    if args.rescan:
+        await repository.rescan_repository(args.rescan.strip())
+        return
+    if args.analyze_loudness:
+        from src.loudness import analyze_library
+        repo = await load_repository()
+        console.print("[blue]Analysing loudness, press Ctrl+C to stop and resume later.[/blue]")
+        analysed = await analyze_library(repo, max(args.analysis_workers, 1), args.analysis_rate)
+        console.print(f"[blue]{analysed} songs analysed.[/blue]")
+        return
+    if args.build_waveforms:
+        from src.waveforms import build_waveforms
+        repo = await load_repository()
+        console.print("[blue]Computing waveforms, press Ctrl+C to stop and resume later.[/blue]")
+        built = await build_waveforms(repo, max(args.analysis_workers, 1), args.analysis_rate)
+        console.print(f"[blue]{built} waveforms computed.[/blue]")
+        return
+    if args.waveform:
+        from src.waveforms import WaveformStore, render_waveform
+        peaks = WaveformStore.load().peaks(os.path.abspath(args.waveform.strip()))
+        if peaks is None:
+            console.print("[red]This song has no waveform yet, run --build-waveforms first.[/red]")
+            return
+        console.print(render_waveform(peaks, console.width), highlight=False)
+        return
+    volume = None
+    if args.normalize:
+        from src.loudness import LoudnessStore
+        volume = (await asyncio.to_thread(LoudnessStore.load)).volume
+    if args.daemon:
+        if sys.platform == "win32":
+            console.print("[red]The daemon needs Unix domain sockets, which are not available on Windows.[/red]")
+            return
+        from src.daemon import DEFAULT_SOCKET_PATH, PlayerDaemon
+        from src.waveforms import DEFAULT_WAVEFORMS_PATH, WaveformStore
+        repo = await load_repository()
+        waveforms = WaveformStore.load() if os.path.exists(DEFAULT_WAVEFORMS_PATH) else None
+        try:
+            await PlayerDaemon(repo, args.socket or DEFAULT_SOCKET_PATH, volume, waveforms).run()
+        except RuntimeError as e:
+            console.print(f"[red]{e}[/red]")
+        return
+    if args.watch:
+        from src.watcher import watch_repository
+        console.print("[blue]Watching your music folders, press Ctrl+C to stop.[/blue]")
+        roots = [path.strip() for path in args.watch]
+        if args.backend == "sharded":
+            # Changes are only saved under a library root, where paths are stored resolved
+            try:
+                roots = [await repository.claim_root(path) for path in roots]
+            except OSError as e:
+                console.print(f"[red]Could not watch this folder: {e}[/red]")
+                return
+        await watch_repository(repository, roots)
+        return
+    if args.import_playlist or args.export_playlist:
+        repo = await load_repository()
+        queue = QueueStore()
+        if args.import_playlist:
+            try:
+                tracks, missing = await asyncio.to_thread(load_playlist, args.import_playlist.strip(), repo)
+            except OSError as e:
+                console.print(f"[red]Could not read the playlist: {e}[/red]")
+                return
+            queue.new_queue()
+            count = await asyncio.to_thread(queue.save, tracks, repo)
+            queue.close()
+            console.print(f"[blue]{count} songs imported into the queue, {missing} not found.[/blue]")
+        else:
+            if not queue.load():
+                console.print("[red]There is no saved queue to export.[/red]")
+                return
+            count = await asyncio.to_thread(
+                write_m3u, args.export_playlist.strip(), queue.tracks(0, repo), repo, absolute=True,
+            )
+            console.print(f"[blue]{count} songs exported.[/blue]")
+        return
+    if args.duplicates or args.merge_duplicates:
+        from src.duplicates import find_duplicates, merge_duplicates
+        repo = await load_repository()
+        duplicates = await find_duplicates(repo)
+        for group in duplicates:
+            title, album, artist = repo[group.paths[0]][:3]
+            console.print(f"[bold]{title}[/bold] [dim]- {artist} - {album} ({group.wasted_bytes / 1e6:.1f} MB)[/dim]")
+            for path in group.paths:
+                console.print(f"  {path}")
+        wasted = sum(group.wasted_bytes for group in duplicates)
+        console.print(f"\n[blue]{len(duplicates)} duplicated songs, {wasted / 1e6:.1f} MB wasted.[/blue]")
+        if args.merge_duplicates and duplicates:
+            merged = await merge_duplicates(repo, duplicates, repository.record_changes)
+            console.print(f"[blue]{merged} duplicate entries removed from the library.[/blue]")
+        return
 
-async def main():
-    # Initialize audio mixer
-    init_mixer()
+    # Load repository while the banner and the first prompts are shown
+    load_task = asyncio.create_task(profile.measure("repository load", load_repository()))
 
     # Welcome banner
+    banner_start = time.perf_counter()
     console.print(Panel(
         Text(
             "ZA-PLAYER\n"
@@ -27,35 +312,36 @@ async def main():
         border_style="blue",
         padding=(1, 2)
     ))
+    profile.record("banner", banner_start)
+    profile.record("ready for the first prompt", profile.started)
 
-    # Load repository
-    repo = await load_repository()
-
-    # Prompt for adding songs
-    if Prompt.ask(
+    # Prompts wait for input in a thread, so the repository keeps loading meanwhile
+    add_songs = await asyncio.to_thread(
+        Prompt.ask,
         "[blue]Would you like to add songs?[/blue]",
         choices=["y", "n"],
         default="n"
-    ).lower() == 'y':
-        ruta = Prompt.ask("[blue]Enter the path to your audio files:[/blue]")
-        await update_repository(ruta.strip())
-        repo = await load_repository()  # Reload after modification
+    )
+    if add_songs.lower() == 'y':
+        ruta = await asyncio.to_thread(Prompt.ask, "[blue]Enter the path to your audio files:[/blue]")
+        repo = await load_task
+        repo = await repository.update_repository(ruta.strip(), repo=repo)  # Updates the library and its indexes in place
         console.print("\n[blue]Repository updated successfully.[/blue]")
     else:
+        repo = await load_task
         console.print("\n[blue]Current song library:[/blue]")
 
-    # Display song list in a table
-    table = Table(title="Song Library", title_style="bold blue", border_style="dim")
-    table.add_column("Title", style="white")
-    table.add_column("Artist", style="grey78")
-    table.add_column("Album", style="grey78")
-    table.add_column("Duration (sec)", justify="right", style="white")
-
-    for path, metadata in repo.items():
-        title, album, artist, duration = metadata
-        table.add_row(title or "Unknown", artist or "Unknown", album or "Unknown", f"{duration}")
-
-    console.print(table)
+    # Only the library summary is shown up front, so startup does not depend on its size
+    with profile.phase("library summary"):
+        console.print(summary_table(await asyncio.to_thread(repo.summary)))
+    if args.profile_startup:
+        console.print(profile.report())
+    if repo and Prompt.ask(
+        "[blue]Would you like to browse your songs?[/blue]",
+        choices=["y", "n"],
+        default="n"
+    ).lower() == 'y':
+        browse_library(console, LibraryView(repo))
 
     # Check if repository is empty
     if not repo:
@@ -73,55 +359,146 @@ async def main():
             "r": "Random shuffle",
             "a": "By album",
             "t": "By artist",
+            "s": "Search",
+            "l": "Load a playlist file (M3U/M3U8)",
         }
+        def duration(path):
+            # Fades are timed with the stored duration instead of reading the file again
+            entry = repo.get(path)
+            return entry[3] if entry is not None else None
+
+        queue = QueueStore()
+        if queue.load():
+            modes["c"] = f"Continue where you left off (song {queue.index + 1})"
         mode = Prompt.ask(
             "[blue]Select playback mode:[/blue]\n"
-            f"  [bold]r:[/bold] {modes['r']}\n"
-            f"  [bold]a:[/bold] {modes['a']}\n"
-            f"  [bold]t:[/bold] {modes['t']}\n"
-            "Enter mode: ",
-            choices=["r", "a", "t"],
-            default="r"
+            + "".join(f"  [bold]{key}:[/bold] {label}\n" for key, label in modes.items())
+            + "Enter mode: ",
+            choices=list(modes),
+            default="c" if "c" in modes else "r"
         ).lower()
 
         playlist = []
-        if mode == "r":
+        seed = None
+        if mode == "c":
+            console.print(f"\n[blue]Resuming at song {queue.index + 1}.[/blue]")
+            from src.audio_linux import play_playlist  # Imports pygame and opens the mixer on first use
+            try:
+                await play_playlist(
+                    queue.tracks(repo=repo), gapless=args.gapless, fade=args.fade,
+                    start=queue.offset, progress=queue.progress, volume=volume, duration=duration,
+                )
+            finally:
+                queue.close()
+            console.print("[blue]Playback completed.[/blue]")
+            return
+        elif mode == "r":
             console.print("\n[blue]Starting random playback.[/blue]")
-            playlist = random_sort(repo)
+            # Tracks are shuffled as they play, so the first one starts at once
+            seed = random.getrandbits(64)
+            playlist = shuffle_stream(repo, spread=args.spread, rng=random.Random(seed))
+        elif mode == "l":
+            path = Prompt.ask("[blue]Enter the path to the playlist file[/blue]").strip()
+            try:
+                playlist, missing = await asyncio.to_thread(load_playlist, path, repo)
+            except OSError as e:
+                console.print(f"\n[red]Could not read the playlist: {e}[/red]")
+                return
+            if missing:
+                console.print(f"\n[yellow]{missing} songs of the playlist were not found.[/yellow]")
         elif mode == "a":
-            # Get unique albums
-            albums = sorted({metadata[1] or "Unknown" for metadata in repo.values()})
+            # Album facets come from the repository index, not from a pass over every song
+            if args.backend == "sqlite":
+                albums = await repository.albums()
+            else:
+                albums = repo.index.albums()
             console.print("\n[blue]Available albums:[/blue]")
             for i, album in enumerate(albums, 1):
-                console.print(f"  [bold]{i}:[/bold] {album}")
+                console.print(f"  [bold]{i}:[/bold] {album.name or 'Unknown'} [dim]({album.tracks} songs)[/dim]")
             choice = Prompt.ask(
                 f"Select album number (1-{len(albums)}): ",
                 choices=[str(i) for i in range(1, len(albums) + 1)]
             )
-            selected_album = albums[int(choice) - 1]
-            console.print(f"\n[blue]Playing songs from {selected_album}.[/blue]")
-            playlist = album_sort(repo, selected_album)
+            selected_album = albums[int(choice) - 1].name
+            console.print(f"\n[blue]Playing songs from {selected_album or 'Unknown'}.[/blue]")
+            if args.backend == "sqlite":
+                playlist = await repository.album_sort(selected_album)
+            else:
+                playlist = album_sort(repo, selected_album)
         elif mode == "t":
-            # Get unique artists
-            artists = sorted({metadata[2] or "Unknown" for metadata in repo.values()})
+            # Artist facets come from the repository index, not from a pass over every song
+            if args.backend == "sqlite":
+                artists = await repository.artists()
+            else:
+                artists = repo.index.artists()
             console.print("\n[blue]Available artists:[/blue]")
             for i, artist in enumerate(artists, 1):
-                console.print(f"  [bold]{i}:[/bold] {artist}")
+                console.print(f"  [bold]{i}:[/bold] {artist.name or 'Unknown'} [dim]({artist.tracks} songs)[/dim]")
             choice = Prompt.ask(
                 f"Select artist number (1-{len(artists)}): ",
                 choices=[str(i) for i in range(1, len(artists) + 1)]
             )
-            selected_artist = artists[int(choice) - 1]
-            console.print(f"\n[blue]Playing songs by {selected_artist}.[/blue]")
-            playlist = artist_sort(repo, selected_artist)
+            selected_artist = artists[int(choice) - 1].name
+            console.print(f"\n[blue]Playing songs by {selected_artist or 'Unknown'}.[/blue]")
+            if args.backend == "sqlite":
+                playlist = await repository.artist_sort(selected_artist)
+            else:
+                playlist = artist_sort(repo, selected_artist)
+        elif mode == "s":
+            # The index is persisted, so it is only rebuilt when the library changed
+            index = await load_search_index(repo, repository_signature())
+            query = Prompt.ask("[blue]Search for a title, artist or album[/blue]")
+            results = index.search(query, limit=20)
+            if results:
+                console.print("\n[blue]Matching songs:[/blue]")
+                for i, result in enumerate(results, 1):
+                    title, album, artist = repo[result.path][:3]
+                    console.print(f"  [bold]{i}:[/bold] {title} [dim]- {artist} - {album}[/dim]")
+                choice = Prompt.ask(
+                    f"Select song number (1-{len(results)}), or 'a' to play them all: ",
+                    choices=[str(i) for i in range(1, len(results) + 1)] + ["a"],
+                    default="a"
+                )
+                if choice != "a":
+                    results = [results[int(choice) - 1]]
+                playlist = [(result.path, repo[result.path][0]) for result in results]
 
         if not playlist:
             console.print("\n[red]No songs available for this mode.[/red]")
             return
 
+        from src.audio_linux import play_playlist  # Imports pygame and opens the mixer on first use
+
+        # The playlist becomes the saved queue, written while it already plays. A shuffle
+        # is saved as its seed, so quitting does not wait for the whole library to be written
+        queue.new_queue()
+        if seed is not None:
+            save_task = asyncio.create_task(asyncio.to_thread(queue.save_shuffle, seed, args.spread))
+        else:
+            save_task = asyncio.create_task(asyncio.to_thread(queue.save, playlist, repo))
         console.print("[blue]Playing songs...[/blue]")
-        await play_playlist(playlist)
+        try:
+            await play_playlist(
+                ((path, title, index) for index, (path, title) in enumerate(playlist)),
+                gapless=args.gapless, fade=args.fade, progress=queue.progress, volume=volume,
+                duration=duration,
+            )
+        finally:
+            await save_task
+            queue.close()
         console.print("[blue]Playback completed.[/blue]")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    multiprocessing.freeze_support()  # Required by the extraction process pool in frozen builds
+    args = parse_args()
+    profile.enabled = args.profile_startup
+    if args.metrics:
+        metrics.enable()
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        if not (args.watch or args.analyze_loudness or args.build_waveforms):  # Ctrl+C is the normal way to leave these modes
+            raise
+    finally:
+        if args.metrics:
+            metrics.export(args.metrics)
\ No newline at end of file
@@ -0,0 +1,325 @@
+import os
+import json
+import signal
+import asyncio
+import logging
+from collections import deque
+from pathlib import Path
+from .json_manager import _is_under
+from .playlist_files import is_playlist_file, load_playlist
+from .waveforms import render_waveform
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_SOCKET_PATH = str(Path.home() / "za_player" / "za_player.sock")
+# Upcoming tracks listed by the "status" and "queue" commands
+QUEUE_PREVIEW = 10
+# Characters of the waveform returned by "status"
+WAVEFORM_WIDTH = 60
+
+HELP = (
+    "play [PATH]: resume, or play PATH right now | pause | skip | "
+    "queue [PATH]: add a song, a playlist or every song of a folder, or list the queue | status"
+)
+
+
+class PlayerDaemon:
+    """
+    A headless player that owns the mixer and a play queue, controlled through a
+    Unix domain socket.
+
+    The protocol is line based, so `socat - UNIX-CONNECT:<socket>` is a complete
+    client: every line is a command followed by an optional argument, and every
+    command gets exactly one line back, a JSON object with an "ok" field. Each
+    connection is served by its own coroutine, so any number of clients can stay
+    connected, and commands act on the mixer at once, without a terminal.
+    Relative paths are taken from the working directory of the daemon, so
+    clients send absolute ones, as `send_command` does.
+    """
+
+    def __init__(self, repo, socket_path: str = DEFAULT_SOCKET_PATH, volume=None, waveforms=None):
+        """
+        Args:
+            repo (Library): The song library, used for titles and to queue folders.
+            socket_path (str): Where to create the control socket.
+            volume (Callable | None): Returns the mixer volume of a path, see
+                                      `playback.play_playlist`.
+            waveforms (WaveformStore | None): Adds the waveform of the current
+                                              track, with its progress, to "status".
+        """
+        self.repo = repo
+        self.volume = volume
+        self.waveforms = waveforms
+        self.socket_path = str(Path(socket_path).resolve())  # Normalize path for Windows compatibility
+        self.queue = deque()
+        self.current = None
+        self.paused = False
+        self._wakeup = asyncio.Event()
+        self._clients = set()
+        self._pygame = None
+        self._playback = None
+        self._bridge = None
+
+    # Commands
+
+    def _duration(self, path: str) -> float | None:
+        entry = self.repo.get(path)
+        return entry[3] if entry else None
+
+    def _track(self, path: str) -> tuple[str, str]:
+        entry = self.repo.get(path)
+        return path, entry[0] if entry else Path(path).stem
+
+    def _stored_key(self, path: str) -> str:
+        """
+        Returns the repository key of a file, which may be spelled relative or
+        through a symbolic link, or `path` itself if the file is not in the library.
+        """
+        if path in self.repo:
+            return path
+        real = os.path.realpath(path)
+        name = os.path.basename(path)
+        for key in self.repo.paths_named({name}).get(name, []):
+            if os.path.realpath(key) == real:
+                return key
+        return path
+
+    def _tracks_under(self, path: str) -> list[tuple[str, str]]:
+        """
+        Returns the track of a file, the songs of an M3U/M3U8 playlist, or the
+        library tracks of a folder in path order.
+
+        Keys keep the folder their songs were added from as it was given, so they
+        are compared with `path` once both are resolved, one folder at a time.
+        """
+        path = os.path.abspath(path)
+        if os.path.isfile(path) and is_playlist_file(path):
+            try:
+                return load_playlist(path, self.repo)[0]
+            except OSError:
+                return []
+        if os.path.isfile(path):
+            return [self._track(self._stored_key(path))]
+        if os.path.isdir(path):
+            root = os.path.realpath(path)
+            under = {}  # Folder of a key -> whether it resolves under `root`
+            tracks = []
+            for file_path, entry in self.repo.items():
+                directory = os.path.dirname(file_path)
+                if directory not in under:
+                    under[directory] = _is_under(os.path.realpath(directory), root)
+                if under[directory]:
+                    tracks.append((file_path, entry[0]))
+            return sorted(tracks)
+        return []
+
+    def _describe(self, track: tuple[str, str] | None) -> dict | None:
+        if track is None:
+            return None
+        entry = self.repo.get(track[0])
+        description = {"path": track[0], "title": track[1]}
+        if entry:
+            description.update(album=entry[1], artist=entry[2], duration=entry[3])
+        return description
+
+    def status(self) -> dict:
+        if self.current is None:
+            state = "stopped"
+        else:
+            state = "paused" if self.paused else "playing"
+        position = self._pygame.mixer.music.get_pos() if self.current is not None else -1
+        status = {
+            "state": state,
+            "current": self._describe(self.current),
+            "position": round(position / 1000, 1) if position >= 0 else None,
+            "queued": len(self.queue),
+            "next": [title for _, title in list(self.queue)[:QUEUE_PREVIEW]],
+        }
+        if self.waveforms is not None and self.current is not None:
+            # Read from the memory-mapped sidecar, the audio file is not touched
+            peaks = self.waveforms.peaks(self.current[0])
+            entry = self.repo.get(self.current[0])
+            if peaks is not None:
+                played = position / 1000 / entry[3] if entry and entry[3] and position >= 0 else None
+                status["waveform"] = render_waveform(peaks, WAVEFORM_WIDTH, played)
+        return status
+
+    async def execute(self, line: str) -> dict:
+        """
+        Runs one command line and returns its JSON-serializable response.
+
+        Paths are resolved in a thread, since reading a playlist or listing a
+        folder of a large library would hold up every other client.
+        """
+        command, _, argument = line.strip().partition(" ")
+        command, argument = command.lower(), argument.strip()
+        if command == "play":
+            if argument:
+                tracks = await asyncio.to_thread(self._tracks_under, argument)
+                if not tracks:
+                    return {"ok": False, "error": f"Nothing to play at {argument}"}
+                self.queue.extendleft(reversed(tracks))
+                if self.current is not None:
+                    self.paused = False
+                    self._bridge.skip()  # Ends the current track, the playlist moves on to the new ones
+            elif self.paused:
+                self._bridge.resume()
+                self.paused = False
+            self._wakeup.set()
+        elif command == "pause":
+            if self.current is not None and not self.paused:
+                self._bridge.pause()
+                self.paused = True
+        elif command == "skip":
+            if self.current is not None:
+                self.paused = False
+                self._bridge.skip()
+        elif command == "queue":
+            if argument:
+                tracks = await asyncio.to_thread(self._tracks_under, argument)
+                if not tracks:
+                    return {"ok": False, "error": f"Nothing to queue at {argument}"}
+                self.queue.extend(tracks)
+                self._wakeup.set()
+                return {"ok": True, "added": len(tracks), "queued": len(self.queue)}
+            return {"ok": True, "queue": [self._describe(track) for track in list(self.queue)[:QUEUE_PREVIEW]],
+                    "queued": len(self.queue)}
+        elif command == "status":
+            pass
+        elif command == "help":
+            return {"ok": True, "help": HELP}
+        else:
+            return {"ok": False, "error": f"Unknown command: {command or '(empty)'}", "help": HELP}
+        return {"ok": True, **self.status()}
+
+    # Playback
+
+    def _take(self):
+        """
+        Hands the queued tracks to `play_playlist` one at a time, so tracks queued
+        while it plays are picked up.
+        """
+        while self.queue:
+            self.current = self.queue.popleft()
+            yield self.current
+
+    async def _play(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self.queue and self.current is None and not self.paused:
+                try:
+                    await self._playback.play_playlist(
+                        self._take(), keys=False, volume=self.volume, duration=self._duration, bridge=self._bridge,
+                    )
+                finally:
+                    self.current = None
+                    self.paused = False
+
+    # Socket
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.execute(line.decode("utf-8", errors="replace"))
+                except Exception as e:
+                    logger.error(f"Error al ejecutar la orden {line!r}: {e}")
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass  # The client went away or sent a line too long to be a command
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _claim_socket(self) -> None:
+        """
+        Removes a socket left behind by a daemon that did not exit cleanly.
+
+        Raises:
+            RuntimeError: If another daemon is listening on the socket.
+        """
+        if not os.path.exists(self.socket_path):
+            Path(self.socket_path).parent.mkdir(parents=True, exist_ok=True)
+            return
+        try:
+            _, writer = await asyncio.open_unix_connection(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        writer.close()
+        raise RuntimeError(f"Ya hay un reproductor escuchando en {self.socket_path}")
+
+    async def run(self, stop_event: asyncio.Event | None = None) -> None:
+        """
+        Serves the socket and plays the queue until `stop_event` is set, or until
+        SIGINT or SIGTERM is received.
+        """
+        # Imported on first use to keep startup fast
+        import pygame
+        from . import playback
+        from .mixer_events import MusicEndBridge
+        self._pygame = pygame
+        self._playback = playback
+        self._bridge = MusicEndBridge()
+        playback.init_mixer()
+
+        stop_event = stop_event or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop_event.set)
+
+        await self._claim_socket()
+        # Only the user running the daemon may control it, from the moment the socket exists
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        finally:
+            os.umask(umask)
+        player = asyncio.create_task(self._play())
+        logger.info(f"Reproductor escuchando en {self.socket_path}")
+        try:
+            await stop_event.wait()
+        finally:
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signal_number)
+            server.close()
+            for writer in list(self._clients):
+                writer.close()
+            player.cancel()
+            await asyncio.gather(player, return_exceptions=True)
+            await server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+async def send_command(command: str, socket_path: str = DEFAULT_SOCKET_PATH) -> dict:
+    """
+    Sends one command to a running daemon and returns its response.
+
+    The path argument of "play" and "queue" is made absolute first, since the
+    daemon runs in another working directory.
+
+    Raises:
+        OSError: If no daemon is listening on the socket, or it closed the
+                 connection without answering.
+    """
+    socket_path = str(Path(socket_path).resolve())  # Normalize path for Windows compatibility
+    name, _, argument = command.strip().partition(" ")
+    if name.lower() in ("play", "queue") and argument.strip():
+        command = f"{name} {os.path.abspath(argument.strip())}"
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write(command.strip().encode("utf-8") + b"\n")
+        await writer.drain()
+        response = await reader.readline()
+        if not response:
+            raise ConnectionError("El reproductor cerro la conexion sin responder")
+        return json.loads(response)
+    finally:
+        writer.close()
+        await writer.wait_closed()
@@ -0,0 +1,387 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import NamedTuple
+from .extractor import create_executor
+from .files_manager import file_fingerprint
+from .library import UNKNOWN_TAGS
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_DUPLICATES_PATH = str(Path.home() / "za_player" / "za_duplicates.json")
+DEFAULT_MERGED_PATH = str(Path.home() / "za_player" / "za_merged.json")
+STORE_VERSION = 1
+
+# Bytes hashed at each end of a file before deciding whether the whole file is needed
+EDGE_SIZE = 64 * 1024
+FULL_HASH_BLOCK_SIZE = 1024 * 1024
+HASH_BATCH_SIZE = 64
+
+
+class DuplicateGroup(NamedTuple):
+    """
+    Tracks whose files have the same content.
+    """
+    size: int
+    duration: float
+    paths: list[str]
+
+    @property
+    def wasted_bytes(self) -> int:
+        return self.size * (len(self.paths) - 1)
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+def edge_hash(path: str, size: int) -> str:
+    """
+    Hashes the first and last `EDGE_SIZE` bytes of a file, or all of it when it is small.
+
+    Copies of a song share these bytes, while different songs almost never do,
+    so only the files that still collide need to be hashed as a whole.
+    """
+    hasher = _hasher()
+    with open(path, "rb") as file:
+        if size <= 2 * EDGE_SIZE:
+            hasher.update(file.read())
+        else:
+            hasher.update(file.read(EDGE_SIZE))
+            file.seek(size - EDGE_SIZE)
+            hasher.update(file.read(EDGE_SIZE))
+    return hasher.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """
+    Hashes the whole content of a file.
+    """
+    hasher = _hasher()
+    with open(path, "rb") as file:
+        while block := file.read(FULL_HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _hash_batch(paths: list[str], sizes: list[int], full: bool) -> list[tuple[str, tuple | None, str | None]]:
+    """
+    Hashes a batch of files inside a worker.
+
+    Returns:
+        list: (path, fingerprint, hash) triples. The hash is None when the file
+        cannot be read, or when it changed size since it was listed.
+    """
+    results = []
+    for path, size in zip(paths, sizes):
+        fingerprint = file_fingerprint(path)
+        digest = None
+        if fingerprint is not None and fingerprint[0] == size:
+            try:
+                digest = full_hash(path) if full else edge_hash(path, size)
+            except OSError as e:
+                logger.warning(f"No se pudo leer {path}: {e}")
+        results.append((path, fingerprint, digest))
+    return results
+
+
+# The last merged map read by `load_merged`, with the (size, mtime_ns) of its file
+_merged_cache = (None, {})
+
+
+class HashStore:
+    """
+    The content hashes of the library files.
+
+    It is stored in `DEFAULT_DUPLICATES_PATH`, next to the repository. Every hash
+    is kept with the (size, mtime_ns, inode) fingerprint of its file and is only
+    reused while the file keeps that fingerprint, so files are hashed once.
+    """
+
+    def __init__(self, hashes=None):
+        self.hashes = hashes or {}  # Path -> [size, mtime_ns, inode, edge hash, full hash or None]
+
+    @classmethod
+    def load(cls) -> "HashStore":
+        """
+        Reads the store, or returns an empty one if it is missing or unreadable.
+        """
+        path_obj = Path(DEFAULT_DUPLICATES_PATH).resolve()  # Normalize path for Windows compatibility
+        try:
+            with open(path_obj, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") != STORE_VERSION:
+                raise ValueError("Version incompatible")
+            return cls(data["hashes"])
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning(f"No se pudo leer {path_obj}, se volveran a calcular los hashes: {e}")
+            return cls()
+
+    def save(self) -> None:
+        """
+        Writes the store atomically.
+        """
+        path_obj = Path(DEFAULT_DUPLICATES_PATH).resolve()  # Normalize path for Windows compatibility
+        temp_path = path_obj.with_suffix(".tmp")
+        try:
+            path_obj.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(
+                    {"version": STORE_VERSION, "hashes": self.hashes},
+                    file, ensure_ascii=False, separators=(',', ':'),
+                )
+            temp_path.replace(path_obj)
+        except OSError as e:
+            logger.error(f"No se pudieron guardar los hashes en {path_obj}: {e}")
+
+    def cached(self, path: str, fingerprint: tuple, full: bool) -> str | None:
+        record = self.hashes.get(path)
+        if record is None or tuple(record[:3]) != fingerprint:
+            return None
+        return record[4] if full else record[3]
+
+    def remember(self, path: str, fingerprint: tuple, digest: str, full: bool) -> None:
+        record = self.hashes.get(path)
+        if record is None or tuple(record[:3]) != fingerprint:
+            record = self.hashes[path] = [*fingerprint, None, None]
+        record[4 if full else 3] = digest
+
+
+def load_merged() -> dict[str, str]:
+    """
+    Reads the paths merged away by `merge_duplicates`, each one mapped to the path kept instead.
+
+    The map is stored on its own, apart from the much larger hashes, and read
+    again only when its file changed.
+    """
+    global _merged_cache
+    path_obj = Path(DEFAULT_MERGED_PATH).resolve()  # Normalize path for Windows compatibility
+    try:
+        stat = path_obj.stat()
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logger.warning(f"No se pudo leer {path_obj}: {e}")
+        return {}
+    version = (stat.st_size, stat.st_mtime_ns)
+    if _merged_cache[0] != version:
+        try:
+            with open(path_obj, "r", encoding="utf-8") as file:
+                _merged_cache = (version, json.load(file))
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer {path_obj}: {e}")
+            return {}
+    return _merged_cache[1]
+
+
+def save_merged(merged: dict[str, str]) -> None:
+    """
+    Writes the map of merged paths atomically.
+    """
+    path_obj = Path(DEFAULT_MERGED_PATH).resolve()  # Normalize path for Windows compatibility
+    temp_path = path_obj.with_suffix(".tmp")
+    try:
+        path_obj.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(merged, file, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path_obj)
+    except OSError as e:
+        logger.error(f"No se pudieron guardar los duplicados fusionados en {path_obj}: {e}")
+
+
+def merged_paths(repo) -> set[str]:
+    """
+    Returns the paths merged away by `merge_duplicates` which scans must not add back.
+
+    A copy is only left out while the path kept instead is still in `repo`:
+    once that one is deleted or moved, the copies are added back by the next scan.
+
+    Args:
+        repo (dict | Library): The repository, or any container of its paths.
+    """
+    return {path for path, kept in load_merged().items() if kept in repo}
+
+
+def _candidate_groups(repo) -> list[list[tuple[str, int]]]:
+    """
+    Groups the tracks by size and duration, the cheap keys every copy shares.
+    """
+    groups = {}
+    for path, entry in repo.items():
+        fingerprint = entry[4] if len(entry) > 4 else None
+        if not fingerprint:
+            fingerprint = file_fingerprint(path)
+            if fingerprint is None:
+                continue
+        groups.setdefault((fingerprint[0], entry[3]), []).append((path, fingerprint[0]))
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _lookup_cached(groups, full: bool, store: HashStore) -> tuple[dict, list]:
+    """
+    Returns the hashes the store already knows and the files left to hash.
+    """
+    digests = {}
+    to_hash = []
+    for group in groups:
+        for path, size in group:
+            fingerprint = file_fingerprint(path)
+            digest = store.cached(path, fingerprint, full) if fingerprint else None
+            if digest is not None:
+                digests[path] = digest
+            elif fingerprint is not None:
+                to_hash.append((path, size))
+    return digests, to_hash
+
+
+async def _split_by_hash(groups, full: bool, store: HashStore, executor) -> list[list[tuple[str, int]]]:
+    """
+    Splits every group by the edge (or full) hash of its files, hashing only what
+    the store does not know yet, and keeps the groups that still hold several files.
+    """
+    loop = asyncio.get_running_loop()
+    digests, to_hash = await asyncio.to_thread(_lookup_cached, groups, full, store)
+
+    futures = [
+        loop.run_in_executor(
+            executor, _hash_batch,
+            [path for path, _ in to_hash[start:start + HASH_BATCH_SIZE]],
+            [size for _, size in to_hash[start:start + HASH_BATCH_SIZE]],
+            full,
+        )
+        for start in range(0, len(to_hash), HASH_BATCH_SIZE)
+    ]
+    for batch in await asyncio.gather(*futures):
+        for path, fingerprint, digest in batch:
+            if digest is not None:
+                digests[path] = digest
+                store.remember(path, fingerprint, digest, full)
+
+    split = []
+    for group in groups:
+        by_digest = {}
+        for path, size in group:
+            if path in digests:
+                by_digest.setdefault(digests[path], []).append((path, size))
+        split.extend(members for members in by_digest.values() if len(members) > 1)
+    return split
+
+
+async def find_duplicates(repo, mode: str = "thread", max_workers: int | None = None) -> list[DuplicateGroup]:
+    """
+    Finds the tracks of a repository whose files have the same content.
+
+    Candidates are narrowed down in stages, each one more expensive but applied
+    to fewer files:
+    1. Tracks are grouped by file size and duration, without reading any file.
+    2. Files sharing a group are told apart by hashing their first and last
+       `EDGE_SIZE` bytes.
+    3. Only files that still collide, and are larger than both edges, are hashed
+       as a whole.
+    Hashes are kept in the `HashStore`, so a later pass only hashes new or
+    modified files.
+
+    Args:
+        repo (dict | Library): The repository to search.
+        mode (str): Worker pool used for hashing, "thread" (hashing is I/O bound)
+                    or "process".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+
+    Returns:
+        list[DuplicateGroup]: The groups of identical files, largest waste first.
+    """
+    store = await asyncio.to_thread(HashStore.load)
+    groups = await asyncio.to_thread(_candidate_groups, repo)
+    candidates = sum(len(group) for group in groups)
+
+    executor = create_executor(mode, max_workers)
+    try:
+        groups = await _split_by_hash(groups, False, store, executor)
+        small = [group for group in groups if group[0][1] <= 2 * EDGE_SIZE]
+        large = [group for group in groups if group[0][1] > 2 * EDGE_SIZE]
+        groups = small + await _split_by_hash(large, True, store, executor)
+    finally:
+        executor.shutdown(wait=True)
+    await asyncio.to_thread(store.save)
+
+    duplicates = [
+        DuplicateGroup(group[0][1], repo[group[0][0]][3], sorted(path for path, _ in group))
+        for group in groups
+    ]
+    duplicates.sort(key=lambda group: group.wasted_bytes, reverse=True)
+    logger.info(
+        f"Se han comparado {candidates} candidatos: {len(duplicates)} grupos de duplicados, "
+        f"{sum(len(group.paths) - 1 for group in duplicates)} copias sobrantes."
+    )
+    return duplicates
+
+
+def _known_tags(entry) -> int:
+    return sum(value not in UNKNOWN_TAGS for value in entry[:3])
+
+
+def plan_merge(repo, duplicates: list[DuplicateGroup]) -> tuple[dict, set, dict]:
+    """
+    Chooses which track of every duplicate group stays in the repository.
+
+    The track with the most known tags is kept, then the one with the shortest
+    path. Tags it is missing are taken from the other copies. Files are never
+    deleted, only their repository entries.
+
+    Returns:
+        tuple[dict, set, dict]: The entries to replace, keyed by path, the paths
+        to remove and a map from every removed path to the path kept instead.
+    """
+    upserts = {}
+    removals = set()
+    merged = {}
+    for group in duplicates:
+        paths = sorted(group.paths, key=lambda path: (-_known_tags(repo[path]), len(path), path))
+        kept, others = paths[0], paths[1:]
+        entry = list(repo[kept])
+        for other in others:
+            for field, value in enumerate(repo[other][:3]):
+                if entry[field] in UNKNOWN_TAGS and value not in UNKNOWN_TAGS:
+                    entry[field] = value
+        if entry != list(repo[kept]):
+            upserts[kept] = entry
+        removals.update(others)
+        merged.update(dict.fromkeys(others, kept))
+    return upserts, removals, merged
+
+
+async def merge_duplicates(repo, duplicates: list[DuplicateGroup], record_changes) -> int:
+    """
+    Keeps a single repository entry for every group of duplicates.
+
+    The merged paths are remembered in `DEFAULT_MERGED_PATH`, so
+    `update_repository` and `rescan_repository` do not add them back while the
+    path kept instead stays in the repository.
+
+    Args:
+        repo (dict | Library): The repository, updated in place.
+        duplicates (list[DuplicateGroup]): Groups found by `find_duplicates`.
+        record_changes (Callable): The `record_changes` coroutine of the storage
+                                   backend, used to persist the changes.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    upserts, removals, merged = plan_merge(repo, duplicates)
+    if not removals:
+        return 0
+
+    await asyncio.to_thread(save_merged, {**await asyncio.to_thread(load_merged), **merged})
+
+    for path in removals:
+        del repo[path]
+    repo.update(upserts)
+    await record_changes(repo, upserts, removals)
+    logger.info(f"Se han fusionado {len(removals)} duplicados.")
+    return len(removals)
@@ -0,0 +1,189 @@
+import os
+import time
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Iterable
+from . import metrics
+from .files_manager import extract_metadata, file_fingerprint
+
+
+DEFAULT_BATCH_SIZE = 64
+EXECUTOR_MODES = {"process", "thread"}
+
+
+def extract_metadata_batch(paths: list[str]) -> dict[str, tuple]:
+    """
+    Extracts metadata for a batch of audio files inside a worker.
+
+    Sending one batch per task instead of one path per task amortizes the
+    cost of pickling arguments and results between processes. The fingerprint
+    of each file is taken before its tags are read, so a file modified while
+    it is being parsed is detected as changed by the next rescan.
+
+    Args:
+        paths (list[str]): Full paths of the audio files to process.
+
+    Returns:
+        dict[str, tuple]: A dictionary mapping every path to its
+        (title, album, artist, duration, fingerprint) tuple, where the
+        fingerprint is a (size, mtime_ns, inode) tuple or None.
+    """
+    results = {}
+    for path in paths:
+        fingerprint = file_fingerprint(path)
+        title, album, artist, duration = extract_metadata(path)[path]
+        results[path] = (title, album, artist, duration, fingerprint)
+    return results
+
+
+def extract_metadata_batch_timed(paths: list[str]) -> tuple[dict[str, tuple], list[tuple[str, float]]]:
+    """
+    Like `extract_metadata_batch`, but also measures how long every file took.
+
+    Worker processes cannot record metrics themselves, so the timings travel back
+    with the results and are recorded by `extract_metadata_parallel`.
+
+    Returns:
+        tuple: The entries of the batch and a list of (path, seconds) pairs.
+    """
+    results = {}
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        results.update(extract_metadata_batch([path]))
+        timings.append((path, time.perf_counter() - start))
+    return results, timings
+
+
+def create_executor(mode: str = "process", max_workers: int | None = None) -> Executor:
+    """
+    Creates the worker pool used for metadata extraction.
+
+    Args:
+        mode (str): "process" to parse tags on every core, or "thread" when the
+                    work is dominated by slow I/O (network mounts).
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+
+    Returns:
+        Executor: A new process or thread pool executor.
+
+    Raises:
+        ValueError: If `mode` is not one of `EXECUTOR_MODES`.
+    """
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"Modo de extraccion desconocido: {mode}")
+
+    workers = max_workers or os.cpu_count() or 1
+    if mode == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+async def _batched(
+    paths: Iterable[str] | AsyncIterable[Iterable[str]],
+    batch_size: int,
+) -> AsyncIterator[list[str]]:
+    """
+    Regroups a synchronous iterable of paths, or an asynchronous iterable of path
+    chunks, into lists of at most `batch_size` paths.
+    """
+    if not isinstance(paths, AsyncIterable):
+        remaining = iter(paths)
+        while batch := list(islice(remaining, batch_size)):
+            yield batch
+        return
+
+    batch = []
+    async for chunk in paths:
+        batch.extend(chunk)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+async def extract_metadata_parallel(
+    paths: Iterable[str] | AsyncIterable[Iterable[str]],
+    executor: Executor | None = None,
+    mode: str = "process",
+    max_workers: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_pending: int | None = None,
+) -> AsyncIterator[dict[str, tuple]]:
+    """
+    Fans `extract_metadata` out across a worker pool and yields results as they finish.
+
+    Paths are consumed lazily in batches of `batch_size`. At most `max_pending`
+    batches are in flight at any time, so memory stays bounded no matter how
+    many paths are supplied, while every worker is kept busy. When `paths` is an
+    asynchronous source, such as `scan_audio_files`, finished batches keep being
+    yielded while the source is still producing paths.
+
+    Args:
+        paths (Iterable[str] | AsyncIterable[Iterable[str]]): Paths of the audio
+            files to process, or an asynchronous iterable of path chunks.
+        executor (Executor | None): An existing pool to reuse. When omitted, a
+                                    pool is created with `create_executor` and
+                                    shut down once extraction ends.
+        mode (str): Pool type used when `executor` is omitted ("process" or "thread").
+        max_workers (int | None): Pool size used when `executor` is omitted.
+        batch_size (int): Number of paths sent to a worker per task.
+        max_pending (int | None): Maximum number of batches in flight.
+                                  Defaults to twice the number of workers.
+
+    Yields:
+        dict[str, tuple]: The entries of one finished batch, as returned by
+        `extract_metadata_batch`, in completion order.
+    """
+    loop = asyncio.get_running_loop()
+    owns_executor = executor is None
+    if executor is None:
+        executor = create_executor(mode, max_workers)
+
+    limit = max_pending or 2 * (max_workers or os.cpu_count() or 1)
+    timed = metrics.is_enabled()
+    worker = extract_metadata_batch_timed if timed else extract_metadata_batch
+    batches = _batched(paths, batch_size)
+    next_batch = None
+    exhausted = False
+    pending = set()
+
+    try:
+        while True:
+            if not exhausted and next_batch is None and len(pending) < limit:
+                next_batch = asyncio.ensure_future(anext(batches))
+
+            waiting = (pending | {next_batch}) if next_batch is not None else pending
+            if not waiting:
+                break
+
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if next_batch in done:
+                try:
+                    batch = next_batch.result()
+                    pending.add(loop.run_in_executor(executor, worker, batch))
+                except StopAsyncIteration:
+                    exhausted = True
+                next_batch = None
+
+            for future in done & pending:
+                pending.discard(future)
+                if not timed:
+                    yield future.result()
+                    continue
+                results, timings = future.result()
+                for path, seconds in timings:
+                    metrics.observe("extract_metadata", seconds, path)
+                metrics.count("files_extracted", len(results))
+                yield results
+    finally:
+        if next_batch is not None:
+            next_batch.cancel()
+            await asyncio.gather(next_batch, return_exceptions=True)
+        for future in pending:
+            future.cancel()
+        await batches.aclose()
+        if owns_executor:
+            executor.shutdown(wait=not pending, cancel_futures=True)
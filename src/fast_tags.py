@@ -0,0 +1,312 @@
+"""
+Header-only tag reader for MP3, FLAC and WAV files.
+
+Only the headers and the wanted tag frames are read: embedded pictures, other
+metadata blocks and the audio itself are skipped with a seek, so reading a file
+usually costs a single small read, even on a network mount. Durations come from
+the headers (MPEG frame headers and their Xing/VBRI summary, FLAC STREAMINFO,
+WAV format and data chunks). Anything this module cannot read with certainty
+returns None, so the caller can fall back to mutagen.
+"""
+
+import os
+import struct
+
+# Bytes read up front: enough for the tags of most files
+HEAD_SIZE = 4096
+
+# Frames holding the title, album and artist, per ID3v2 major version
+ID3_FRAMES = {
+    2: {b"TT2": 0, b"TAL": 1, b"TP1": 2},
+    3: {b"TIT2": 0, b"TALB": 1, b"TPE1": 2},
+    4: {b"TIT2": 0, b"TALB": 1, b"TPE1": 2},
+}
+VORBIS_FIELDS = {"title": 0, "album": 1, "artist": 2}
+RIFF_INFO_FIELDS = {b"INAM": 0, b"IPRD": 1, b"IART": 2}
+
+ID3_ENCODINGS = ("latin-1", "utf-16", "utf-16-be", "utf-8")
+
+# Bitrates in kbps, indexed by [MPEG-1?][layer - 1][bitrate index]
+MPEG_BITRATES = {
+    True: (
+        (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    ),
+    False: (
+        (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    ),
+}
+# Sample rates in Hz, indexed by the version bits of the frame header
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+class UnsupportedFile(Exception):
+    """
+    Raised when a file uses a feature this reader does not handle.
+    """
+
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] & 0x7F) << 21 | (data[1] & 0x7F) << 14 | (data[2] & 0x7F) << 7 | (data[3] & 0x7F)
+
+
+def _join(values) -> str | None:
+    # Multiple values are joined with "/", as `files_manager._tag_text` joins the values read by mutagen
+    values = [value for value in values if value]
+    return "/".join(values) if values else None
+
+
+def _read_at(file, offset: int, size: int) -> bytes:
+    file.seek(offset)
+    return file.read(size)
+
+
+def _decode_text_frame(payload: bytes) -> str | None:
+    if not payload or payload[0] > 3:
+        raise UnsupportedFile("Codificacion de texto ID3 desconocida")
+    text = payload[1:].decode(ID3_ENCODINGS[payload[0]])
+    # In UTF-16, every value of the frame starts with its own byte order mark
+    return _join(value.lstrip("\ufeff") for value in text.split("\x00"))
+
+
+def parse_id3(file, offset: int = 0) -> tuple[list, int]:
+    """
+    Reads the title, album and artist frames of the ID3v2 tag starting at `offset`.
+
+    Args:
+        file (BinaryIO): The open file.
+        offset (int): Position of the "ID3" header.
+
+    Returns:
+        tuple[list, int]: The [title, album, artist] values (None when missing) and
+        the position right after the tag.
+
+    Raises:
+        UnsupportedFile: For unsynchronised, compressed or encrypted tags.
+    """
+    header = _read_at(file, offset, 10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        raise UnsupportedFile("Cabecera ID3 invalida")
+    version, flags = header[3], header[5]
+    if version not in ID3_FRAMES or flags & 0x80 or version == 2 and flags & 0x40:
+        raise UnsupportedFile("Version o sincronizacion ID3 no soportada")
+
+    end = offset + 10 + _syncsafe(header[6:10])
+    if flags & 0x10:
+        end += 10  # Footer
+    position = offset + 10
+    if flags & 0x40 and version > 2:
+        extended = file.read(4)
+        position += _syncsafe(extended) if version == 4 else 4 + struct.unpack(">I", extended)[0]
+
+    wanted = ID3_FRAMES[version]
+    id_size = 3 if version == 2 else 4
+    frame_header_size = 6 if version == 2 else 10
+    values = [None, None, None]
+    while position + frame_header_size <= end and None in values:
+        frame_header = _read_at(file, position, frame_header_size)
+        frame_id = frame_header[:id_size]
+        if len(frame_header) < frame_header_size or not frame_id.strip(b"\x00"):
+            break  # Padding
+        if version == 2:
+            size = int.from_bytes(frame_header[3:6], "big")
+        elif version == 3:
+            size = struct.unpack(">I", frame_header[4:8])[0]
+        else:
+            size = _syncsafe(frame_header[4:8])
+        field = wanted.get(frame_id)
+        if field is not None and values[field] is None:
+            if version == 3 and frame_header[9] & 0xC0 or version == 4 and frame_header[9] & 0x0F:
+                raise UnsupportedFile("Marco ID3 comprimido o cifrado")
+            values[field] = _decode_text_frame(file.read(size))
+        position += frame_header_size + size
+    return values, end
+
+
+def _mpeg_frame(header: bytes) -> tuple | None:
+    """
+    Decodes a 4-byte MPEG audio frame header.
+
+    Returns:
+        tuple | None: (frame size, samples per frame, sample rate, bitrate in bps,
+        MPEG-1?, mono?), or None if `header` is not a valid frame header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = header[1] >> 3 & 3
+    layer = 4 - (header[1] >> 1 & 3)
+    bitrate_index = header[2] >> 4
+    rate_index = header[2] >> 2 & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = MPEG_BITRATES[mpeg1][layer - 1][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = header[2] >> 1 & 1
+    if layer == 1:
+        samples = 384
+        size = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or mpeg1 else 576
+        size = samples // 8 * bitrate // sample_rate + padding
+    return size, samples, sample_rate, bitrate, mpeg1, header[3] >> 6 == 3
+
+
+def mp3_duration(file, start: int, file_size: int) -> float:
+    """
+    Works out the duration of an MPEG audio stream from its first frame.
+
+    VBR files carry the number of frames in a Xing/Info or VBRI header inside the
+    first frame. Without one, the stream is assumed to be CBR and its duration is
+    its size divided by the bitrate.
+
+    Raises:
+        UnsupportedFile: If no valid frame is found near `start`.
+    """
+    data = _read_at(file, start, HEAD_SIZE)
+    for index in range(len(data) - 3):
+        if data[index] != 0xFF:
+            continue
+        frame = _mpeg_frame(data[index:index + 4])
+        if frame is None:
+            continue
+        size, samples, sample_rate, bitrate, mpeg1, mono = frame
+        following = data[index + size:index + size + 4]
+        if len(following) == 4 and _mpeg_frame(following) is None:
+            continue  # A false sync inside the tag padding or the audio
+        break
+    else:
+        raise UnsupportedFile("No se ha encontrado un marco MPEG")
+
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = data[index + 4 + side_info:index + 4 + side_info + 12]
+    if xing[:4] in (b"Xing", b"Info") and xing[7] & 1:
+        return struct.unpack(">I", xing[8:12])[0] * samples / sample_rate
+    vbri = data[index + 36:index + 36 + 18]
+    if vbri[:4] == b"VBRI":
+        return struct.unpack(">I", vbri[14:18])[0] * samples / sample_rate
+
+    audio_size = file_size - (start + index)
+    if file_size >= 128 and _read_at(file, file_size - 128, 3) == b"TAG":
+        audio_size -= 128  # ID3v1 tag
+    return audio_size * 8 / bitrate
+
+
+def parse_vorbis_comment(data: bytes) -> list:
+    """
+    Reads the title, album and artist fields of a Vorbis comment block.
+    """
+    values = [[], [], []]
+    vendor_length = struct.unpack_from("<I", data)[0]
+    position = 4 + vendor_length
+    count = struct.unpack_from("<I", data, position)[0]
+    position += 4
+    for _ in range(count):
+        length = struct.unpack_from("<I", data, position)[0]
+        position += 4
+        comment = data[position:position + length].decode("utf-8", errors="replace")
+        position += length
+        name, _, value = comment.partition("=")
+        field = VORBIS_FIELDS.get(name.lower())
+        if field is not None:
+            values[field].append(value)
+    return [_join(value) for value in values]
+
+
+def read_flac(file) -> tuple:
+    """
+    Reads a FLAC file from its STREAMINFO and VORBIS_COMMENT blocks.
+    """
+    position = 4
+    duration = None
+    values = [None, None, None]
+    while True:
+        block_header = _read_at(file, position, 4)
+        if len(block_header) < 4:
+            break
+        block_type = block_header[0] & 0x7F
+        size = int.from_bytes(block_header[1:4], "big")
+        if block_type == 0:
+            streaminfo = file.read(size)
+            packed = int.from_bytes(streaminfo[10:18], "big")
+            sample_rate = packed >> 44
+            total_samples = packed & 0xFFFFFFFFF
+            duration = total_samples / sample_rate if sample_rate else 0.0
+        elif block_type == 4:
+            values = parse_vorbis_comment(file.read(size))
+        position += 4 + size
+        if block_header[0] & 0x80:
+            break
+    if duration is None:
+        raise UnsupportedFile("Falta el bloque STREAMINFO")
+    return (*values, duration)
+
+
+def read_wav(file, file_size: int) -> tuple:
+    """
+    Reads a WAV file from its "fmt " and "data" chunks, and its ID3 or INFO tags.
+    """
+    position = 12
+    byte_rate = None
+    data_size = None
+    values = None
+    info = [None, None, None]
+    while position + 8 <= file_size:
+        chunk_id, size = struct.unpack("<4sI", _read_at(file, position, 8))
+        body = position + 8
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack("<I", file.read(16)[8:12])[0]
+        elif chunk_id == b"data":
+            # Streamed files leave the size unset
+            data_size = min(size, file_size - body)
+        elif chunk_id in (b"id3 ", b"ID3 "):
+            values = parse_id3(file, body)[0]
+        elif chunk_id == b"LIST" and file.read(4) == b"INFO":
+            sub_position = body + 4
+            while sub_position + 8 <= body + size:
+                sub_id, sub_size = struct.unpack("<4sI", _read_at(file, sub_position, 8))
+                field = RIFF_INFO_FIELDS.get(sub_id)
+                if field is not None:
+                    info[field] = _join([file.read(sub_size).split(b"\x00")[0].decode("latin-1")])
+                sub_position += 8 + sub_size + (sub_size & 1)
+        position = body + size + (size & 1)
+    if not byte_rate or data_size is None:
+        raise UnsupportedFile("Faltan los bloques fmt o data")
+    return (*(values or info), data_size / byte_rate)
+
+
+def read_tags(path: str) -> tuple | None:
+    """
+    Reads the title, album, artist and duration of an audio file from its headers.
+
+    Args:
+        path (str): The full path to the audio file.
+
+    Returns:
+        tuple | None: (title, album, artist, duration), where missing tags are None,
+        or None if the file is not an MP3, FLAC or WAV file this reader can handle.
+
+    Raises:
+        OSError: If the file cannot be opened or read.
+    """
+    with open(path, "rb", buffering=HEAD_SIZE) as file:
+        file_size = os.fstat(file.fileno()).st_size
+        head = file.read(12)
+        try:
+            if head[:4] == b"fLaC":
+                return read_flac(file)
+            if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+                return read_wav(file, file_size)
+            if head[:3] == b"ID3":
+                values, end = parse_id3(file)
+                if _read_at(file, end, 4) == b"fLaC":
+                    return None  # FLAC behind an ID3 tag is left to mutagen
+                return (*values, mp3_duration(file, end, file_size))
+            if path.lower().endswith(".mp3"):
+                return (None, None, None, mp3_duration(file, 0, file_size))
+        except (UnsupportedFile, struct.error, ValueError, IndexError, UnicodeDecodeError):
+            return None
+    return None
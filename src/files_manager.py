@@ -1,20 +1,123 @@
 import os
 import asyncio
+import threading
+import concurrent.futures
 from pathlib import Path
-from mutagen._file import File
+from typing import AsyncIterator
+from . import metrics
+from .fast_tags import read_tags
 
 
 AUDIO_EXTENSIONS = {"mp3", "flac", "wav", "aac", "m4a", "ogg", "wma", "alac", "opus"}
+SCAN_CHUNK_SIZE = 256
+SCAN_MAX_PENDING_CHUNKS = 8
+PREFETCH_MAX_BYTES = 64 * 1024 * 1024
+PREFETCH_BLOCK_SIZE = 1024 * 1024
+
+
+async def scan_audio_files(
+    root_path: str,
+    chunk_size: int = SCAN_CHUNK_SIZE,
+    max_pending_chunks: int = SCAN_MAX_PENDING_CHUNKS,
+) -> AsyncIterator[list[str]]:
+    """
+    Asynchronously scans a directory tree and yields the audio files found, in chunks.
+
+    The tree is walked with `os.scandir` in a background thread that hands chunks
+    of paths to the event loop through a bounded queue. Consumers can start working
+    on the first chunk while the rest of the tree is still being walked, and when
+    they fall behind the walker waits, so memory stays flat regardless of the size
+    of the tree. Directories that cannot be read are reported and skipped.
+
+    Args:
+        root_path (str): The absolute or relative path to the root directory
+                        to start the search from.
+        chunk_size (int): Maximum number of paths per yielded chunk.
+        max_pending_chunks (int): Maximum number of chunks waiting to be consumed.
+
+    Yields:
+        list[str]: A chunk of full paths to audio files.
+
+    Raises:
+        FileNotFoundError: If the initial `root_path` does not exist.
+    """
+    path = Path(root_path)
+    if not path.is_dir():
+        raise FileNotFoundError(f"Ruta inexistente: {root_path}")
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=max_pending_chunks)
+    stop_event = threading.Event()
+
+    def publish(item) -> None:
+        future = asyncio.run_coroutine_threadsafe(chunks.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return
+            except concurrent.futures.TimeoutError:
+                if stop_event.is_set():
+                    future.cancel()
+                    return
+
+    def walk() -> None:
+        try:
+            chunk = []
+            # Paths are built as the former os.walk scan built them, since they are the
+            # keys of existing repositories: "x.mp3" rather than "./x.mp3" for "."
+            root = str(path)
+            directories = [(root, "" if root == os.curdir else os.path.join(root, ""))]
+            with metrics.span("scan"):
+                while directories and not stop_event.is_set():
+                    directory, prefix = directories.pop()
+                    metrics.count("scan_directories")
+                    try:
+                        with os.scandir(directory) as entries:
+                            for entry in entries:
+                                if entry.is_dir(follow_symlinks=False):
+                                    child = prefix + entry.name
+                                    directories.append((child, child + os.sep))
+                                elif entry.name.lower().rsplit('.', 1)[-1] in AUDIO_EXTENSIONS:
+                                    chunk.append(prefix + entry.name)
+                                    if len(chunk) >= chunk_size:
+                                        metrics.count("scan_files", len(chunk))
+                                        publish(chunk)
+                                        chunk = []
+                    except OSError as e:
+                        metrics.count("scan_errors")
+                        print(f"[WARN] No se pudo leer el directorio {directory}: {e}")
+            if chunk:
+                metrics.count("scan_files", len(chunk))
+                publish(chunk)
+            publish(None)
+        except BaseException as e:
+            if not stop_event.is_set():
+                publish(e)
+
+    walker = threading.Thread(target=walk, daemon=True)
+    walker.start()
+
+    try:
+        while True:
+            item = await chunks.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop_event.set()
+        while not chunks.empty():
+            chunks.get_nowait()
 
 
 async def find_audio_files(root_path: str) -> list[str]:
     """
     Asynchronously finds all audio files in a given directory and its subdirectories.
 
-    This function scans the specified directory tree for files matching the extensions
-    defined in the `AUDIO_EXTENSIONS` set. The file system I/O is run in a
-    separate thread to prevent blocking the asyncio event loop, making it suitable
-    for asynchronous applications.
+    This function collects every chunk produced by `scan_audio_files` into a single
+    list. Callers that can process paths incrementally should iterate over
+    `scan_audio_files` directly instead.
 
     Args:
         root_path (str): The absolute or relative path to the root directory
@@ -28,32 +131,75 @@ async def find_audio_files(root_path: str) -> list[str]:
     Raises:
         FileNotFoundError: If the initial `root_path` does not exist.
     """
-    def walk() -> list[str]:
-        path = Path(root_path)
-        if not path.is_dir():
-            raise FileNotFoundError(f"Ruta inexistente: {root_path}")
-
-        return [
-            str(Path(dirpath) / name)
-            for dirpath, _, filenames in os.walk(path)
-            for name in filenames
-            if name.lower().rsplit('.', 1)[-1] in AUDIO_EXTENSIONS
-        ]
-
     try:
-        return await asyncio.to_thread(walk)
+        return [path async for chunk in scan_audio_files(root_path) for path in chunk]
     except NotADirectoryError as e:
         print(f"[ERROR] {e}")
         return []
 
 
+def file_fingerprint(path: str) -> tuple[int, int, int] | None:
+    """
+    Computes a cheap fingerprint of a file from its metadata, without reading it.
+
+    The fingerprint changes whenever the file is rewritten (size or modification
+    time) and the inode allows a renamed or moved file to be recognised.
+
+    Args:
+        path (str): The full path to the file.
+
+    Returns:
+        tuple[int, int, int] | None: The (size, mtime_ns, inode) of the file, or
+        None if the file cannot be accessed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+async def fingerprint_files(paths: list[str]) -> dict[str, tuple[int, int, int]]:
+    """
+    Asynchronously computes the fingerprint of many files.
+
+    The `os.stat` calls run in a separate thread so the event loop is not blocked.
+    Files that vanish or cannot be accessed are left out of the result.
+
+    Args:
+        paths (list[str]): Full paths of the files.
+
+    Returns:
+        dict[str, tuple[int, int, int]]: A dictionary mapping every accessible
+        path to its (size, mtime_ns, inode) fingerprint.
+    """
+    def stat_all() -> dict[str, tuple[int, int, int]]:
+        fingerprints = {}
+        for path in paths:
+            fingerprint = file_fingerprint(path)
+            if fingerprint is not None:
+                fingerprints[path] = fingerprint
+        return fingerprints
+
+    return await asyncio.to_thread(stat_all)
+
+
+def _tag_text(value) -> str | None:
+    # ID3 frames hold their values in `text` (str() would join them with NUL) and Vorbis
+    # comments come as lists; several values are joined with "/", as `fast_tags` does
+    values = getattr(value, "text", value)
+    if isinstance(values, list):
+        value = "/".join(str(item) for item in values if item)
+    return str(value) if value else None
+
+
 def extract_metadata(path: str) -> dict[str, tuple[str, str, str, float]]:
     """
-    Extracts metadata from a single audio file using the mutagen library.
+    Extracts metadata from a single audio file.
 
-    This function attempts to open an audio file and read its metadata tags,
-    including title, artist, album, and duration. It provides sensible fallbacks
-    for any missing information:
+    MP3, FLAC and WAV files are read by `fast_tags.read_tags`, which only reads
+    their headers. Other formats, and files it cannot handle, are read with the
+    mutagen library. It provides sensible fallbacks for any missing information:
     - Title: Falls back to the filename (without extension).
     - Artist/Album: Falls back to "Unknown".
     - Duration: Falls back to 0.0.
@@ -70,20 +216,54 @@ def extract_metadata(path: str) -> dict[str, tuple[str, str, str, float]]:
         (title, album, artist, duration).
     """
     try:
-        audio = File(path)
-        if audio is None:
-            return {path: ("Desconocido", "Desconocido", "Desconocido", 0.0)}
+        fast = read_tags(path)
+        if fast is not None:
+            title, album, artist, duration = fast
+        else:
+            from mutagen._file import File  # Imported on first use to keep startup fast
 
+            audio = File(path)
+            if audio is None:
+                return {path: ("Desconocido", "Desconocido", "Desconocido", 0.0)}
 
-        tags = audio.tags or {}
+            tags = audio.tags or {}
+            title = _tag_text(tags.get("TIT2") or tags.get("title"))
+            artist = _tag_text(tags.get("TPE1") or tags.get("artist"))
+            album = _tag_text(tags.get("TALB") or tags.get("album"))
+            duration = getattr(audio.info, "length", 0.0)
 
-        title = str(tags.get("TIT2") or tags.get("title") or Path(path).stem)
-        artist = str(tags.get("TPE1") or tags.get("artist") or "Desconocido")
-        album = str(tags.get("TALB") or tags.get("album") or "Desconocido")
-        duration = round(getattr(audio.info, "length", 0.0), 2)
-
-        return {path: (title, album, artist, duration)}
+        title = title or Path(path).stem
+        artist = artist or "Desconocido"
+        album = album or "Desconocido"
+        return {path: (title, album, artist, round(duration, 2))}
 
     except Exception as e:
         print(f"[WARN] Error extrayendo metadatos de {path}: {e}")
         return {path: ("Desconocido", "Desconocido", "Desconocido", 0.0)}
+
+
+def prefetch_file(path: str, max_bytes: int = PREFETCH_MAX_BYTES) -> int:
+    """
+    Reads the beginning of a file and discards it, so the OS caches it ahead of time.
+
+    Opening the file later, for instance when the player switches tracks, is then
+    served from memory instead of waiting for a slow disk or network mount.
+
+    Args:
+        path (str): The full path to the file.
+        max_bytes (int): Maximum number of bytes to read.
+
+    Returns:
+        int: The number of bytes read, 0 if the file cannot be read.
+    """
+    read = 0
+    try:
+        with open(path, "rb", buffering=0) as file:
+            while read < max_bytes:
+                block = file.read(PREFETCH_BLOCK_SIZE)
+                if not block:
+                    break
+                read += len(block)
+    except OSError:
+        pass
+    return read
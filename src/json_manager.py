@@ -1,7 +1,14 @@
+import os
 import json
-import aiofiles
+import time
+import asyncio
 from pathlib import Path
-from .files_manager import find_audio_files, extract_metadata
+from .files_manager import find_audio_files, scan_audio_files, fingerprint_files
+from .extractor import extract_metadata_parallel
+from .library import Library
+from .snapshot import SNAPSHOT_SUFFIX, MappedLibrary, write_snapshot
+from .duplicates import merged_paths
+from . import metrics
 import logging
 
 # Configure logging for better debugging
@@ -11,105 +18,482 @@ logger = logging.getLogger(__name__)
 # Use pathlib to ensure cross-platform compatibility
 DEFAULT_REPO_PATH = str(Path.home() / "za_player" / "za_repository.json")
 
-async def load_repository():
+# The journal is folded into a new snapshot once it is this large
+JOURNAL_MIN_COMPACT_BYTES = 1024 * 1024
+JOURNAL_COMPACT_RATIO = 0.5
+
+def _journal_path(path_obj):
+    """
+    Returns the path of the change journal kept next to a repository snapshot.
+
+    A binary snapshot keeps its suffix in the name of its journal, so it never
+    shares a journal with the JSON repository of the same name.
+    """
+    if path_obj.suffix == SNAPSHOT_SUFFIX:
+        return path_obj.with_name(path_obj.name + ".journal")
+    return path_obj.with_suffix(".journal")
+
+
+def _is_torn(journal_path):
+    """
+    Checks whether the last record of a journal was cut short by a crash.
+    """
+    try:
+        with open(journal_path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) != b"\n"
+    except OSError:
+        return False  # Missing or empty journal
+
+
+def _parse_library(content):
+    return Library(json.loads(content))
+
+
+def _is_snapshot(path_obj):
+    """
+    Checks whether a repository file is a binary snapshot (see `snapshot`) instead of JSON.
+    """
+    return path_obj.suffix == SNAPSHOT_SUFFIX
+
+
+def _write_snapshot(data, temp_path):
+    with open(temp_path, 'wb') as file:
+        size = write_snapshot(file, data)
+        file.flush()
+        os.fsync(file.fileno())
+    return size
+
+
+def _replay_journal(repo, content, journal_path):
+    """
+    Applies the changes recorded in a journal to a repository loaded from its snapshot.
+
+    A record cut short by a crash can only be the last one; it is ignored.
+    """
+    for line_number, line in enumerate(content.splitlines(), 1):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"Se ha ignorado un registro incompleto en {journal_path}:{line_number}.")
+            continue
+        if record[0] == "set":
+            repo[record[1]] = record[2]
+        elif record[0] == "del":
+            repo.pop(record[1], None)
+
+
+async def load_repository(path=None):
     """
     Asynchronously loads the music library from a JSON file.
 
-    This function checks if the repository file exists at the `DEFAULT_REPO_PATH`.
+    This function checks if the repository file exists at `path`, or at the `DEFAULT_REPO_PATH`.
     If it doesn't, it creates the necessary parent directories and an empty JSON file.
-    It then reads the file and deserializes its JSON content into a Python dictionary.
+    It then reads the snapshot, deserializes its JSON content into a Python dictionary
+    and replays on top of it the changes appended to the journal since the last
+    compaction (see `record_changes`).
+
+    A file ending with `SNAPSHOT_SUFFIX` is a binary snapshot instead: it is
+    mapped in memory as a `MappedLibrary`, which decodes tracks on access, so
+    opening it does not depend on the size of the library.
+
+    Args:
+        path (str | None): The repository file, such as a shard of `shard_manager`.
+                           Defaults to `DEFAULT_REPO_PATH`.
 
     Returns:
-        dict: A dictionary representing the music library, where keys are file paths
-            and values are metadata tuples. Returns an empty dictionary if the
-            repository is new or empty.
+        Library | MappedLibrary: A compact mapping representing the music library,
+            where keys are file paths and values are metadata tuples. Returns an
+            empty library if the repository is new or empty.
 
     Raises:
         PermissionError: If the process lacks permission to access or create the file.
         OSError: For other file system-related errors.
     """
-    path_obj = Path(DEFAULT_REPO_PATH).resolve()  # Normalize path for Windows compatibility
+    import aiofiles  # Imported on first use to keep startup fast
+
+    path_obj = Path(path or DEFAULT_REPO_PATH).resolve()  # Normalize path for Windows compatibility
+    journal_path = _journal_path(path_obj)
 
+    start = time.perf_counter()
     try:
         if not path_obj.exists():
             path_obj.parent.mkdir(parents=True, exist_ok=True)
-            async with aiofiles.open(path_obj, mode='w', encoding='utf-8') as file:
-                await file.write("{}")
-                logger.info("No se ha encontrado un repositorio, se ha creado uno nuevo.")
-            return {}
-
-        async with aiofiles.open(path_obj, mode='r', encoding='utf-8') as file:
-            content = await file.read()
-            logger.info("Se ha cargado el repositorio.")
-            return json.loads(content)
+            if _is_snapshot(path_obj):
+                await asyncio.to_thread(_write_snapshot, {}, path_obj)
+            else:
+                async with aiofiles.open(path_obj, mode='w', encoding='utf-8') as file:
+                    await file.write("{}")
+            logger.info("No se ha encontrado un repositorio, se ha creado uno nuevo.")
+            # A journal may have been written before the snapshot, its changes are replayed below
+            repo = Library()
+        elif _is_snapshot(path_obj):
+            # Only the header is read, pages of the records are mapped in as tracks are accessed
+            repo = MappedLibrary(str(path_obj))
+        else:
+            async with aiofiles.open(path_obj, mode='r', encoding='utf-8') as file:
+                metrics.count("repository_load_bytes", os.fstat(file.fileno()).st_size)
+                # Decoding runs in a thread, so the event loop stays free while a large library loads
+                repo = await asyncio.to_thread(_parse_library, await file.read())
+
+        if journal_path.exists():
+            async with aiofiles.open(journal_path, mode='r', encoding='utf-8') as file:
+                metrics.count("journal_load_bytes", os.fstat(file.fileno()).st_size)
+                _replay_journal(repo, await file.read(), journal_path)
+
+        metrics.observe("repository_load", time.perf_counter() - start)
+        logger.info("Se ha cargado el repositorio.")
+        return repo
     except PermissionError as e:
         logger.error(f"No se pudo acceder o crear el repositorio en {path_obj}: {e}")
-        return {}
+        return Library()
     except OSError as e:
         logger.error(f"Error del sistema al cargar el repositorio en {path_obj}: {e}")
-        return {}
+        return Library()
     except json.JSONDecodeError as e:
         logger.error(f"Error al decodificar el archivo JSON {path_obj}: {e}")
-        return {}
+        return Library()
+    except ValueError as e:
+        logger.error(f"Error al abrir la instantanea {path_obj}: {e}")
+        return Library()
+
+
+def repository_signature(path=None):
+    """
+    Returns a cheap value that changes whenever the repository files change.
+
+    It is made of the size and modification time of the snapshot and the journal,
+    so caches derived from the repository, such as the search index, can tell
+    whether they are stale without reading it.
+
+    Args:
+        path (str | None): The repository file. Defaults to `DEFAULT_REPO_PATH`.
+
+    Returns:
+        tuple: The (size, mtime_ns) of each repository file, or None for missing ones.
+    """
+    path_obj = Path(path or DEFAULT_REPO_PATH).resolve()  # Normalize path for Windows compatibility
+    signature = []
+    for file_path in (path_obj, _journal_path(path_obj)):
+        try:
+            stat = file_path.stat()
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
 
 
-async def save_repository(data):
+async def save_repository(data, path=None):
     """
     Asynchronously saves the music library dictionary to a JSON file.
 
-    This function serializes the given dictionary into a JSON formatted string and
-    writes it to the `DEFAULT_REPO_PATH`. The JSON is formatted with an indent
-    of 2 spaces for human readability.
+    This function serializes the given dictionary into a compact JSON snapshot and
+    writes it to a temporary file next to `DEFAULT_REPO_PATH`, which is flushed to
+    disk and then atomically renamed over the previous snapshot. A crash can
+    therefore never leave a half-written repository behind. The journal is
+    emptied afterwards, since the snapshot already contains all of its changes.
+    A file ending with `SNAPSHOT_SUFFIX` is written as a binary snapshot instead.
 
     Args:
-        data (dict): The dictionary containing the music library data to be saved.
+        data (dict | Library | MappedLibrary): The music library data to be saved.
+        path (str | None): The repository file. Defaults to `DEFAULT_REPO_PATH`.
 
     Raises:
         PermissionError: If the process lacks permission to write to the file.
         OSError: For other file system-related errors.
     """
-    path_obj = Path(DEFAULT_REPO_PATH).resolve()  # Normalize path for Windows compatibility
+    import aiofiles  # Imported on first use to keep startup fast
 
+    path_obj = Path(path or DEFAULT_REPO_PATH).resolve()  # Normalize path for Windows compatibility
+    temp_path = path_obj.with_suffix(".tmp")
+
+    start = time.perf_counter()
     try:
-        async with aiofiles.open(path_obj, mode='w', encoding='utf-8') as file:
-            await file.write(json.dumps(data, indent=2, ensure_ascii=False))
-            logger.info("Guardado exitosamente.")
+        path_obj.parent.mkdir(parents=True, exist_ok=True)
+        if _is_snapshot(path_obj):
+            metrics.count("repository_save_bytes", await asyncio.to_thread(_write_snapshot, data, temp_path))
+        else:
+            if not isinstance(data, dict):
+                data = data.to_dict()
+            async with aiofiles.open(temp_path, mode='w', encoding='utf-8') as file:
+                await file.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+                await file.flush()
+                await asyncio.to_thread(os.fsync, file.fileno())
+                metrics.count("repository_save_bytes", os.fstat(file.fileno()).st_size)
+        await asyncio.to_thread(os.replace, temp_path, path_obj)
+        # Replaying the journal over the new snapshot is harmless, so a crash here loses nothing
+        _journal_path(path_obj).unlink(missing_ok=True)
+        metrics.observe("repository_save", time.perf_counter() - start)
+        logger.info("Guardado exitosamente.")
     except PermissionError as e:
         logger.error(f"No se pudo escribir en {path_obj}: {e}")
     except OSError as e:
         logger.error(f"Error del sistema al guardar el repositorio en {path_obj}: {e}")
 
 
-async def update_repository(paths):
+async def record_changes(repo, upserts, removals=(), path=None):
+    """
+    Asynchronously persists a set of changes already applied to the repository.
+
+    Instead of rewriting the whole snapshot, the changes are appended to the journal
+    as one JSON line per entry and flushed to disk, so the cost is proportional to
+    the number of changes. Once the journal grows past `JOURNAL_COMPACT_RATIO` times
+    the size of the snapshot (and at least `JOURNAL_MIN_COMPACT_BYTES`), `repo` is
+    compacted into a new snapshot with `save_repository`.
+
+    Args:
+        repo (dict | Library | None): The whole repository, with the changes already
+                                      applied. When None, it is loaded from disk
+                                      only if the journal has to be compacted.
+        upserts (dict): The entries added or replaced, keyed by path.
+        removals (Iterable[str]): The paths whose entries were removed.
+        path (str | None): The repository file. Defaults to `DEFAULT_REPO_PATH`.
+
+    Raises:
+        PermissionError: If the process lacks permission to write to the file.
+        OSError: For other file system-related errors.
+    """
+    import aiofiles  # Imported on first use to keep startup fast
+
+    path_obj = Path(path or DEFAULT_REPO_PATH).resolve()  # Normalize path for Windows compatibility
+    journal_path = _journal_path(path_obj)
+
+    records = [json.dumps(["del", path], ensure_ascii=False) for path in removals]
+    records.extend(json.dumps(["set", path, entry], ensure_ascii=False) for path, entry in upserts.items())
+    if not records:
+        return
+    changes = len(records)
+
+    start = time.perf_counter()
+    try:
+        # Never glue the first record to a torn one, or both would be lost
+        if await asyncio.to_thread(_is_torn, journal_path):
+            records.insert(0, "")
+        async with aiofiles.open(journal_path, mode='a', encoding='utf-8') as file:
+            previous_size = os.fstat(file.fileno()).st_size
+            await file.write("\n".join(records) + "\n")
+            await file.flush()
+            await asyncio.to_thread(os.fsync, file.fileno())
+            journal_size = os.fstat(file.fileno()).st_size
+        metrics.count("journal_save_bytes", journal_size - previous_size)
+        metrics.count("journal_records", changes)
+        metrics.observe("journal_append", time.perf_counter() - start)
+    except PermissionError as e:
+        logger.error(f"No se pudo escribir en {journal_path}: {e}")
+        return
+    except OSError as e:
+        logger.error(f"Error del sistema al escribir el diario {journal_path}: {e}")
+        return
+
+    logger.info(f"Se han registrado {changes} cambios en el diario.")
+    snapshot_size = path_obj.stat().st_size if path_obj.exists() else 0
+    if journal_size > max(JOURNAL_MIN_COMPACT_BYTES, snapshot_size * JOURNAL_COMPACT_RATIO):
+        if repo is None:
+            repo = await load_repository(path)
+        await save_repository(repo, path)
+
+
+async def update_repository(paths, mode="process", max_workers=None, repo=None, path=None, merged=None):
     """
     Scans a directory for new audio files and updates the repository.
 
     This function first loads the existing repository, then scans the specified
-    `path_to_scan` for audio files. For each file found, it checks if it already
-    exists in the repository. If not, it extracts its metadata and adds the new
-    entry to the library. Finally, it saves the updated repository back to disk.
+    `path_to_scan` for audio files with `scan_audio_files`. Files not yet in the
+    repository, nor merged away as duplicates, are fed to `extract_metadata_parallel` while the scan is still
+    running, so walking the tree and parsing tags overlap, and the new entries are
+    added to the library. Finally, the new entries are appended to the journal
+    with `record_changes`.
 
     Args:
         paths (str): The path to the directory to scan for new audio files.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+        repo (Library | None): The already loaded repository. It is updated in
+                               place, along with its indexes, instead of being
+                               loaded again from disk.
+        path (str | None): The repository file. Defaults to `DEFAULT_REPO_PATH`.
+        merged (set | None): The duplicates merged away, see `duplicates.merged_paths`.
+                             Defaults to those whose kept copy is in `repo`.
+
+    Returns:
+        Library: The updated repository.
 
     Raises:
         FileNotFoundError: If the provided path does not exist.
     """
     try:
-        repo = await load_repository()
-        audio_files_paths = await find_audio_files(paths)
-        new_entries = {
-            file_path: extract_metadata(file_path)[file_path]
-            for file_path in audio_files_paths
-            if file_path not in repo
-        }
+        if repo is None:
+            repo = await load_repository(path)
+        if merged is None:
+            merged = await asyncio.to_thread(merged_paths, repo)
+        pending_paths = (
+            [file_path for file_path in chunk if file_path not in repo and file_path not in merged]
+            async for chunk in scan_audio_files(paths)
+        )
+
+        new_entries = {}
+        async for batch in extract_metadata_parallel(pending_paths, mode=mode, max_workers=max_workers):
+            new_entries.update(batch)
+
         if not new_entries:
             logger.info("No hay archivos nuevos para agregar.")
-            return
+            return repo
 
+        logger.info(f"Se han extraido los metadatos de {len(new_entries)} archivos nuevos.")
         repo.update(new_entries)
-        await save_repository(repo)
+        await record_changes(repo, new_entries, path=path)
+    except FileNotFoundError as e:
+        logger.error(f"No se pudo escanear el directorio {paths}: {e}")
+    except Exception as e:
+        logger.error(f"Error inesperado al actualizar el repositorio: {e}")
+    return repo
+
+
+def _is_under(path, root):
+    """
+    Checks whether a repository path belongs to a scanned root directory.
+    """
+    if root == os.curdir:
+        # Scanning "." stores paths without a "./" prefix, see `scan_audio_files`
+        return not os.path.isabs(path) and path.split(os.sep, 1)[0] != os.pardir
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+async def reconcile(repo, on_disk, vanished, mode="process", max_workers=None):
+    """
+    Works out the repository changes that bring a set of entries in sync with the disk.
+
+    - Files of `on_disk` whose fingerprint matches their entry are skipped.
+    - Modified files, and legacy entries without a fingerprint, are re-extracted.
+    - New files with the same fingerprint as a `vanished` entry take over that
+      entry (the file was moved), the others are extracted.
+    - The remaining `vanished` entries are removed.
+
+    The repository is not modified.
+
+    Args:
+        repo (dict): The repository.
+        on_disk (dict): The fingerprint of every file to check, keyed by path.
+        vanished (set): Repository paths whose file no longer exists.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+
+    Returns:
+        tuple[dict, set, int]: The entries to add or replace, keyed by path, the
+        paths whose entries must be removed and how many entries were moved.
+    """
+    vanished = set(vanished)
+    vanished_by_fingerprint = {
+        tuple(repo[file_path][4]): file_path
+        for file_path in vanished
+        if len(repo[file_path]) > 4 and repo[file_path][4]
+    }
+
+    upserts = {}
+    removals = set()
+    to_extract = []
+    for file_path, fingerprint in on_disk.items():
+        entry = repo.get(file_path)
+        if entry is not None:
+            if len(entry) <= 4 or not entry[4] or tuple(entry[4]) != fingerprint:
+                to_extract.append(file_path)
+            continue
+
+        old_path = vanished_by_fingerprint.pop(fingerprint, None)
+        if old_path is not None:
+            upserts[file_path] = repo[old_path]
+            removals.add(old_path)
+            vanished.discard(old_path)
+        else:
+            to_extract.append(file_path)
+
+    moved = len(upserts)
+    removals |= vanished
+    if to_extract:
+        async for batch in extract_metadata_parallel(to_extract, mode=mode, max_workers=max_workers):
+            upserts.update(batch)
+    return upserts, removals, moved
+
+
+async def plan_rescan(repo, paths, mode="process", max_workers=None, merged=None):
+    """
+    Compares the repository entries of a directory with the files currently on disk.
+
+    Every audio file found under `paths` is fingerprinted with a cheap `os.stat`
+    (size, mtime_ns, inode) and compared with the fingerprint stored in its entry:
+    - Unchanged files are skipped without reading their tags.
+    - Modified files, and legacy entries without a fingerprint, are re-extracted.
+    - Entries whose file no longer exists are removed, unless a new path with the
+      same inode, size and mtime is found, in which case the entry is moved to it.
+    - New files are extracted and added, except duplicates merged away by
+      `duplicates.merge_duplicates`.
+    The comparison itself is done by `reconcile`.
+
+    Only entries located under `paths` are considered, so rescanning one folder
+    never drops entries belonging to another one. The repository is not modified.
+
+    Args:
+        repo (dict): The repository, or at least every entry located under `paths`.
+        paths (str): The path to the directory to rescan.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+        merged (set | None): The duplicates merged away, see `duplicates.merged_paths`.
+                             Defaults to those whose kept copy is in `repo`.
+
+    Returns:
+        tuple[dict, set]: The entries to add or replace, keyed by path, and the
+        paths whose entries must be removed.
+
+    Raises:
+        FileNotFoundError: If the provided path does not exist.
+    """
+    if merged is None:
+        merged = await asyncio.to_thread(merged_paths, repo)
+    audio_files_paths = [file_path for file_path in await find_audio_files(paths) if file_path not in merged]
+    on_disk = await fingerprint_files(audio_files_paths)
+
+    root = str(Path(paths))
+    vanished = {
+        file_path for file_path in repo
+        if _is_under(file_path, root) and file_path not in on_disk
+    }
+    upserts, removals, moved = await reconcile(repo, on_disk, vanished, mode, max_workers)
+
+    logger.info(
+        f"Reescaneo completado: {len(upserts) - moved} extraidos, {moved} movidos, "
+        f"{len(removals) - moved} eliminados, {len(on_disk) - len(upserts)} sin cambios."
+    )
+    return upserts, removals
+
+
+async def rescan_repository(paths, mode="process", max_workers=None, path=None):
+    """
+    Rescans a directory and brings its repository entries in sync with the disk.
+
+    Modified files are re-extracted, vanished files are removed and moved files
+    keep their entry under the new path, as described in `plan_rescan`. Only the
+    changes are written, through `record_changes`.
+
+    Args:
+        paths (str): The path to the directory to rescan.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+        path (str | None): The repository file. Defaults to `DEFAULT_REPO_PATH`.
+
+    Raises:
+        FileNotFoundError: If the provided path does not exist.
+    """
+    try:
+        repo = await load_repository(path)
+        upserts, removals = await plan_rescan(repo, paths, mode, max_workers)
+        if not upserts and not removals:
+            return
+
+        for file_path in removals:
+            del repo[file_path]
+        repo.update(upserts)
+        await record_changes(repo, upserts, removals, path=path)
     except FileNotFoundError as e:
         logger.error(f"No se pudo escanear el directorio {paths}: {e}")
     except Exception as e:
-        logger.error(f"Error inesperado al actualizar el repositorio: {e}")
\ No newline at end of file
+        logger.error(f"Error inesperado al reescanear el repositorio: {e}")
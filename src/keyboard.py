@@ -0,0 +1,136 @@
+import os
+import sys
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from .mixer_events import LoopQueue
+
+
+class KeyReader(ABC):
+    """
+    Delivers the keys pressed in the terminal to an asyncio queue, one character at a time.
+
+    Use it as an asynchronous context manager and `await reader.get()` for each
+    key. Nothing runs between two key presses: the backend only wakes up when
+    the terminal has input.
+    """
+
+    def __init__(self):
+        self._keys = asyncio.Queue()
+
+    async def __aenter__(self) -> "KeyReader":
+        self.start(asyncio.get_running_loop())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    @abstractmethod
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Starts listening to the terminal.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Stops listening and gives the terminal back in its original state.
+        """
+
+    async def get(self) -> str:
+        """
+        Waits for the next printable key.
+        """
+        return await self._keys.get()
+
+
+class PosixKeyReader(KeyReader):
+    """
+    Reads stdin from the event loop itself with `loop.add_reader`.
+
+    The terminal is switched to cbreak mode, so keys arrive without waiting for
+    Enter while Ctrl+C and output processing keep working.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._loop = None
+        self._fd = None
+        self._old_settings = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._fd = sys.stdin.fileno()
+        if os.isatty(self._fd):
+            import termios
+            import tty
+            self._old_settings = termios.tcgetattr(self._fd)
+            tty.setcbreak(self._fd)
+        loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, 64)
+        except OSError:
+            data = b""
+        if not data:
+            # End of input, such as a closed pipe: stop watching it
+            self._loop.remove_reader(self._fd)
+            return
+        for key in data.decode("utf-8", errors="ignore"):
+            if key.isprintable():  # Solo procesar caracteres imprimibles
+                self._keys.put_nowait(key)
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        self._loop.remove_reader(self._fd)
+        if self._old_settings is not None:
+            import termios
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._old_settings)
+            self._old_settings = None
+        self._fd = None
+
+
+class WindowsKeyReader(KeyReader):
+    """
+    Reads the Windows console with a blocking `msvcrt.getwch()` in a daemon thread.
+
+    The Windows event loop cannot watch the console, so a thread waits for keys
+    instead. It sleeps inside `getwch` until a key is pressed, so it never spins.
+    A blocked `getwch` cannot be interrupted: after `close`, the thread keeps
+    waiting and discards the next key before exiting.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._closed = threading.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        keys = LoopQueue(loop, self._keys)
+        threading.Thread(target=self._read, args=(keys,), daemon=True).start()
+
+    def _read(self, keys: LoopQueue) -> None:
+        import msvcrt
+        while not self._closed.is_set():
+            key = msvcrt.getwch()
+            if key in ("\x00", "\xe0"):
+                msvcrt.getwch()  # Arrow and function keys send a second code
+                continue
+            if not self._closed.is_set() and key.isprintable():  # Solo procesar caracteres imprimibles
+                keys.put(key)
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+def create_key_reader() -> KeyReader:
+    """
+    Returns the key reader suited to the current platform.
+
+    Returns:
+        KeyReader: A `WindowsKeyReader` on Windows, a `PosixKeyReader` elsewhere.
+    """
+    if sys.platform == "win32":
+        return WindowsKeyReader()
+    return PosixKeyReader()
@@ -0,0 +1,404 @@
+import os
+from array import array
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from typing import NamedTuple
+
+# Marks a row without a (size, mtime_ns, inode) fingerprint
+NO_FINGERPRINT = -1
+# Tag values that stand for a missing tag, including the placeholder stored by the extractor
+UNKNOWN_TAGS = {None, "", "Desconocido"}
+
+
+class Facet(NamedTuple):
+    """
+    An album or artist, with the number of tracks and total duration it groups.
+    """
+    name: str
+    tracks: int
+    duration: float
+
+
+class Summary(NamedTuple):
+    """
+    The size of a library: its number of tracks, albums and artists, and its total duration.
+    """
+    tracks: int
+    albums: int
+    artists: int
+    duration: float
+
+
+# Columns a library can be ordered by
+SORT_FIELDS = ("path", "title", "artist", "album", "duration")
+
+
+class Library(MutableMapping):
+    """
+    A compact, column-oriented music library that behaves like the repository dictionary.
+
+    Instead of one list per track, every field is stored in its own column:
+    - Paths split into their directory, stored once per directory, and their file name.
+    - Titles in a list.
+    - Albums and artists dictionary-encoded: each distinct name is stored once in a
+      shared pool and rows keep its index in an `array('I')`.
+    - Durations in an `array('f')` and fingerprints in three integer arrays.
+
+    Reading `library[path]` returns the same (title, album, artist, duration,
+    fingerprint) entry layout found in `za_repository.json`, so code written
+    against the plain dictionary keeps working. Removing a track moves the last
+    row into its place, so columns stay dense. Album and artist lookups go through
+    `index`, which is built on first use and then kept up to date by every change.
+    """
+
+    __slots__ = (
+        "_dirs", "_files", "_titles", "_albums", "_artists", "_durations",
+        "_sizes", "_mtimes", "_inodes", "_dir_names", "_dir_ids", "_dir_rows",
+        "_names", "_name_ids", "_index",
+    )
+
+    def __init__(self, entries=None):
+        """
+        Args:
+            entries (Mapping | None): Initial entries, keyed by path, such as the
+                                      dictionary decoded from `za_repository.json`.
+        """
+        self._dirs = array('I')
+        self._files = []
+        self._titles = []
+        self._albums = array('I')
+        self._artists = array('I')
+        self._durations = array('f')
+        self._sizes = array('q')
+        self._mtimes = array('q')
+        self._inodes = array('Q')
+        self._dir_names = []
+        self._dir_ids = {}
+        self._dir_rows = []
+        self._names = []
+        self._name_ids = {}
+        self._index = None
+        if entries:
+            self.update(entries)
+
+    @staticmethod
+    def _split(path: str) -> tuple[str, str]:
+        # The separator stays in the directory part so that joining is a plain concatenation
+        cut = max(path.rfind(os.sep), path.rfind('/')) + 1
+        return path[:cut], path[cut:]
+
+    def _row(self, path: str) -> int:
+        directory, name = self._split(path)
+        return self._dir_rows[self._dir_ids[directory]][name]
+
+    def _path(self, row: int) -> str:
+        return self._dir_names[self._dirs[row]] + self._files[row]
+
+    def _name_id(self, name) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def _entry(self, row: int) -> tuple:
+        fingerprint = None
+        if self._sizes[row] != NO_FINGERPRINT:
+            fingerprint = (self._sizes[row], self._mtimes[row], self._inodes[row])
+        return (
+            self._titles[row],
+            self._names[self._albums[row]],
+            self._names[self._artists[row]],
+            round(self._durations[row], 2),  # Undo the float32 rounding noise
+            fingerprint,
+        )
+
+    @property
+    def index(self) -> "LibraryIndex":
+        """
+        The album and artist index of the library, built on first access.
+        """
+        if self._index is None:
+            self._index = LibraryIndex(self)
+        return self._index
+
+    def __getitem__(self, path: str) -> tuple:
+        return self._entry(self._row(path))
+
+    def __setitem__(self, path: str, entry) -> None:
+        title, album, artist, duration = entry[:4]
+        fingerprint = entry[4] if len(entry) > 4 and entry[4] else None
+        size, mtime_ns, inode = fingerprint or (NO_FINGERPRINT, 0, 0)
+
+        directory, name = self._split(path)
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dir_names)
+            self._dir_names.append(directory)
+            self._dir_rows.append({})
+
+        row = self._dir_rows[dir_id].get(name)
+        if row is None:
+            self._dir_rows[dir_id][name] = len(self._files)
+            self._dirs.append(dir_id)
+            self._files.append(name)
+            self._titles.append(title)
+            self._albums.append(self._name_id(album))
+            self._artists.append(self._name_id(artist))
+            self._durations.append(duration or 0.0)
+            self._sizes.append(size)
+            self._mtimes.append(mtime_ns)
+            self._inodes.append(inode)
+            if self._index is not None:
+                self._index._add(len(self._files) - 1)
+            return
+
+        if self._index is not None:
+            self._index._remove(row)
+        self._titles[row] = title
+        self._albums[row] = self._name_id(album)
+        self._artists[row] = self._name_id(artist)
+        self._durations[row] = duration or 0.0
+        self._sizes[row] = size
+        self._mtimes[row] = mtime_ns
+        self._inodes[row] = inode
+        if self._index is not None:
+            self._index._add(row)
+
+    def __delitem__(self, path: str) -> None:
+        directory, name = self._split(path)
+        row = self._dir_rows[self._dir_ids[directory]].pop(name)
+        last = len(self._files) - 1
+        if self._index is not None:
+            self._index._remove(row)
+            if row != last:
+                self._index._move(last, row)
+        columns = (
+            self._dirs, self._files, self._titles, self._albums, self._artists,
+            self._durations, self._sizes, self._mtimes, self._inodes,
+        )
+        if row != last:
+            for column in columns:
+                column[row] = column[last]
+            self._dir_rows[self._dirs[row]][self._files[row]] = row
+        for column in columns:
+            column.pop()
+
+    def __contains__(self, path) -> bool:
+        try:
+            self._row(path)
+        except (KeyError, AttributeError):
+            return False
+        return True
+
+    def __iter__(self):
+        return map(self._path, range(len(self._files)))
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __repr__(self) -> str:
+        return f"<Library: {len(self)} tracks in {len(self._dir_names)} folders>"
+
+    def items(self):
+        return _LibraryItems(self)
+
+    def values(self):
+        return _LibraryValues(self)
+
+    def item_at(self, row: int) -> tuple[str, tuple]:
+        """
+        Returns the (path, entry) pair stored at a row, as listed by `order_by`.
+        """
+        return self._path(row), self._entry(row)
+
+    def paths_named(self, names) -> dict[str, list[str]]:
+        """
+        Returns the paths of the tracks whose file name is one of `names`, grouped by name.
+
+        Only the file name column is read, so a single pass answers any number of names.
+        """
+        found = {}
+        for row, name in enumerate(self._files):
+            if name in names:
+                found.setdefault(name, []).append(self._path(row))
+        return found
+
+    def order_by(self, field: str, reverse: bool = False) -> array:
+        """
+        Returns the rows of the library sorted by one column.
+
+        Only the column itself is read, so no entry is built while sorting. Rows
+        are renumbered when a track is removed, so the result is only valid until
+        the library changes.
+
+        Args:
+            field (str): One of `SORT_FIELDS`.
+            reverse (bool): Sort in descending order.
+
+        Returns:
+            array: The row numbers, to be read with `item_at`.
+
+        Raises:
+            ValueError: If `field` is not one of `SORT_FIELDS`.
+        """
+        rows = range(len(self._files))
+        if field == "path":
+            order = sorted(rows, key=self._path, reverse=reverse)
+        elif field == "duration":
+            order = sorted(rows, key=self._durations.__getitem__, reverse=reverse)
+        elif field in ("title", "artist", "album"):
+            if field == "title":
+                values = self._titles
+            else:
+                names = self._names
+                ids = self._artists if field == "artist" else self._albums
+                values = [names[name_id] for name_id in ids]
+            order = sorted(rows, key=lambda row: (values[row] is None, values[row] or ""), reverse=reverse)
+        else:
+            raise ValueError(f"Columna de ordenacion desconocida: {field}")
+        return array('I', order)
+
+    def summary(self) -> Summary:
+        """
+        Returns the number of tracks, albums and artists and the total duration of the library.
+        """
+        index = self.index
+        return Summary(
+            len(self._files),
+            len(index._albums.rows),
+            len(index._artists.rows),
+            round(sum(self._durations), 2),
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Returns the library as the plain dictionary stored in `za_repository.json`.
+        """
+        return dict(self.items())
+
+
+class _LibraryItems(ItemsView):
+    def __iter__(self):
+        library = self._mapping
+        rows = range(len(library))
+        return zip(map(library._path, rows), map(library._entry, rows))
+
+
+class _LibraryValues(ValuesView):
+    def __iter__(self):
+        library = self._mapping
+        return map(library._entry, range(len(library)))
+
+
+class _Groups:
+    """
+    The rows grouped under each album (or artist) name id, with their total duration.
+    """
+
+    __slots__ = ("rows", "durations", "order")
+
+    def __init__(self):
+        self.rows = {}
+        self.durations = {}
+        self.order = None  # Name ids sorted by name, rebuilt after a group appears or vanishes
+
+    def add(self, name_id: int, row: int, duration: float) -> None:
+        group = self.rows.get(name_id)
+        if group is None:
+            group = self.rows[name_id] = set()
+            self.durations[name_id] = 0.0
+            self.order = None
+        group.add(row)
+        self.durations[name_id] += duration
+
+    def remove(self, name_id: int, row: int, duration: float) -> None:
+        group = self.rows[name_id]
+        group.discard(row)
+        if group:
+            self.durations[name_id] -= duration
+        else:
+            del self.rows[name_id]
+            del self.durations[name_id]
+            self.order = None
+
+    def move(self, name_id: int, old_row: int, new_row: int) -> None:
+        group = self.rows[name_id]
+        group.discard(old_row)
+        group.add(new_row)
+
+
+class LibraryIndex:
+    """
+    Inverted album and artist indexes over the rows of a `Library`.
+
+    Every album and artist name maps to the set of rows it contains, together with
+    a running total of their durations. Selecting the tracks of an album therefore
+    costs O(album size) instead of a pass over the whole library, and the sorted
+    facet lists are only re-sorted after an album or artist appeared or vanished.
+    """
+
+    __slots__ = ("_library", "_albums", "_artists")
+
+    def __init__(self, library: Library):
+        """
+        Args:
+            library (Library): The library to index. It keeps the index up to date.
+        """
+        self._library = library
+        self._albums = _Groups()
+        self._artists = _Groups()
+        for row in range(len(library)):
+            self._add(row)
+
+    def _add(self, row: int) -> None:
+        library = self._library
+        self._albums.add(library._albums[row], row, library._durations[row])
+        self._artists.add(library._artists[row], row, library._durations[row])
+
+    def _remove(self, row: int) -> None:
+        library = self._library
+        self._albums.remove(library._albums[row], row, library._durations[row])
+        self._artists.remove(library._artists[row], row, library._durations[row])
+
+    def _move(self, old_row: int, new_row: int) -> None:
+        library = self._library
+        self._albums.move(library._albums[old_row], old_row, new_row)
+        self._artists.move(library._artists[old_row], old_row, new_row)
+
+    def _tracks(self, groups: _Groups, name) -> list[tuple[str, str]]:
+        library = self._library
+        rows = groups.rows.get(library._name_ids.get(name), ())
+        return [(library._path(row), library._titles[row]) for row in rows]
+
+    def _facets(self, groups: _Groups) -> list[Facet]:
+        names = self._library._names
+        if groups.order is None:
+            groups.order = sorted(groups.rows, key=lambda name_id: (names[name_id] is None, names[name_id] or ""))
+        return [
+            Facet(names[name_id], len(groups.rows[name_id]), round(groups.durations[name_id], 2))
+            for name_id in groups.order
+        ]
+
+    def album_tracks(self, album: str) -> list[tuple[str, str]]:
+        """
+        Returns the (path, title) tuples of every track of an album, in no particular order.
+        """
+        return self._tracks(self._albums, album)
+
+    def artist_tracks(self, artist: str) -> list[tuple[str, str]]:
+        """
+        Returns the (path, title) tuples of every track by an artist, in no particular order.
+        """
+        return self._tracks(self._artists, artist)
+
+    def albums(self) -> list[Facet]:
+        """
+        Returns every album sorted by name, with its number of tracks and total duration.
+        """
+        return self._facets(self._albums)
+
+    def artists(self) -> list[Facet]:
+        """
+        Returns every artist sorted by name, with its number of tracks and total duration.
+        """
+        return self._facets(self._artists)
@@ -0,0 +1,168 @@
+from rich.console import Console
+from rich.prompt import Prompt
+from rich.table import Table
+from .library import SORT_FIELDS, Library, Summary
+
+DEFAULT_PAGE_SIZE = 25
+
+# Keys of the browser that select a sort column
+SORT_KEYS = {"0": None, "1": "title", "2": "artist", "3": "album", "4": "duration"}
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Formats a number of seconds as "h:mm:ss", or "m:ss" below one hour.
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class LibraryView:
+    """
+    A paginated, sortable window over a `Library`.
+
+    Only the rows of the requested page are turned into entries, so showing a
+    page costs the same for ten tracks or a million. Sorting reads a single
+    column of the library and the resulting order is cached per column.
+    """
+
+    def __init__(self, repo: Library, page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        Args:
+            repo (Library): The library to show.
+            page_size (int): Number of tracks per page.
+        """
+        self.repo = repo
+        self.page_size = page_size
+        self.field = None           # None keeps the storage order, which needs no sorting
+        self.reverse = False
+        self._orders = {}
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.repo) // self.page_size))
+
+    def sort_by(self, field: str | None, reverse: bool = False) -> None:
+        """
+        Orders the following pages by a column.
+
+        Args:
+            field (str | None): One of `SORT_FIELDS`, or None for the storage order.
+            reverse (bool): Sort in descending order.
+
+        Raises:
+            ValueError: If `field` is not one of `SORT_FIELDS`.
+        """
+        if field is not None and field not in SORT_FIELDS:
+            raise ValueError(f"Columna de ordenacion desconocida: {field}")
+        self.field = field
+        self.reverse = reverse
+
+    def page(self, number: int) -> list[tuple[str, tuple]]:
+        """
+        Returns the (path, entry) pairs shown on a page.
+
+        Args:
+            number (int): Page number, starting at 0. Out of range numbers are clamped.
+
+        Returns:
+            list[tuple[str, tuple]]: The tracks of the page, in display order.
+        """
+        number = min(max(number, 0), self.page_count - 1)
+        start = number * self.page_size
+        stop = min(start + self.page_size, len(self.repo))
+        if self.field is None:
+            rows = range(start, stop)
+            if self.reverse:
+                rows = range(len(self.repo) - 1 - start, len(self.repo) - 1 - stop, -1)
+        else:
+            order = self._orders.get(self.field)
+            if order is None or len(order) != len(self.repo):
+                order = self._orders[self.field] = self.repo.order_by(self.field)
+            if self.reverse:
+                rows = order[len(order) - stop:len(order) - start][::-1]
+            else:
+                rows = order[start:stop]
+        return [self.repo.item_at(row) for row in rows]
+
+
+def summary_table(summary: Summary) -> Table:
+    """
+    Builds a small table with the size of the library.
+    """
+    table = Table(title="Song Library", title_style="bold blue", border_style="dim", show_header=False)
+    table.add_column(style="grey78")
+    table.add_column(justify="right", style="white")
+    table.add_row("Songs", f"{summary.tracks}")
+    table.add_row("Albums", f"{summary.albums}")
+    table.add_row("Artists", f"{summary.artists}")
+    table.add_row("Total duration", format_duration(summary.duration))
+    return table
+
+
+def page_table(view: LibraryView, number: int) -> Table:
+    """
+    Builds the table of a single page of a `LibraryView`.
+    """
+    order = "storage order" if view.field is None else f"by {view.field}"
+    if view.reverse:
+        order += ", descending"
+    table = Table(
+        title="Song Library",
+        title_style="bold blue",
+        border_style="dim",
+        caption=f"Page {number + 1} of {view.page_count} ({order})",
+    )
+    table.add_column("Title", style="white")
+    table.add_column("Artist", style="grey78")
+    table.add_column("Album", style="grey78")
+    table.add_column("Duration (sec)", justify="right", style="white")
+
+    for path, metadata in view.page(number):
+        title, album, artist, duration = metadata[:4]
+        table.add_row(title or "Unknown", artist or "Unknown", album or "Unknown", f"{duration}")
+    return table
+
+
+BROWSE_QUESTION = "[blue]n (next), p (previous), 1-4 (sort by title, artist, album, duration), 0 (unsorted), q (done)[/blue]"
+
+
+def browse_library(console: Console, view: LibraryView, render=page_table, question: str = BROWSE_QUESTION) -> None:
+    """
+    Lets the user page through the library and change its order from the terminal.
+
+    Args:
+        console (Console): The console to print the pages on.
+        view (LibraryView): The library to browse.
+        render (Callable[[LibraryView, int], Table]): Builds the table of a page.
+        question (str): The prompt listing the commands.
+
+    Commands:
+        n: Next page
+        p: Previous page
+        1-4: Sort by title, artist, album or duration (again to reverse)
+        0: Back to the storage order
+        q: Stop browsing
+    """
+    number = 0
+    while True:
+        console.print(render(view, number))
+        command = Prompt.ask(
+            question,
+            choices=["n", "p", "q", *SORT_KEYS],
+            default="n" if number < view.page_count - 1 else "q",
+            show_choices=False,
+        ).lower()
+        if command == "q":
+            return
+        if command == "n":
+            number = min(number + 1, view.page_count - 1)
+        elif command == "p":
+            number = max(number - 1, 0)
+        else:
+            field = SORT_KEYS[command]
+            view.sort_by(field, reverse=view.field == field and not view.reverse)
+            number = 0
@@ -0,0 +1,389 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from statistics import median
+from .files_manager import fingerprint_files, file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_LOUDNESS_PATH = str(Path.home() / "za_player" / "za_loudness.jsonl")
+
+# Loudness every track is brought to, in LUFS, as in ReplayGain 2.0
+REFERENCE_LOUDNESS = -18.0
+# BS.1770 gating: 400 ms blocks every 100 ms, absolute gate and relative gate below the ungated loudness
+SEGMENTS_PER_BLOCK = 4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# Decoded audio is analysed one minute at a time, so the FFT does not add copies of a whole track
+SEGMENTS_PER_CHUNK = 600
+# Longest track decoded: pygame decodes a whole file in memory, about 10 MB a minute at 44.1 kHz stereo
+MAX_DECODE_SECONDS = 30 * 60
+# Largest file of unknown duration decoded: a `MAX_DECODE_SECONDS` track at 64 kbit/s, the lowest common bitrate
+MAX_UNKNOWN_DECODE_BYTES = MAX_DECODE_SECONDS * 64_000 // 8
+# Priority of the analysis workers, so they yield the CPU to playback
+WORKER_NICENESS = 10
+PROGRESS_EVERY = 1000
+
+
+def track_volume(loudness: float | None, default: float = 1.0) -> float:
+    """
+    Returns the mixer volume that brings a track to `REFERENCE_LOUDNESS`.
+
+    `pygame.mixer.music.set_volume` can only attenuate, so tracks quieter than
+    the reference play at full volume.
+    """
+    if loudness is None:
+        return default
+    return min(1.0, 10 ** ((REFERENCE_LOUDNESS - loudness) / 20))
+
+
+class LoudnessStore:
+    """
+    The integrated loudness and peak of the library files.
+
+    Results are keyed by the (size, mtime_ns, inode) fingerprint of their file,
+    so a renamed or moved file keeps its result, and a modified one is analysed
+    again. The store is a JSON Lines file, `DEFAULT_LOUDNESS_PATH`, and every
+    result is appended to it as soon as it is known: an interrupted analysis
+    resumes where it stopped and loses at most the tracks being decoded.
+    """
+
+    def __init__(self, tracks=None):
+        self.tracks = tracks or {}  # Fingerprint -> (loudness in LUFS or None if silent, peak)
+        self._file = None
+        self._default_volume = None
+
+    @classmethod
+    def load(cls) -> "LoudnessStore":
+        """
+        Reads the store, or returns an empty one if it is missing or unreadable.
+
+        A last line cut short by a crash is ignored.
+        """
+        path_obj = Path(DEFAULT_LOUDNESS_PATH).resolve()  # Normalize path for Windows compatibility
+        tracks = {}
+        try:
+            with open(path_obj, "r", encoding="utf-8") as file:
+                for line_number, line in enumerate(file, 1):
+                    try:
+                        size, mtime_ns, inode, loudness, peak = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Se ha ignorado un registro incompleto en {path_obj}:{line_number}.")
+                        continue
+                    tracks[(size, mtime_ns, inode)] = (loudness, peak)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"No se pudo leer {path_obj}, se volvera a analizar la biblioteca: {e}")
+        return cls(tracks)
+
+    def get(self, fingerprint: tuple) -> tuple[float | None, float] | None:
+        return self.tracks.get(tuple(fingerprint))
+
+    def append(self, fingerprint: tuple, loudness: float | None, peak: float) -> None:
+        """
+        Stores the result of a track and appends it to the store file.
+        """
+        self.tracks[tuple(fingerprint)] = (loudness, peak)
+        if self._file is None:
+            path_obj = Path(DEFAULT_LOUDNESS_PATH).resolve()  # Normalize path for Windows compatibility
+            path_obj.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path_obj, "a", encoding="utf-8")
+        self._file.write(json.dumps([*fingerprint, loudness, peak]) + "\n")
+        self._file.flush()
+
+    def compact(self, fingerprints) -> None:
+        """
+        Rewrites the store atomically with the results of `fingerprints` only,
+        dropping those of files that were modified or removed.
+        """
+        self.close()
+        keep = {tuple(fingerprint) for fingerprint in fingerprints}
+        self.tracks = {fingerprint: result for fingerprint, result in self.tracks.items() if fingerprint in keep}
+        path_obj = Path(DEFAULT_LOUDNESS_PATH).resolve()  # Normalize path for Windows compatibility
+        temp_path = path_obj.with_suffix(".tmp")
+        try:
+            path_obj.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as file:
+                for fingerprint, (loudness, peak) in self.tracks.items():
+                    file.write(json.dumps([*fingerprint, loudness, peak]) + "\n")
+            temp_path.replace(path_obj)
+        except OSError as e:
+            logger.error(f"No se pudo compactar {path_obj}: {e}")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def volume(self, path: str) -> float:
+        """
+        Returns the mixer volume of a file, the `volume` callback of `playback.play_playlist`.
+
+        Files that were not analysed yet play at the median volume of the
+        analysed ones, so they do not stand out.
+        """
+        if self._default_volume is None:
+            volumes = [track_volume(loudness) for loudness, _ in self.tracks.values() if loudness is not None]
+            self._default_volume = median(volumes) if volumes else 1.0
+        fingerprint = file_fingerprint(path)
+        result = self.tracks.get(fingerprint) if fingerprint is not None else None
+        return track_volume(result[0], self._default_volume) if result else self._default_volume
+
+
+def _init_worker() -> None:
+    """
+    Prepares an analysis worker: a low priority and a mixer that decodes files
+    without opening the audio device.
+    """
+    if hasattr(os, "nice"):
+        os.nice(WORKER_NICENESS)
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    import pygame
+    pygame.mixer.init()
+
+
+def _k_weighting(rate: int, length: int):
+    """
+    Returns the power response of the BS.1770 K-weighting filter at the
+    frequencies of a real FFT of `length` samples.
+
+    Both biquads, a high shelf and a high-pass, are designed for `rate` from the
+    analog prototype of the standard, so they match its 48 kHz coefficients and
+    any mixer rate gives the same weighting.
+    """
+    import numpy as np
+    z = np.exp(-1j * np.pi * np.fft.rfftfreq(length, d=0.5))  # e^-jw for every bin
+
+    def response(b, a):
+        return np.abs(np.polyval(b[::-1], z)) ** 2 / np.abs(np.polyval(a[::-1], z)) ** 2
+
+    # High shelf: +4 dB above about 1.7 kHz, the acoustic effect of the head
+    k, q = np.tan(np.pi * 1681.974450955533 / rate), 0.7071752369554196
+    gain = 10 ** (3.999843853973347 / 20)
+    band_gain = gain ** 0.4996667741545416
+    shelf = response(
+        np.array([gain + band_gain * k / q + k * k, 2 * (k * k - gain), gain - band_gain * k / q + k * k]),
+        np.array([1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k]),
+    )
+    # High-pass: ignores rumble below about 38 Hz
+    k, q = np.tan(np.pi * 38.13547087602444 / rate), 0.5003270373238773
+    high_pass = response(
+        np.array([1.0, -2.0, 1.0]),
+        np.array([1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k]) / (1 + k / q + k * k),
+    )
+    return shelf * high_pass
+
+
+def measure(samples, rate: int) -> tuple[float | None, float]:
+    """
+    Measures the integrated loudness and the sample peak of decoded audio.
+
+    Loudness follows ITU-R BS.1770: the K-weighted mean square of every channel
+    is taken over 400 ms blocks overlapping by 75%, and blocks below the
+    absolute and relative gates are left out. The audio is cut into 100 ms
+    segments and the K-weighting is applied to the spectrum of each one, so
+    the whole computation is a few vectorized NumPy operations, while the
+    blocks are averages of 4 consecutive segments.
+
+    Args:
+        samples (numpy.ndarray): Integer samples, shaped (frames,) or (frames, channels).
+        rate (int): The sampling rate.
+
+    Returns:
+        tuple[float | None, float]: The loudness in LUFS, None for silence, and
+        the peak, from 0 to 1.
+    """
+    import numpy as np
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    scale = float(np.iinfo(samples.dtype).max + 1) if samples.dtype.kind in "iu" else 1.0
+    segment = rate // 10
+    segments = len(samples) // segment
+    # Without np.abs, whose int16 result wraps -32768 around to itself
+    peak = max(float(samples.max()), -float(samples.min())) / scale if len(samples) else 0.0
+    if segments < SEGMENTS_PER_BLOCK:
+        return None, peak
+
+    weights = _k_weighting(rate, segment)
+    # Parseval for a real FFT: every bin but DC and Nyquist stands for two
+    weights[1:(segment + 1) // 2] *= 2
+    powers = np.empty(segments)
+    for start in range(0, segments, SEGMENTS_PER_CHUNK):
+        stop = min(start + SEGMENTS_PER_CHUNK, segments)
+        chunk = samples[start * segment:stop * segment].astype(np.float32) / scale
+        spectrum = np.fft.rfft(chunk.reshape(stop - start, segment, -1), axis=1)
+        # Mean square of each segment, summed over the channels
+        powers[start:stop] = np.einsum("sfc,f->s", np.abs(spectrum) ** 2, weights) / segment ** 2
+
+    blocks = np.convolve(powers, np.full(SEGMENTS_PER_BLOCK, 1 / SEGMENTS_PER_BLOCK), mode="valid")
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[block_loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return None, peak
+    threshold = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = blocks[block_loudness > max(threshold, ABSOLUTE_GATE)]
+    return round(float(-0.691 + 10 * np.log10(gated.mean())), 2), round(peak, 5)
+
+
+def decode_file(path: str):
+    """
+    Decodes an audio file inside a worker prepared by `_init_worker`.
+
+    Returns:
+        tuple: The fingerprint of the file, taken before it is decoded, its
+        samples as a (frames, channels) NumPy view of the decoded sound, and the
+        sampling rate.
+
+    Raises:
+        pygame.error: If the file cannot be decoded.
+    """
+    import pygame
+    fingerprint = file_fingerprint(path)
+    sound = pygame.mixer.Sound(path)
+    return fingerprint, pygame.sndarray.samples(sound), pygame.mixer.get_init()[0]
+
+
+def _short_enough(path: str, duration: float) -> bool:
+    if duration:
+        return duration <= MAX_DECODE_SECONDS
+    try:
+        return os.path.getsize(path) <= MAX_UNKNOWN_DECODE_BYTES
+    except OSError:
+        return False
+
+
+def decodable(repo, paths: list[str]) -> list[str]:
+    """
+    Drops the tracks longer than `MAX_DECODE_SECONDS` from `paths`, by the
+    duration stored in the repository, since `decode_file` holds a whole
+    decoded track in memory. Tracks of unknown duration are kept only if their
+    file is no larger than `MAX_UNKNOWN_DECODE_BYTES`.
+    """
+    kept = [path for path in paths if _short_enough(path, repo[path][3])]
+    if len(kept) < len(paths):
+        logger.info(
+            f"Se omiten {len(paths) - len(kept)} canciones de mas de {MAX_DECODE_SECONDS // 60} minutos "
+            f"o de duracion desconocida y demasiado grandes."
+        )
+    return kept
+
+
+def analyze_file(path: str) -> tuple[tuple | None, float | None, float | None]:
+    """
+    Decodes an audio file inside a worker and measures its loudness and peak.
+
+    Returns:
+        tuple: The fingerprint of the file, its loudness and its peak. The
+        fingerprint is None when the file cannot be decoded.
+    """
+    try:
+        fingerprint, samples, rate = decode_file(path)
+        loudness, peak = measure(samples, rate)
+    except Exception as e:
+        logger.warning(f"No se pudo analizar {path}: {e}")
+        return None, None, None
+    return fingerprint, loudness, peak
+
+
+async def run_decoders(
+    function, paths: list[str], max_workers: int = 1, rate: float | None = None,
+    stop_event: asyncio.Event | None = None,
+):
+    """
+    Runs a decoding function over many files in low priority worker processes.
+
+    Only `max_workers` files are decoded at a time, so memory does not grow
+    with the number of files, and `rate` caps the number of files started per
+    second, so the work can go on during playback. Each worker holds a whole
+    decoded file, so callers leave long files out with `decodable`.
+
+    Args:
+        function (Callable): A picklable function taking a path, run in the workers.
+        paths (list[str]): The files to decode.
+        max_workers (int): Number of worker processes.
+        rate (float | None): Maximum files started per second. Unlimited by default.
+        stop_event (asyncio.Event | None): Stops starting files once set.
+
+    Yields:
+        The results of `function`, in completion order.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+    running = set()
+    next_start = time.monotonic()
+    try:
+        for path in paths:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if rate:
+                await asyncio.sleep(max(next_start - time.monotonic(), 0))
+                next_start = max(next_start, time.monotonic()) + 1 / rate
+            running.add(loop.run_in_executor(executor, function, path))
+            if len(running) < max_workers:
+                continue
+            # Keep exactly one file per worker in flight
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        while running:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def analyze_library(
+    repo, max_workers: int = 1, rate: float | None = None, stop_event: asyncio.Event | None = None,
+) -> int:
+    """
+    Measures the loudness of every library track missing from the `LoudnessStore`.
+
+    Files are decoded by pygame and measured with NumPy in the low priority
+    workers of `run_decoders`, one file per worker at a time, and the analysis
+    can be throttled so it runs during playback. Tracks longer than
+    `MAX_DECODE_SECONDS` are skipped, see `decodable`. Results are appended to the store one
+    by one: stopping the analysis, with `stop_event` or by killing it, keeps
+    what was done, and the next run only analyses the remaining tracks.
+
+    Args:
+        repo (dict | Library): The repository.
+        max_workers (int): Number of worker processes.
+        rate (float | None): Maximum tracks started per second. Unlimited by default.
+        stop_event (asyncio.Event | None): Stops the analysis once set, after the
+                                           tracks being decoded.
+
+    Returns:
+        int: The number of tracks analysed.
+    """
+    store = await asyncio.to_thread(LoudnessStore.load)
+    fingerprints = await fingerprint_files(list(repo))
+    pending = decodable(repo, [path for path, fingerprint in fingerprints.items() if store.get(fingerprint) is None])
+    logger.info(f"{len(fingerprints) - len(pending)} canciones ya analizadas, {len(pending)} pendientes.")
+
+    analysed = 0
+    try:
+        async for fingerprint, loudness, peak in run_decoders(analyze_file, pending, max_workers, rate, stop_event):
+            if fingerprint is None:
+                continue
+            store.append(fingerprint, loudness, peak)
+            analysed += 1
+            if analysed % PROGRESS_EVERY == 0:
+                logger.info(f"Se han analizado {analysed} de {len(pending)} canciones.")
+    finally:
+        store.close()
+
+    if len(store.tracks) > len(fingerprints):
+        await asyncio.to_thread(store.compact, fingerprints.values())
+    logger.info(f"Se han analizado {analysed} canciones.")
+    return analysed
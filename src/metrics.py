@@ -0,0 +1,186 @@
+import json
+import time
+import heapq
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+# Prefix of every exported Prometheus metric
+NAMESPACE = "za_player"
+# Number of slowest items kept per ranking, such as the slowest files to extract
+SLOWEST_KEPT = 10
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}
+_timings = {}       # Name -> [count, total seconds, max seconds]
+_slowest = {}       # Name -> heap of (seconds, item), the fastest on top
+_NO_SPAN = nullcontext()
+
+
+def enable() -> None:
+    """
+    Starts recording metrics. Until then, every recording function returns at once.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """
+    Stops recording metrics. What was recorded so far is kept.
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Forgets every recorded metric.
+    """
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+        _slowest.clear()
+
+
+def count(name: str, value: float = 1) -> None:
+    """
+    Adds `value` to a counter, such as a number of files or bytes.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, seconds: float, item: str | None = None) -> None:
+    """
+    Records one duration of an operation.
+
+    Args:
+        name (str): Name of the operation, such as "extract_metadata".
+        seconds (float): How long it took.
+        item (str | None): What it was applied to, such as a file path. The
+                           `SLOWEST_KEPT` slowest items of every operation are kept.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = [0, 0.0, 0.0]
+        timing[0] += 1
+        timing[1] += seconds
+        if seconds > timing[2]:
+            timing[2] = seconds
+        if item is not None:
+            slowest = _slowest.setdefault(name, [])
+            if len(slowest) < SLOWEST_KEPT:
+                heapq.heappush(slowest, (seconds, item))
+            elif seconds > slowest[0][0]:
+                heapq.heapreplace(slowest, (seconds, item))
+
+
+@contextmanager
+def _span(name: str, item: str | None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, item)
+
+
+def span(name: str, item: str | None = None):
+    """
+    Returns a context manager that records the duration of its block with `observe`.
+
+    When metrics are disabled, a shared no-op context manager is returned instead,
+    so instrumented code pays a single function call.
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _span(name, item)
+
+
+def snapshot() -> dict:
+    """
+    Returns every recorded metric as a JSON-serializable dictionary.
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {
+                name: {
+                    "count": timing_count,
+                    "total_seconds": round(total, 6),
+                    "mean_seconds": round(total / timing_count, 6),
+                    "max_seconds": round(maximum, 6),
+                    "slowest": [
+                        {"item": item, "seconds": round(seconds, 6)}
+                        for seconds, item in sorted(_slowest.get(name, ()), reverse=True)
+                    ],
+                }
+                for name, (timing_count, total, maximum) in _timings.items()
+            },
+        }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus() -> str:
+    """
+    Returns every recorded metric in the Prometheus text exposition format.
+
+    Counters become `<name>_total` counters and timings become `<name>_seconds`
+    summaries, with a `<name>_seconds_max` gauge and a `<name>_slowest_seconds`
+    gauge labelled by item.
+    """
+    data = snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        metric = f"{NAMESPACE}_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, timing in sorted(data["timings"].items()):
+        metric = f"{NAMESPACE}_{name}_seconds"
+        lines += [
+            f"# TYPE {metric} summary",
+            f"{metric}_count {timing['count']}",
+            f"{metric}_sum {timing['total_seconds']}",
+            f"# TYPE {metric}_max gauge",
+            f"{metric}_max {timing['max_seconds']}",
+        ]
+        if timing["slowest"]:
+            lines.append(f"# TYPE {NAMESPACE}_{name}_slowest_seconds gauge")
+            lines += [
+                f'{NAMESPACE}_{name}_slowest_seconds{{item="{_label(slow["item"])}"}} {slow["seconds"]}'
+                for slow in timing["slowest"]
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def export(path: str) -> None:
+    """
+    Writes every recorded metric to a file, as JSON if its name ends in ".json"
+    and in the Prometheus text format otherwise (for instance a ".prom" file read
+    by the node exporter textfile collector).
+
+    The file is replaced atomically, so a collector never reads half of it.
+
+    Args:
+        path (str): The file to write.
+    """
+    path_obj = Path(path).resolve()  # Normalize path for Windows compatibility
+    if path_obj.suffix == ".json":
+        content = json.dumps(snapshot(), indent=2, ensure_ascii=False) + "\n"
+    else:
+        content = to_prometheus()
+    temp_path = path_obj.with_name(path_obj.name + ".tmp")
+    temp_path.write_text(content, encoding="utf-8")
+    temp_path.replace(path_obj)
@@ -0,0 +1,185 @@
+import os
+import asyncio
+import pygame
+
+# Posted by pygame every time a music track ends, is stopped, or a queued track starts
+MUSIC_END = pygame.USEREVENT + 1
+# Seconds before looking again for the end of a track that outlasted its known
+# length, doubled on every look up to END_RETRY_MAX. Tracks of unknown length
+# are looked at every END_RETRY_MAX seconds.
+END_RETRY = 0.01
+END_RETRY_MAX = 1.0
+
+
+def init_event_system():
+    """
+    Initializes the pygame event queue, which the mixer needs to report track ends.
+
+    pygame only delivers events once its display module is initialized. No window
+    is ever opened; on headless systems the dummy video driver is used instead.
+    """
+    if pygame.display.get_init():
+        return
+    try:
+        pygame.display.init()
+    except pygame.error:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        pygame.display.init()
+
+
+class LoopQueue:
+    """
+    Lets a plain thread put items into an asyncio queue owned by an event loop.
+
+    It offers the `put` method of `queue.Queue`, so producer threads written for
+    a `queue.Queue` can feed coroutines that `await queue.get()` instead of polling.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self._loop = loop
+        self._queue = queue
+
+    def put(self, item) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            pass  # The event loop is already closed, nobody is listening anymore
+
+
+class MusicEndBridge:
+    """
+    Forwards the end-of-music events of the pygame mixer to asyncio, and drives
+    the transport of the music stream.
+
+    SDL events may only be pumped from the thread that initialized the display,
+    which is the thread of the event loop, so the bridge reads them from a timer
+    of the loop. The timer is armed for the moment the current track is due to
+    end, or to start fading out, known from its length and the position of the
+    mixer, so nothing runs while a track plays: `pause` cancels the timer, and `resume` and `skip` arm
+    it again. Only `MUSIC_END` events are taken; every other event type is left
+    untouched for any other pygame user. Coroutines can then await the end of the
+    current track instead of checking `pygame.mixer.music.get_busy()` themselves.
+    """
+
+    def __init__(self):
+        self._ends = asyncio.Queue()
+        self._timer = None
+        self._length = None
+        self._start = 0.0
+        self._fade_ms = 0
+        self._paused = False
+        self._retry = END_RETRY
+
+    def start(self) -> None:
+        """
+        Registers the end event with the mixer.
+
+        Must be called from the event loop, in the thread that initializes the display.
+        """
+        init_event_system()
+        pygame.event.set_allowed(MUSIC_END)
+        pygame.event.clear(MUSIC_END)
+        pygame.mixer.music.set_endevent(MUSIC_END)
+
+    def follow(self, length: float | None, start: float = 0.0, fade_ms: int = 0) -> None:
+        """
+        Waits for the end of a track that just started playing, or took over from a queued one.
+
+        Args:
+            length (float | None): Duration of the track in seconds, None or 0 if unknown.
+            start (float): Seconds into the track playback started from.
+            fade_ms (int): Fades the track out over its last milliseconds. Ignored
+                           for tracks of unknown length, or if playback started
+                           past the fade.
+        """
+        self._length = length or None
+        self._start = start
+        self._fade_ms = fade_ms
+        self._paused = False
+        self._arm()
+
+    def position(self) -> float:
+        """
+        Returns the seconds played of the current track, counted from its beginning.
+        """
+        # get_pos() counts from the last play(), which may have started mid-track
+        return self._start + max(pygame.mixer.music.get_pos(), 0) / 1000
+
+    def pause(self) -> None:
+        """
+        Pauses the music. The track cannot end while paused, so nothing is awaited meanwhile.
+        """
+        pygame.mixer.music.pause()
+        self._paused = True
+        self._cancel()
+
+    def resume(self) -> None:
+        """
+        Resumes paused music.
+        """
+        pygame.mixer.music.unpause()
+        self._paused = False
+        self._arm()
+
+    def skip(self) -> None:
+        """
+        Stops the current track, which reports its end at once.
+        """
+        self._paused = False
+        pygame.mixer.music.stop()
+        self._arm(0)
+
+    def _arm(self, delay: float | None = None) -> None:
+        self._cancel()
+        loop = asyncio.get_running_loop()
+        if delay is None:
+            self._retry = END_RETRY
+            position = self.position()
+            if self._fade_ms and self._length and position < self._length - self._fade_ms / 1000:
+                self._timer = loop.call_later(self._length - self._fade_ms / 1000 - position, self._fade)
+                return
+            remaining = self._length - position if self._length else 0
+            delay = remaining if remaining > 0 else (END_RETRY if self._length else END_RETRY_MAX)
+        self._timer = loop.call_later(delay, self._check)
+
+    def _fade(self) -> None:
+        self._timer = None
+        pygame.mixer.music.fadeout(self._fade_ms)  # Stops the track once faded out, which ends it
+        self._fade_ms = 0
+        self._arm()
+
+    def _cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _check(self) -> None:
+        self._timer = None
+        events = pygame.event.get(MUSIC_END)
+        for event in events:
+            self._ends.put_nowait(event)
+        if not events and not self._paused:
+            # Lengths read from the tags are estimates, the track may still be playing
+            self._retry = min(self._retry * 2, END_RETRY_MAX) if self._length else END_RETRY_MAX
+            self._timer = asyncio.get_running_loop().call_later(self._retry, self._check)
+
+    def clear(self) -> None:
+        """
+        Discards the track ends received so far, such as the one caused by a skip.
+        """
+        pygame.event.clear(MUSIC_END)
+        while not self._ends.empty():
+            self._ends.get_nowait()
+
+    async def wait_end(self) -> None:
+        """
+        Waits until the current track ends, is stopped, or hands over to a queued one.
+        """
+        await self._ends.get()
+
+    def stop(self) -> None:
+        """
+        Stops waiting and unregisters the end event.
+        """
+        pygame.mixer.music.set_endevent()
+        self._cancel()
@@ -0,0 +1,292 @@
+import pygame
+import asyncio
+from itertools import chain
+from . import metrics
+from .files_manager import extract_metadata, prefetch_file
+from .keyboard import create_key_reader
+from .mixer_events import MusicEndBridge
+
+
+def init_mixer():
+    """
+    Initializes the pygame mixer for audio playback, unless it is already open.
+    """
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+
+
+def show(message: str, inline: bool = False):
+    """
+    Displays a player message.
+
+    Args:
+        message (str): The message to display.
+        inline (bool): Rewrite a single status line in place instead of
+                       printing one line per message.
+    """
+    if inline:
+        # Clear the line before printing new information
+        print("\r" + " " * 80, end="", flush=True) # Clear up to 80 characters
+        print(f"\r{message}", end="", flush=True)
+    else:
+        print(message)
+
+
+def play_audio(
+    track: tuple[str, str], fade_ms: int = 0, inline: bool = False, start: float = 0.0, volume: float = 1.0,
+) -> bool:
+    """
+    Plays an audio file and displays its title.
+
+    Args:
+        track (tuple[str, str]): Tuple of (path, title) for the audio file.
+        fade_ms (int): Milliseconds over which the volume rises from silence.
+        inline (bool): Display messages on a single status line.
+        start (float): Seconds into the track to start from. Formats pygame
+                       cannot seek in start from the beginning.
+        volume (float): Mixer volume of the track, from 0 to 1.
+
+    Returns:
+        bool: True if playback started, False if the file could not be played.
+    """
+    try:
+        pygame.mixer.music.load(track[0])
+        pygame.mixer.music.set_volume(volume)
+        try:
+            pygame.mixer.music.play(fade_ms=fade_ms, start=start)
+        except pygame.error:
+            if not start:
+                raise
+            pygame.mixer.music.play(fade_ms=fade_ms)
+        show(f"[INFO] Playing: {track[1]} 🎶", inline)
+        return True
+    except Exception as e:
+        show(f"[ERROR] Oh no! Couldn't play {track[1]}: {e}", inline)
+        return False
+
+
+def play_next(
+    remaining, fade_ms: int = 0, inline: bool = False, start: float = 0.0, volume=None,
+) -> tuple[str, str] | None:
+    """
+    Plays the first track of an iterator that can be played.
+
+    Args:
+        remaining (Iterator[tuple[str, str]]): The tracks left in the playlist.
+        fade_ms (int): Milliseconds over which the volume rises from silence.
+        inline (bool): Display messages on a single status line.
+        start (float): Seconds into the first track to start from.
+        volume (Callable | None): Returns the mixer volume of a path. Full volume by default.
+
+    Returns:
+        tuple[str, str] | None: The track now playing, or None if none was left.
+    """
+    for track in remaining:
+        with metrics.span("track_start", track[0]):
+            started = play_audio(track, fade_ms, inline, start, volume(track[0]) if volume else 1.0)
+        if started:
+            metrics.count("tracks_started")
+            return track
+        metrics.count("tracks_failed")
+        start = 0.0  # The offset only applies to the track it was saved for
+    return None
+
+
+def queue_next(remaining, inline: bool = False) -> tuple[str, str] | None:
+    """
+    Queues the first track of an iterator behind the current one.
+
+    pygame opens the queued file right away and switches to it as soon as the
+    current track ends, so no load happens between both tracks.
+
+    Args:
+        remaining (Iterator[tuple[str, str]]): The tracks left in the playlist.
+        inline (bool): Display messages on a single status line.
+
+    Returns:
+        tuple[str, str] | None: The queued track, or None if none was left.
+    """
+    for track in remaining:
+        try:
+            with metrics.span("track_queue", track[0]):
+                pygame.mixer.music.queue(track[0])
+            return track
+        except Exception as e:
+            metrics.count("tracks_failed")
+            show(f"[ERROR] Oh no! Couldn't queue {track[1]}: {e}", inline)
+    return None
+
+
+async def control_playback(stop_event: asyncio.Event, bridge: MusicEndBridge, inline: bool = False):
+    """
+    Processes terminal commands to control audio playback.
+
+    Keys are delivered by the `KeyReader` of the platform, so this coroutine
+    only wakes up when a key is pressed.
+
+    Args:
+        stop_event (asyncio.Event): Event to signal when to stop playback.
+        bridge (MusicEndBridge): Drives the mixer, so it knows when the track can end.
+        inline (bool): Display messages on a single status line.
+
+    Commands:
+        p: Pause playback
+        r: Resume playback
+        s: Skip to next track
+        q: Quit playback
+    """
+    commands = {
+        'p': "pause",
+        'r': "resume",
+        's': "skip",
+        'q': "quit"
+    }
+    show("🎵 Controls: p (pause), r (resume), s (skip), q (quit)", inline)
+
+    try:
+        async with create_key_reader() as keys:
+            while not stop_event.is_set():
+                command = (await keys.get()).strip().lower()
+                if command in commands:
+                    show(f"[INFO] Command: {commands[command]}", inline)
+                    if command == 'p':
+                        bridge.pause()
+                    elif command == 'r':
+                        bridge.resume()
+                    elif command == 's':
+                        bridge.skip()
+                    elif command == 'q':
+                        # The player stops the music itself, once it noted how far it got
+                        stop_event.set()
+                else:
+                    show("[WARNING] Invalid command. Use: p, r, s, q", inline)
+    finally:
+        if inline:
+            show("", inline)  # Leave the status line clean upon exit
+
+
+async def play_playlist(
+    tracks, gapless: bool = False, fade: float = 0.0, inline: bool = False, keys: bool = True,
+    start: float = 0.0, progress=None, volume=None, duration=None, bridge=None,
+):
+    """
+    Plays a list of audio tracks asynchronously, displaying their titles,
+    with terminal controls for playback.
+
+    The end of each track is reported by pygame through `MusicEndBridge`, so
+    the next track starts as soon as the previous one ends, and nothing runs
+    while a track plays.
+
+    Args:
+        tracks (Iterable[tuple[str, str]]): (path, title) tuples.
+        gapless (bool): Queue each next track while the current one plays, so
+                        pygame switches to it without reloading in between.
+                        The mixer volume is shared by both tracks, so with
+                        `volume` only a track at the same volume is queued;
+                        any other starts once the current one ended.
+        fade (float): Seconds over which each track fades out before its end,
+                      after which the next one, read ahead into the OS cache,
+                      fades in. pygame plays a single music stream, so tracks
+                      never overlap. Takes precedence over `gapless`.
+        inline (bool): Display messages on a single status line rewritten in place.
+        keys (bool): Read the playback controls from the terminal. Without them,
+                     playback is driven through `bridge`, as the daemon does, and
+                     stops once `tracks` runs out or the task is cancelled.
+        start (float): Seconds into the first track to start from, to resume it.
+        progress (Callable | None): Called as `progress(track, seconds)` when a
+                                    track starts, with 0, and when playback is
+                                    stopped before the end, with the seconds
+                                    played of the current track. Called with a
+                                    None track once every track was played.
+                                    Tracks are passed as they were yielded by
+                                    `tracks`, extra fields included.
+        volume (Callable | None): Returns the mixer volume of a path, such as
+                                  `LoudnessStore.volume` to even out loudness.
+                                  Full volume by default.
+        duration (Callable | None): Returns the duration of a path in seconds, or
+                                    None if unknown, such as a lookup in the
+                                    repository, to know when each track ends
+                                    and to time fades. The file metadata is
+                                    read for unknown durations.
+        bridge (MusicEndBridge | None): Pauses, resumes and skips tracks for a
+                                        caller driving playback without keys.
+                                        A new one by default.
+    """
+    # The audio device is only opened once there is something to play
+    init_mixer()
+    stop_event = asyncio.Event()
+    bridge = bridge or MusicEndBridge()
+    bridge.start()
+    control_task = asyncio.create_task(control_playback(stop_event, bridge, inline)) if keys else None
+    stopped = asyncio.create_task(stop_event.wait())
+    remaining = iter(tracks)
+    fade_ms = int(fade * 1000)
+    prefetch = None
+    current = None
+
+    def report(track, seconds: float = 0.0) -> None:
+        if progress is not None:
+            progress(track, seconds)
+
+    async def length(track) -> float:
+        seconds = duration(track[0]) if duration is not None else None
+        if seconds is None:
+            seconds = (await asyncio.to_thread(extract_metadata, track[0]))[track[0]][3]
+        return seconds
+
+    try:
+        current = play_next(remaining, inline=inline, start=start, volume=volume)
+        report(current)
+        while current is not None:
+            # The bridge fades the track out, counting from where it started
+            bridge.follow(await length(current), start, fade_ms)
+            upcoming = queued = None
+            if fade_ms:
+                upcoming = next(remaining, None)
+                if upcoming is not None:
+                    if prefetch is not None:
+                        # Still running only after a skip, when its track is no longer next
+                        prefetch.cancel()
+                        await asyncio.gather(prefetch, return_exceptions=True)
+                    prefetch = asyncio.create_task(asyncio.to_thread(prefetch_file, upcoming[0]))
+            elif gapless:
+                upcoming = next(remaining, None)
+                # The volume applies to the queued track from its first sample on
+                if upcoming is not None and (volume is None or volume(upcoming[0]) == volume(current[0])):
+                    queued = upcoming = queue_next([upcoming], inline)
+
+            ended = asyncio.create_task(bridge.wait_end())
+            await asyncio.wait({ended, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            ended.cancel()
+            if stop_event.is_set():
+                break
+
+            if queued is not None and pygame.mixer.music.get_busy():
+                # The queued track already took over without a gap
+                show(f"[INFO] Playing: {upcoming[1]} 🎶", inline)
+                metrics.count("tracks_started")
+                current = upcoming
+                start = 0.0
+                report(current)
+                continue
+
+            # A skip clears the queue, so the upcoming track is started by hand, as
+            # one that was not queued
+            if upcoming is not None:
+                remaining = chain([upcoming], remaining)
+            bridge.clear()
+            current = play_next(remaining, fade_ms, inline, volume=volume)
+            start = 0.0
+            report(current)
+    finally:
+        if current is not None:
+            report(current, bridge.position())
+        stop_event.set()
+        if control_task is not None:
+            control_task.cancel()
+            await asyncio.gather(control_task, return_exceptions=True)
+        await asyncio.gather(stopped, return_exceptions=True)
+        if prefetch is not None:
+            await asyncio.gather(prefetch, return_exceptions=True)
+        bridge.stop()
+        pygame.mixer.music.stop()
@@ -0,0 +1,206 @@
+import os
+import logging
+from pathlib import Path
+from typing import Iterator, NamedTuple
+from urllib.parse import unquote, urlparse
+from .library import Library
+from .snapshot import MappedLibrary
+from .sqlite_library import SqliteLibrary
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_EXTENSIONS = {"m3u", "m3u8"}
+
+
+class PlaylistEntry(NamedTuple):
+    """
+    A song listed in a playlist file, with the title and duration of its #EXTINF line, if any.
+    """
+    path: str
+    title: str | None
+    duration: float | None
+
+
+def is_playlist_file(path: str) -> bool:
+    return path.lower().rsplit('.', 1)[-1] in PLAYLIST_EXTENSIONS
+
+
+def _normalize(base: str, path: str) -> str:
+    # Most entries are clean absolute paths, which normpath would return unchanged
+    if os.name != "nt" and path.startswith("/") and "/." not in path and "//" not in path:
+        return path
+    return os.path.normpath(os.path.join(base, path))
+
+
+def read_m3u(path: str, keys: bool = False) -> Iterator[PlaylistEntry]:
+    """
+    Reads an M3U or M3U8 playlist one line at a time.
+
+    Relative entries are resolved against the folder of the playlist and
+    `file://` URLs are turned into paths, with plain string operations so no
+    file is touched. Other URLs, such as internet radios, are skipped. Lines are
+    decoded as UTF-8; bytes that are not, as in legacy M3U files written in a
+    local code page, are kept as-is, so the paths still open on POSIX systems.
+
+    Args:
+        path (str): The playlist file.
+        keys (bool): Yield the paths exactly as written, for playlists holding
+                     repository keys, such as the saved queue. Relative keys
+                     are relative to the working directory, not to the playlist.
+
+    Yields:
+        PlaylistEntry: Every song of the playlist, in order.
+
+    Raises:
+        OSError: If the playlist cannot be read.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    title = duration = None
+    with open(path, "r", encoding="utf-8-sig", errors="surrogateescape") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                if line.startswith("#EXTINF:"):
+                    # #EXTINF:<seconds>,<artist> - <title>
+                    length, _, title = line[8:].partition(",")
+                    try:
+                        duration = float(length.split()[0]) if length else None
+                    except ValueError:
+                        duration = None
+                    title = title.strip() or None
+                continue
+
+            if "://" in line:
+                url = urlparse(line)
+                if url.scheme != "file":
+                    title = duration = None
+                    continue
+                line = unquote(url.path)
+                if os.name == "nt" and line.startswith("/") and line[2:3] == ":":
+                    line = line[1:]  # file:///C:/Music/song.mp3
+            yield PlaylistEntry(line if keys else _normalize(base, line), title, duration)
+            title = duration = None
+
+
+def _suffix_match(path: str, candidates: list[str]) -> str:
+    """
+    Returns the candidate sharing the most trailing path components with `path`.
+    """
+    parts = path.replace("\\", "/").split("/")
+
+    def shared(candidate: str) -> int:
+        other = candidate.replace("\\", "/").split("/")
+        count = 0
+        while count < min(len(parts), len(other)) and parts[-1 - count] == other[-1 - count]:
+            count += 1
+        return count
+
+    return max(candidates, key=shared)
+
+
+def resolve_playlist(entries, repo) -> tuple[list[tuple[str, str]], int]:
+    """
+    Matches playlist entries with the repository.
+
+    Entries are looked up in the repository as they come. The ones that are not
+    found, typically because the playlist was written on another computer with
+    the music in another folder, are resolved together at the end: a single
+    pass over the repository indexes its file names, and each entry takes the
+    track with the same file name and the longest common path suffix. Entries
+    that are still unknown are kept if their file exists.
+
+    Args:
+        entries (Iterable[PlaylistEntry]): The entries, such as those read by `read_m3u`.
+        repo (dict | Library): The repository.
+
+    Returns:
+        tuple[list[tuple[str, str]], int]: The playable (path, title) tuples,
+        in playlist order, and the number of entries that were not found.
+    """
+    tracks = []
+    unresolved = []  # Positions in `tracks` waiting for the bulk lookup
+    for entry in entries:
+        metadata = repo.get(entry.path)
+        if metadata is not None:
+            tracks.append((entry.path, metadata[0]))
+        else:
+            unresolved.append(len(tracks))
+            tracks.append(entry)
+
+    if unresolved:
+        wanted = {os.path.basename(tracks[position].path) for position in unresolved}
+        if isinstance(repo, (Library, MappedLibrary, SqliteLibrary)):
+            by_name = repo.paths_named(wanted)
+        else:
+            by_name = {}
+            for file_path in repo:
+                name = os.path.basename(file_path)
+                if name in wanted:
+                    by_name.setdefault(name, []).append(file_path)
+
+        for position in unresolved:
+            entry = tracks[position]
+            candidates = by_name.get(os.path.basename(entry.path))
+            if candidates:
+                file_path = _suffix_match(entry.path, candidates)
+                tracks[position] = (file_path, repo[file_path][0])
+            elif os.path.isfile(entry.path):
+                tracks[position] = (entry.path, entry.title or Path(entry.path).stem)
+            else:
+                tracks[position] = None
+
+    missing = sum(track is None for track in tracks)
+    if missing:
+        logger.warning(f"{missing} canciones de la lista no se han encontrado.")
+    return [track for track in tracks if track is not None], missing
+
+
+def load_playlist(path: str, repo) -> tuple[list[tuple[str, str]], int]:
+    """
+    Reads an M3U or M3U8 playlist and resolves it against the repository.
+
+    See `read_m3u` and `resolve_playlist`.
+    """
+    return resolve_playlist(read_m3u(path), repo)
+
+
+def write_m3u(path: str, tracks, repo=None, header: tuple[str, ...] = (), absolute: bool = False) -> int:
+    """
+    Writes (path, title) tuples as an extended M3U playlist, one line at a time.
+
+    The file is UTF-8 whatever its extension, written to a temporary file and
+    then renamed, so an interrupted export never leaves half a playlist behind.
+
+    Args:
+        path (str): The playlist file to write.
+        tracks (Iterable[tuple[str, str]]): The songs, in order.
+        repo (dict | Library | None): When given, the duration and artist of each
+                                      song are written in its #EXTINF line.
+        header (tuple[str, ...]): Extra comment lines written after #EXTM3U.
+        absolute (bool): Write every path as an absolute one, so the playlist
+                         opens from any folder. Repository keys are relative to
+                         the working directory when the library was added so.
+
+    Returns:
+        int: The number of songs written.
+    """
+    path_obj = Path(path).resolve()  # Normalize path for Windows compatibility
+    temp_path = path_obj.with_name(path_obj.name + ".tmp")
+    written = 0
+    with open(temp_path, "w", encoding="utf-8", errors="surrogateescape", newline="\n") as file:
+        file.write("#EXTM3U\n")
+        for line in header:
+            file.write(f"{line}\n")
+        for file_path, title, *_ in tracks:
+            entry = repo.get(file_path) if repo is not None else None
+            line = os.path.abspath(file_path) if absolute else file_path
+            if entry is not None:
+                artist = f"{entry[2]} - " if entry[2] else ""
+                file.write(f"#EXTINF:{round(entry[3])},{artist}{title}\n{line}\n")
+            else:
+                file.write(f"#EXTINF:-1,{title}\n{line}\n")
+            written += 1
+    temp_path.replace(path_obj)
+    return written
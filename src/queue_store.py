@@ -0,0 +1,221 @@
+import os
+import random
+import struct
+import zlib
+import logging
+import threading
+from itertools import islice
+from pathlib import Path
+from .playlist_files import read_m3u, write_m3u
+from .sorts import shuffle_stream
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_QUEUE_PATH = str(Path.home() / "za_player" / "za_queue.m3u8")
+
+# Identifies the queue a checkpoint belongs to, written as the second line of the queue file
+QUEUE_ID_PREFIX = "#ZA-QUEUE:"
+# Marks a shuffle of the whole library, written as the third line with the seed and the spread flag
+SHUFFLE_PREFIX = "#ZA-SHUFFLE:"
+# Checkpoint slot: queue id, sequence number, track index, offset in seconds, CRC32 of the rest
+CHECKPOINT_SLOT = struct.Struct("<QQQdI")
+
+
+def _checkpoint_path(queue_path: str) -> str:
+    return str(Path(queue_path).with_suffix(".pos"))
+
+
+class QueueStore:
+    """
+    The play queue saved on disk, with the position reached in it.
+
+    The queue itself is an M3U8 playlist of repository keys, written once when
+    the queue is created. A shuffle of the whole library is saved as the seed of
+    the shuffle instead of its tracks, so saving it does not depend on the size
+    of the library. The position lives in a separate checkpoint file made of two
+    fixed-size slots, overwritten in place in turns: saving the position writes
+    a few dozen bytes instead of the whole queue. Each slot has a sequence
+    number and a CRC, so if a crash tears a write, the other slot still holds
+    the previous position.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = str(Path(path).resolve())  # Normalize path for Windows compatibility
+        self.checkpoint_path = _checkpoint_path(self.path)
+        self.queue_id = None
+        self.index = 0
+        self.offset = 0.0
+        self.shuffle = None  # (seed, spread) of a saved shuffle, see `save_shuffle`
+        self._sequence = 0
+        self._saved = True  # False from `new_queue` until `save` wrote the queue
+        self._lock = threading.Lock()  # `save` runs in a thread while the queue plays
+        self._file = None
+
+    # Queue
+
+    def new_queue(self) -> None:
+        """
+        Starts a new queue, positioned on its first track.
+
+        Checkpoints from now on belong to the new queue, which must then be
+        written with `save` or `save_shuffle`. Until it is, they are only kept in memory, so a
+        restart resumes the previous queue as it was.
+        """
+        with self._lock:
+            self.queue_id = int.from_bytes(os.urandom(8), "little")
+            self._sequence = 0
+            self._saved = False
+            self.index, self.offset = 0, 0.0
+            self.shuffle = None
+
+    def save(self, tracks, repo=None) -> int:
+        """
+        Writes the tracks of the queue started by `new_queue`.
+
+        This can run in a thread while the queue already plays: the last
+        position reached is saved once the queue file is written.
+
+        Args:
+            tracks (Iterable[tuple[str, str]]): (path, title) tuples.
+            repo (dict | Library | None): Adds the duration and artist of each
+                                          track to the queue file.
+
+        Returns:
+            int: The number of tracks saved.
+        """
+        return self._write_queue(tracks, repo)
+
+    def save_shuffle(self, seed: int, spread: bool = False) -> None:
+        """
+        Saves the queue started by `new_queue` as `sorts.shuffle_stream` of the
+        whole library, shuffled by `random.Random(seed)`.
+
+        Only the seed is written: `tracks` shuffles the library again the same
+        way. If the library changed in between, that is another order.
+        """
+        self._write_queue((), shuffle=f"{SHUFFLE_PREFIX}{seed:x},{int(spread)}")
+
+    def _write_queue(self, tracks, repo=None, shuffle: str | None = None) -> int:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        header = (f"{QUEUE_ID_PREFIX}{self.queue_id:016x}",) + ((shuffle,) if shuffle else ())
+        count = write_m3u(self.path, tracks, repo, header=header)
+        with self._lock:
+            self._saved = True
+            self._write_checkpoint()
+        return count
+
+    def load(self) -> bool:
+        """
+        Reads the id of the saved queue and the last position saved for it.
+
+        Returns:
+            bool: True if there is a saved queue.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="surrogateescape") as file:
+                file.readline()
+                second = file.readline().strip()
+                third = file.readline().strip()
+        except OSError:
+            return False
+        if not second.startswith(QUEUE_ID_PREFIX):
+            return False
+        try:
+            self.queue_id = int(second[len(QUEUE_ID_PREFIX):], 16)
+            self.shuffle = None
+            if third.startswith(SHUFFLE_PREFIX):
+                seed, _, spread = third[len(SHUFFLE_PREFIX):].partition(",")
+                self.shuffle = (int(seed, 16), spread == "1")
+        except ValueError:
+            return False
+
+        self.index, self.offset, self._sequence = 0, 0.0, 0
+        try:
+            with open(self.checkpoint_path, "rb") as file:
+                data = file.read(2 * CHECKPOINT_SLOT.size)
+        except OSError:
+            return True
+        best = None
+        for start in range(0, len(data) - CHECKPOINT_SLOT.size + 1, CHECKPOINT_SLOT.size):
+            slot = data[start:start + CHECKPOINT_SLOT.size]
+            queue_id, sequence, index, offset, crc = CHECKPOINT_SLOT.unpack(slot)
+            if crc != zlib.crc32(slot[:-4]) or queue_id != self.queue_id:
+                continue  # Torn write, or a checkpoint of an older queue
+            if best is None or sequence > best[0]:
+                best = (sequence, index, offset)
+        if best is not None:
+            self._sequence, self.index, self.offset = best
+        return True
+
+    def tracks(self, start: int | None = None, repo=None):
+        """
+        Yields the saved queue from a track on, read lazily from the queue file.
+
+        Every track is yielded as a (path, title, index) tuple, so the player can
+        report back which one it reached with `checkpoint`.
+
+        Args:
+            start (int | None): The index of the first track. Defaults to the
+                                saved position.
+            repo (dict | Library | None): Where titles are looked up, by key, and
+                                          what a saved shuffle is drawn from.
+                                          Tracks missing from it take the
+                                          #EXTINF text of the queue file.
+        """
+        start = self.index if start is None else start
+        if self.shuffle is not None:
+            seed, spread = self.shuffle
+            tracks = islice(shuffle_stream(repo, spread, random.Random(seed)), start, None)
+            for index, (path, title) in enumerate(tracks, start):
+                yield path, title, index
+            return
+        entries = islice(read_m3u(self.path, keys=True), start, None)
+        for index, entry in enumerate(entries, start):
+            metadata = repo.get(entry.path) if repo is not None else None
+            if metadata is not None:
+                title = metadata[0]
+            else:
+                title = entry.title or Path(entry.path).stem
+            yield entry.path, title, index
+
+    # Position
+
+    def checkpoint(self, index: int, offset: float = 0.0) -> None:
+        """
+        Saves the position reached in the queue: the index of the current track
+        and the seconds already played of it.
+        """
+        with self._lock:
+            self.index, self.offset = index, offset
+            if self._saved:
+                self._write_checkpoint()
+
+    def _write_checkpoint(self) -> None:
+        self._sequence += 1
+        body = CHECKPOINT_SLOT.pack(self.queue_id or 0, self._sequence, self.index, self.offset, 0)[:-4]
+        slot = body + struct.pack("<I", zlib.crc32(body))
+        try:
+            if self._file is None:
+                Path(self.checkpoint_path).parent.mkdir(parents=True, exist_ok=True)
+                mode = "r+b" if os.path.exists(self.checkpoint_path) else "w+b"
+                self._file = open(self.checkpoint_path, mode)
+            self._file.seek((self._sequence % 2) * CHECKPOINT_SLOT.size)
+            self._file.write(slot)
+            self._file.flush()
+        except OSError as e:
+            logger.error(f"No se pudo guardar la posicion de la cola en {self.checkpoint_path}: {e}")
+
+    def progress(self, track, seconds: float) -> None:
+        """
+        The `progress` callback of `playback.play_playlist` for tracks from `tracks`.
+
+        A None track means the queue was played to its end, so it starts over next time.
+        """
+        self.checkpoint(track[2] if track is not None else 0, seconds)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
@@ -0,0 +1,338 @@
+import re
+import heapq
+import pickle
+import asyncio
+import logging
+import unicodedata
+import zlib
+from array import array
+from functools import lru_cache
+from bisect import bisect_left
+from operator import itemgetter
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_INDEX_PATH = str(Path.home() / "za_player" / "za_search_index.pickle")
+INDEX_VERSION = 1
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+# Matches in the title rank above matches in the artist, which rank above the album
+FIELD_WEIGHTS = (3.0, 2.0, 1.0)
+TITLE, ARTIST, ALBUM = range(3)
+
+# Bounds that keep one-letter prefixes and very common trigrams cheap to expand
+MAX_PREFIX_SCAN = 2000
+MAX_PREFIX_EXPANSIONS = 64
+MIN_FUZZY_LENGTH = 3
+MIN_FUZZY_SIMILARITY = 0.5
+MAX_FUZZY_EXPANSIONS = 16
+
+# A full rebuild is cheaper than skipping this many removed tracks on every query
+MAX_DEAD_RATIO = 0.5
+
+
+class SearchResult(NamedTuple):
+    """
+    A track matching a search query, with its relevance score.
+    """
+    path: str
+    score: float
+
+
+def normalize(text) -> list[str]:
+    """
+    Splits a text into lowercase, accent-free alphanumeric tokens.
+
+    Args:
+        text (str | None): The text to split.
+
+    Returns:
+        list[str]: The tokens, in order of appearance.
+    """
+    if not text:
+        return []
+    text = str(text).casefold()
+    if not text.isascii():
+        text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return WORD_PATTERN.findall(text)
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_set(text) -> frozenset[str]:
+    # Albums and artists repeat across many tracks, so their tokens are cached
+    return frozenset(normalize(text))
+
+
+def _trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _checksum(title, album, artist) -> int:
+    return zlib.crc32(f"{title}\x00{album}\x00{artist}".encode("utf-8", "surrogatepass"))
+
+
+class SearchIndex:
+    """
+    An inverted index over the normalized titles, artists and albums of the library.
+
+    Every token maps to the tracks that contain it, encoded with the field it was
+    found in. A sorted vocabulary answers prefix queries with a binary search, and
+    a trigram index over the vocabulary answers fuzzy ones, so queries never scan
+    the library. Removed tracks are only marked as dead until the next rebuild.
+    """
+
+    def __init__(self):
+        self._paths = []            # Document id -> path, None once removed
+        self._checksums = array('I')
+        self._doc_ids = {}          # Path -> document id
+        self._postings = {}         # Token -> array of document id << 2 | field
+        self._vocabulary = []       # Sorted tokens
+        self._trigrams = {}         # Trigram -> set of tokens
+        self._dead = 0
+        self.signature = None
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    @classmethod
+    def build(cls, repo) -> "SearchIndex":
+        """
+        Builds the index of every entry of a repository.
+
+        Args:
+            repo (dict | Library): The repository to index.
+
+        Returns:
+            SearchIndex: The new index.
+        """
+        index = cls()
+        new_tokens = set()
+        for path, metadata in repo.items():
+            index._add(path, metadata, new_tokens)
+        index._extend_vocabulary(new_tokens)
+        return index
+
+    def _add(self, path: str, metadata, new_tokens: set) -> None:
+        title, album, artist = metadata[:3]
+        doc_id = len(self._paths)
+        self._paths.append(path)
+        self._checksums.append(_checksum(title, album, artist))
+        self._doc_ids[path] = doc_id
+
+        for field, text in ((TITLE, title), (ARTIST, artist), (ALBUM, album)):
+            for token in _token_set(text):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = array('I')
+                    new_tokens.add(token)
+                postings.append(doc_id << 2 | field)
+
+    def _extend_vocabulary(self, new_tokens: set) -> None:
+        if not new_tokens:
+            return
+        self._vocabulary = sorted(self._vocabulary + list(new_tokens))
+        for token in new_tokens:
+            for trigram in _trigrams(token):
+                self._trigrams.setdefault(trigram, set()).add(token)
+
+    def _remove(self, path: str) -> None:
+        doc_id = self._doc_ids.pop(path)
+        self._paths[doc_id] = None
+        self._dead += 1
+
+    def sync(self, repo) -> bool:
+        """
+        Brings the index up to date with a repository without rebuilding it.
+
+        New and retagged tracks are indexed again and removed tracks are marked as
+        dead. Retagged tracks are spotted through a checksum of their tags.
+
+        Args:
+            repo (dict | Library): The repository to follow.
+
+        Returns:
+            bool: True if the index changed, False if it was already up to date.
+        """
+        changed = False
+        new_tokens = set()
+        for path, metadata in repo.items():
+            doc_id = self._doc_ids.get(path)
+            if doc_id is not None:
+                if self._checksums[doc_id] == _checksum(*metadata[:3]):
+                    continue
+                self._remove(path)
+            self._add(path, metadata, new_tokens)
+            changed = True
+
+        for path in [path for path in self._doc_ids if path not in repo]:
+            self._remove(path)
+            changed = True
+
+        self._extend_vocabulary(new_tokens)
+        return changed
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """
+        Whether so many tracks were removed that rebuilding the index would pay off.
+        """
+        return self._dead > MAX_DEAD_RATIO * max(len(self._paths), 1)
+
+    def _expand(self, term: str, prefix: bool) -> dict[str, float]:
+        """
+        Finds the vocabulary tokens matching a query term, with their similarity.
+        """
+        matches = {}
+        if term in self._postings:
+            matches[term] = 1.0
+
+        if prefix:
+            start = bisect_left(self._vocabulary, term)
+            candidates = []
+            for token in self._vocabulary[start:start + MAX_PREFIX_SCAN]:
+                if not token.startswith(term):
+                    break
+                candidates.append(token)
+            # Short completions are the likeliest ones while typing
+            for token in heapq.nsmallest(MAX_PREFIX_EXPANSIONS, candidates, key=len):
+                matches.setdefault(token, 0.5 + 0.4 * len(term) / len(token))
+
+        if len(term) >= MIN_FUZZY_LENGTH:
+            term_trigrams = _trigrams(term)
+            shared = {}
+            for trigram in term_trigrams:
+                for token in self._trigrams.get(trigram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            similar = (
+                (token, 2 * count / (len(term_trigrams) + len(token) + 1))
+                for token, count in shared.items()
+            )
+            best = heapq.nlargest(MAX_FUZZY_EXPANSIONS, similar, key=itemgetter(1))
+            for token, similarity in best:
+                if similarity >= MIN_FUZZY_SIMILARITY:
+                    matches.setdefault(token, 0.8 * similarity)
+
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> list[SearchResult]:
+        """
+        Returns the tracks that best match a query, as typed so far.
+
+        Every word of the query must match a title, artist or album word of the
+        track, exactly, with a typo, or, for the last word, as a prefix. Tracks
+        are ranked by how closely and in which field their words matched.
+
+        Args:
+            query (str): Free text, such as "beatl abbey".
+            limit (int): Maximum number of results.
+
+        Returns:
+            list[SearchResult]: The best matches, highest score first.
+        """
+        terms = normalize(query)
+        if not terms:
+            return []
+
+        expansions = [self._expand(term, prefix=i == len(terms) - 1) for i, term in enumerate(terms)]
+        # Start with the rarest term so the candidate set is as small as possible
+        expansions.sort(key=lambda tokens: sum(len(self._postings[token]) for token in tokens))
+
+        scores = None
+        for tokens in expansions:
+            term_scores = {}
+            for token, similarity in tokens.items():
+                for code in self._postings[token]:
+                    doc_id = code >> 2
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    score = similarity * FIELD_WEIGHTS[code & 3]
+                    if score > term_scores.get(doc_id, 0.0):
+                        term_scores[doc_id] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in term_scores.items()}
+            if not scores:
+                return []
+
+        paths = self._paths
+        live = ((doc_id, score) for doc_id, score in scores.items() if paths[doc_id] is not None)
+        best = heapq.nlargest(limit, live, key=itemgetter(1))
+        return [SearchResult(paths[doc_id], round(score, 3)) for doc_id, score in best]
+
+    def __getstate__(self) -> dict:
+        return {"version": INDEX_VERSION, **self.__dict__}
+
+    def __setstate__(self, state: dict) -> None:
+        if state.pop("version", None) != INDEX_VERSION:
+            raise ValueError("Version de indice de busqueda incompatible")
+        self.__dict__.update(state)
+
+
+def _read_index(path_obj: Path) -> SearchIndex:
+    with open(path_obj, "rb") as file:
+        return pickle.load(file)
+
+
+def _write_index(index: SearchIndex, path_obj: Path) -> None:
+    temp_path = path_obj.with_suffix(".tmp")
+    with open(temp_path, "wb") as file:
+        pickle.dump(index, file, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path.replace(path_obj)
+
+
+async def load_search_index(repo, signature=None):
+    """
+    Asynchronously loads the persisted search index and brings it up to date.
+
+    The index is read from `DEFAULT_INDEX_PATH`. When the stored signature equals
+    `signature`, the repository has not changed since the index was saved and it
+    is used as is. Otherwise the index is synchronized with `repo`, or rebuilt
+    when it is missing, unreadable or mostly made of removed tracks, and saved
+    again with the new signature.
+
+    Args:
+        repo (dict | Library): The repository to search.
+        signature (Hashable | None): A cheap value identifying the current state of
+            the repository, such as `json_manager.repository_signature()`. Without
+            one, the index is always synchronized.
+
+    Returns:
+        SearchIndex: An index matching `repo`.
+    """
+    path_obj = Path(DEFAULT_INDEX_PATH).resolve()  # Normalize path for Windows compatibility
+
+    index = None
+    if path_obj.exists():
+        try:
+            index = await asyncio.to_thread(_read_index, path_obj)
+        except (OSError, pickle.UnpicklingError, ValueError, EOFError, AttributeError) as e:
+            logger.warning(f"No se pudo leer el indice de busqueda {path_obj}, se reconstruira: {e}")
+
+    if index is not None and signature is not None and index.signature == signature:
+        return index
+
+    if index is None:
+        index = await asyncio.to_thread(SearchIndex.build, repo)
+        logger.info(f"Se ha construido el indice de busqueda ({len(index)} canciones).")
+    else:
+        changed = await asyncio.to_thread(index.sync, repo)
+        if index.needs_rebuild:
+            index = await asyncio.to_thread(SearchIndex.build, repo)
+            logger.info(f"Se ha reconstruido el indice de busqueda ({len(index)} canciones).")
+        elif not changed and index.signature == signature:
+            return index
+
+    index.signature = signature
+    try:
+        path_obj.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(_write_index, index, path_obj)
+    except OSError as e:
+        logger.error(f"No se pudo guardar el indice de busqueda en {path_obj}: {e}")
+    return index
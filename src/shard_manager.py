@@ -0,0 +1,366 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from . import json_manager
+from .duplicates import load_merged
+from .json_manager import plan_rescan, _is_under, _journal_path
+from .library import Library
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_SHARDS_DIR = str(Path.home() / "za_player" / "shards")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _manifest_path() -> Path:
+    return Path(DEFAULT_SHARDS_DIR).resolve() / MANIFEST_NAME  # Normalize path for Windows compatibility
+
+
+def _shard_path(file_name: str) -> str:
+    return str(Path(DEFAULT_SHARDS_DIR).resolve() / file_name)
+
+
+def _normalize_root(root: str) -> str:
+    return str(Path(root).resolve())  # Normalize path for Windows compatibility
+
+
+def read_manifest() -> dict:
+    """
+    Reads the manifest: the library roots and, for each one, its shard file and size.
+
+    Returns:
+        dict: Root -> {"file": shard file name, "tracks": number of tracks,
+        "duration": total seconds}. The sizes are those of the last time the
+        shard was loaded or written. Empty if there is no manifest yet.
+    """
+    path_obj = _manifest_path()
+    try:
+        with open(path_obj, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError("Version incompatible")
+        return data["shards"]
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        logger.error(f"No se pudo leer el manifiesto {path_obj}: {e}")
+        return {}
+
+
+def _write_manifest(shards: dict) -> None:
+    """
+    Writes the manifest atomically.
+    """
+    path_obj = _manifest_path()
+    temp_path = path_obj.with_suffix(".tmp")
+    path_obj.parent.mkdir(parents=True, exist_ok=True)
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"version": MANIFEST_VERSION, "shards": shards}, file, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path_obj)
+
+
+def _record_sizes(shards: dict, root: str, shard: Library) -> bool:
+    """
+    Stores the number of tracks and the duration of a shard in the manifest.
+
+    Returns:
+        bool: True if they changed.
+    """
+    sizes = {"tracks": len(shard), "duration": round(shard.summary().duration, 2)}
+    changed = any(shards[root].get(key) != value for key, value in sizes.items())
+    shards[root].update(sizes)
+    return changed
+
+
+async def _refresh_sizes(root: str, shard: Library) -> None:
+    shards = await asyncio.to_thread(read_manifest)
+    if root in shards and _record_sizes(shards, root, shard):
+        await asyncio.to_thread(_write_manifest, shards)
+
+
+def _root_of(shards: dict, path: str) -> str | None:
+    """
+    Returns the root holding a path, the deepest one if roots are nested.
+    """
+    holders = [root for root in shards if _is_under(path, root)]
+    return max(holders, key=len) if holders else None
+
+
+def _selected_roots(shards: dict, paths) -> list[str]:
+    """
+    Returns the roots a session limited to `paths` needs: those holding one of
+    the paths and those located under one of them.
+    """
+    if paths is None:
+        return list(shards)
+    selected = []
+    for root in shards:
+        for path in map(_normalize_root, paths):
+            if _is_under(path, root) or _is_under(root, path):
+                selected.append(root)
+                break
+    return selected
+
+
+async def _load_shards(shards: dict, roots: list[str]) -> dict[str, Library]:
+    """
+    Loads several shards at once, each one parsed in its own thread.
+    """
+    libraries = await asyncio.gather(
+        *(json_manager.load_repository(_shard_path(shards[root]["file"])) for root in roots)
+    )
+    return dict(zip(roots, libraries))
+
+
+async def _merged_paths(shards: dict, root: str, shard: Library) -> set[str]:
+    """
+    Returns the duplicates under a root merged away while their kept copy is
+    still in the library, see `duplicates.merged_paths`. Only the shards holding
+    one of those kept copies are read.
+    """
+    by_root = {}
+    for path, kept in (await asyncio.to_thread(load_merged)).items():
+        if _is_under(path, root):
+            by_root.setdefault(_root_of(shards, kept), []).append((path, kept))
+    others = [other for other in by_root if other is not None and other != root]
+    libraries = {**await _load_shards(shards, others), root: shard}
+    return {
+        path for other, pairs in by_root.items() if other in libraries
+        for path, kept in pairs if kept in libraries[other]
+    }
+
+
+async def claim_root(root: str) -> str:
+    """
+    Returns the root whose shard holds `root`, creating a shard for it if there is none.
+
+    Existing roots located under a new root are folded into its shard, so every
+    path belongs to a single shard. The manifest lists the new shard before the
+    folded ones are deleted, so an interruption never loses their tracks.
+
+    Args:
+        root (str): A folder of the library.
+
+    Returns:
+        str: The normalized root of the shard.
+
+    Raises:
+        NotADirectoryError: If `root` is not an existing folder, which would
+                            otherwise stay in the manifest as an empty root.
+    """
+    root = _normalize_root(root)
+    if not os.path.isdir(root):
+        raise NotADirectoryError(f"No existe el directorio {root}")
+    shards = await asyncio.to_thread(read_manifest)
+    holder = _root_of(shards, root)
+    if holder is not None:
+        return holder
+
+    file_name = hashlib.blake2b(os.fsencode(root), digest_size=8).hexdigest() + ".json"
+    nested = [other for other in shards if _is_under(other, root)]
+    shard = Library()
+    if nested:
+        for library in (await _load_shards(shards, nested)).values():
+            shard.update(library)
+        logger.info(f"Se han agrupado {len(nested)} raices dentro de {root}.")
+    await json_manager.save_repository(shard, _shard_path(file_name))
+
+    folded = [Path(_shard_path(shards.pop(other)["file"])) for other in nested]
+    shards[root] = {"file": file_name}
+    _record_sizes(shards, root, shard)
+    await asyncio.to_thread(_write_manifest, shards)
+    for snapshot in folded:
+        _journal_path(snapshot).unlink(missing_ok=True)
+        snapshot.unlink(missing_ok=True)
+    return root
+
+
+def roots() -> list[tuple[str, int, float]]:
+    """
+    Lists the library roots with their number of tracks and duration, from the
+    manifest alone, without loading any shard.
+    """
+    return [(root, shard.get("tracks", 0), shard.get("duration", 0.0)) for root, shard in sorted(read_manifest().items())]
+
+
+async def load_repository(paths=None):
+    """
+    Asynchronously loads the shards of the library roots a session needs.
+
+    Each root is stored in its own shard, a repository file in the format of
+    `json_manager` with its own journal. Only the shards holding one of `paths`,
+    or located under one of them, are loaded, all at once, so startup time and
+    memory depend on what the session uses rather than on the whole archive.
+
+    Args:
+        paths (Iterable[str] | None): Folders the session is limited to. Defaults
+                                      to every root.
+
+    Returns:
+        Library: The tracks of the selected shards.
+    """
+    shards = await asyncio.to_thread(read_manifest)
+    selected = _selected_roots(shards, paths)
+    if not selected:
+        return Library()
+    libraries = await _load_shards(shards, selected)
+
+    changed = [_record_sizes(shards, root, library) for root, library in libraries.items()]
+    if any(changed):
+        try:
+            await asyncio.to_thread(_write_manifest, shards)
+        except OSError as e:
+            logger.warning(f"No se pudo actualizar el manifiesto: {e}")
+
+    # The largest shard is kept as is and the others are added to it
+    ordered = sorted(libraries.values(), key=len, reverse=True)
+    repo = ordered[0]
+    for library in ordered[1:]:
+        repo.update(library)
+    logger.info(f"Se han cargado {len(selected)} de {len(shards)} fragmentos.")
+    return repo
+
+
+def repository_signature(paths=None):
+    """
+    Returns a cheap value that changes whenever a shard a session loads changes.
+
+    See `json_manager.repository_signature`.
+
+    Args:
+        paths (Iterable[str] | None): Folders the session is limited to, as given
+                                      to `load_repository`. Defaults to every root.
+    """
+    shards = read_manifest()
+    return tuple(
+        (root, json_manager.repository_signature(_shard_path(shards[root]["file"])))
+        for root in sorted(_selected_roots(shards, paths))
+    )
+
+
+async def save_repository(data):
+    """
+    Asynchronously saves a repository, rewriting the shard of every root it has tracks in.
+
+    Tracks outside every root are not saved; add their folder with `update_repository`.
+    """
+    shards = await asyncio.to_thread(read_manifest)
+    split = {}
+    for path, entry in data.items():
+        root = _root_of(shards, path)
+        if root is not None:
+            split.setdefault(root, {})[path] = entry
+    await asyncio.gather(
+        *(json_manager.save_repository(entries, _shard_path(shards[root]["file"])) for root, entries in split.items())
+    )
+
+
+async def record_changes(repo, upserts, removals=()):
+    """
+    Asynchronously persists a set of changes, each one in the shard of its root.
+
+    Every shard appends its changes to its own journal, see
+    `json_manager.record_changes`. A shard that needs compacting is read back
+    from disk, so the other roots of `repo` are never rewritten.
+
+    Args:
+        repo (Library | None): The repository, with the changes already applied. Unused.
+        upserts (dict): The entries added or replaced, keyed by path.
+        removals (Iterable[str]): The paths whose entries were removed.
+    """
+    shards = await asyncio.to_thread(read_manifest)
+    split = {}
+    for path, entry in upserts.items():
+        root = _root_of(shards, path)
+        if root is None:
+            logger.warning(f"{path} no pertenece a ninguna raiz, no se guardara.")
+            continue
+        split.setdefault(root, ({}, []))[0][path] = entry
+    for path in removals:
+        root = _root_of(shards, path)
+        if root is not None:
+            split.setdefault(root, ({}, []))[1].append(path)
+    await asyncio.gather(*(
+        json_manager.record_changes(None, shard_upserts, shard_removals, path=_shard_path(shards[root]["file"]))
+        for root, (shard_upserts, shard_removals) in split.items()
+    ))
+
+
+async def update_repository(paths, mode="process", max_workers=None, repo=None):
+    """
+    Scans a folder for new audio files and adds them to the shard of its root.
+
+    A folder outside every root becomes a new root. The update runs on the shard
+    alone, read from disk, so compacting its journal never writes the tracks of
+    other roots into it; the new tracks are then added to `repo`. Paths are
+    stored resolved, so that every path can be matched with its root. See
+    `json_manager.update_repository`.
+
+    Args:
+        paths (str): The path to the directory to scan for new audio files.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+        repo (Library | None): The already loaded session repository, updated in
+                               place. When omitted, only the shard of the root is loaded.
+
+    Returns:
+        Library: The updated repository.
+    """
+    try:
+        root = await claim_root(paths)
+    except NotADirectoryError as e:
+        logger.error(f"No se pudo escanear el directorio {paths}: {e}")
+        return repo
+    except OSError as e:
+        logger.error(f"No se pudo crear el fragmento de {paths}: {e}")
+        return repo
+    shards = await asyncio.to_thread(read_manifest)
+    shard_path = _shard_path(shards[root]["file"])
+    shard = await json_manager.load_repository(shard_path)
+    known = set(shard)
+    merged = await _merged_paths(shards, root, shard)
+    shard = await json_manager.update_repository(
+        _normalize_root(paths), mode, max_workers, repo=shard, path=shard_path, merged=merged,
+    )
+    await _refresh_sizes(root, shard)
+    if repo is None:
+        return shard
+    repo.update({file_path: entry for file_path, entry in shard.items() if file_path not in known})
+    return repo
+
+
+async def rescan_repository(paths, mode="process", max_workers=None):
+    """
+    Rescans a folder and brings the shard of its root in sync with the disk.
+
+    Only that shard is loaded and written, see `json_manager.plan_rescan`.
+
+    Args:
+        paths (str): The path to the directory to rescan.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+    """
+    try:
+        root = await claim_root(paths)
+        shards = await asyncio.to_thread(read_manifest)
+        shard_path = _shard_path(shards[root]["file"])
+        shard = await json_manager.load_repository(shard_path)
+        merged = await _merged_paths(shards, root, shard)
+        upserts, removals = await plan_rescan(shard, _normalize_root(paths), mode, max_workers, merged)
+        if not upserts and not removals:
+            return
+
+        for file_path in removals:
+            del shard[file_path]
+        shard.update(upserts)
+        await json_manager.record_changes(shard, upserts, removals, path=shard_path)
+        await _refresh_sizes(root, shard)
+    except (FileNotFoundError, NotADirectoryError) as e:
+        logger.error(f"No se pudo escanear el directorio {paths}: {e}")
+    except Exception as e:
+        logger.error(f"Error inesperado al reescanear el repositorio: {e}")
@@ -0,0 +1,353 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from .library import Library, Summary, NO_FINGERPRINT
+
+# Files ending with this suffix are read and written as binary snapshots by `json_manager`
+SNAPSHOT_SUFFIX = ".zsnap"
+SNAPSHOT_MAGIC = b"ZASNAP\r\n"
+SNAPSHOT_VERSION = 1
+
+# Header: magic, version, number of tracks, albums and artists, total duration,
+# then the offsets of the record table, the path index and the string pool
+HEADER = struct.Struct("<8sIIIIdQQQ")
+# Record: (offset, length) of the directory, file name, title, album and artist
+# in the string pool, duration, then the (size, mtime_ns, inode) fingerprint
+RECORD = struct.Struct("<10If4xqqQ")
+# The directory and file name fields at the start of a record, all a path lookup reads
+RECORD_PATH = struct.Struct("<4I")
+# Length of a string that is None
+NO_STRING = 0xFFFFFFFF
+
+
+class _Pool:
+    """
+    The string pool of a snapshot being written. Directories, albums and artists
+    are stored once and shared by every record that uses them.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self._shared = {}
+
+    def add(self, value, shared: bool = False) -> tuple[int, int]:
+        if value is None:
+            return 0, NO_STRING
+        if shared and value in self._shared:
+            return self._shared[value]
+        encoded = value.encode("utf-8", "surrogateescape")
+        reference = (len(self.data), len(encoded))
+        if reference[0] + reference[1] > NO_STRING:
+            raise ValueError("El repositorio es demasiado grande para una instantanea binaria")
+        self.data += encoded
+        if shared:
+            self._shared[value] = reference
+        return reference
+
+
+def write_snapshot(file, entries) -> int:
+    """
+    Writes repository entries as a binary snapshot.
+
+    The snapshot is made of a fixed-size record per track, a string pool with
+    every text field and an index of the records sorted by path, so
+    `MappedLibrary` can look up a track or read the n-th one without decoding
+    anything else. The size of the library is stored in the header.
+
+    Args:
+        file (BinaryIO): The file to write, opened in binary mode.
+        entries (Mapping): The repository, keyed by path.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    items = list(entries.items())
+    pool = _Pool()
+    records = bytearray(RECORD.size * len(items))
+    albums, artists = set(), set()
+    total = 0.0
+    for row, (path, entry) in enumerate(items):
+        directory, name = Library._split(path)
+        title, album, artist, duration = entry[:4]
+        fingerprint = entry[4] if len(entry) > 4 and entry[4] else None
+        size, mtime_ns, inode = fingerprint or (NO_FINGERPRINT, 0, 0)
+        RECORD.pack_into(
+            records, row * RECORD.size,
+            *pool.add(directory, shared=True), *pool.add(name), *pool.add(title),
+            *pool.add(album, shared=True), *pool.add(artist, shared=True),
+            duration or 0.0, size, mtime_ns, inode,
+        )
+        albums.add(album)
+        artists.add(artist)
+        total += duration or 0.0
+
+    order = array('I', sorted(range(len(items)), key=lambda row: items[row][0]))
+    records_offset = HEADER.size
+    index_offset = records_offset + len(records)
+    pool_offset = index_offset + len(order) * order.itemsize
+    file.write(HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(items), len(albums), len(artists), round(total, 2),
+        records_offset, index_offset, pool_offset,
+    ))
+    file.write(records)
+    file.write(order.tobytes())
+    file.write(pool.data)
+    return pool_offset + len(pool.data)
+
+
+class MappedLibrary(MutableMapping):
+    """
+    A music library read lazily from a binary snapshot mapped in memory.
+
+    Opening it only reads the header, whatever the size of the library: a track
+    is decoded from its record when it is accessed, and a path is found with a
+    binary search over the path index of the snapshot. The mapping is read-only,
+    so processes opening the same snapshot share its pages in the OS cache.
+
+    Changes are kept in memory on top of the snapshot. Reading a track by path or
+    by row, iterating, and ordering by path work on the snapshot directly. The
+    album and artist index, ordering by another column, and the summary of a
+    changed library need every track: the first time one of them is used, the
+    library is decoded into a `Library` once, and that copy serves every later
+    access. Until it is written again, the snapshot file must not be modified in
+    place; replacing it with a new file, as `json_manager.save_repository` does,
+    is safe.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The snapshot file.
+
+        Raises:
+            ValueError: If the file is not a snapshot, or of another version.
+            OSError: If the file cannot be opened.
+        """
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, albums, artists, duration, records, index, pool = HEADER.unpack_from(self._map)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} no es una instantanea del repositorio compatible")
+        self._view = memoryview(self._map)
+        self._count = count
+        self._summary = Summary(count, albums, artists, duration)
+        self._records = records
+        self._order = self._view[index:index + count * 4].cast('I')
+        self._pool = pool
+        self._replaced = {}  # Snapshot row -> entry set since it was opened
+        self._removed = set()  # Snapshot rows deleted since it was opened
+        self._added = {}  # Path -> entry of the tracks missing from the snapshot
+        self._added_paths = None  # The keys of `_added`, for reads by row
+        self._rows = None  # Snapshot rows still present, when some were removed
+        self._library = None  # The decoded library, once an operation needed every track
+
+    # Decoding
+
+    def _string(self, offset: int, length: int):
+        if length == NO_STRING:
+            return None
+        start = self._pool + offset
+        return str(self._view[start:start + length], "utf-8", "surrogateescape")
+
+    def _record(self, row: int) -> tuple:
+        return RECORD.unpack_from(self._map, self._records + row * RECORD.size)
+
+    def _base_path(self, row: int) -> str:
+        dir_offset, dir_length, name_offset, name_length = RECORD_PATH.unpack_from(
+            self._map, self._records + row * RECORD.size
+        )
+        return self._string(dir_offset, dir_length) + self._string(name_offset, name_length)
+
+    def _base_item(self, row: int) -> tuple[str, tuple]:
+        record = self._record(row)
+        path = self._string(record[0], record[1]) + self._string(record[2], record[3])
+        entry = self._replaced.get(row)
+        if entry is not None:
+            return path, entry
+        size, mtime_ns, inode = record[11:]
+        return path, (
+            self._string(record[4], record[5]),
+            self._string(record[6], record[7]),
+            self._string(record[8], record[9]),
+            round(record[10], 2),  # Undo the float32 rounding noise
+            (size, mtime_ns, inode) if size != NO_FINGERPRINT else None,
+        )
+
+    def _find(self, path: str) -> int | None:
+        """
+        Returns the snapshot row of a path, or None, by binary search over the path index.
+        """
+        order = self._order
+        position = bisect_left(range(self._count), path, key=lambda position: self._base_path(order[position]))
+        if position < self._count and self._base_path(order[position]) == path:
+            row = order[position]
+            return None if row in self._removed else row
+        return None
+
+    def _live_rows(self):
+        if not self._removed:
+            return range(self._count)
+        if self._rows is None:
+            removed = self._removed
+            self._rows = array('I', (row for row in range(self._count) if row not in removed))
+        return self._rows
+
+    def _decoded(self) -> Library:
+        """
+        Decodes every track into a `Library`, which from then on holds the library.
+        """
+        if self._library is None:
+            self._library = Library(self.items())
+        return self._library
+
+    # Mapping
+
+    def __getitem__(self, path: str) -> tuple:
+        if self._library is not None:
+            return self._library[path]
+        entry = self._added.get(path)
+        if entry is not None:
+            return entry
+        row = self._find(path)
+        if row is None:
+            raise KeyError(path)
+        return self._base_item(row)[1]
+
+    def __setitem__(self, path: str, entry) -> None:
+        if self._library is not None:
+            self._library[path] = entry
+            return
+        entry = tuple(entry)
+        if path not in self._added:
+            row = self._find(path)
+            if row is not None:
+                self._replaced[row] = entry
+                return
+        if path not in self._added:
+            self._added_paths = None
+        self._added[path] = entry
+
+    def __delitem__(self, path: str) -> None:
+        if self._library is not None:
+            del self._library[path]
+            return
+        if self._added.pop(path, None) is not None:
+            self._added_paths = None
+            return
+        row = self._find(path)
+        if row is None:
+            raise KeyError(path)
+        self._removed.add(row)
+        self._replaced.pop(row, None)
+        self._rows = None
+
+    def __contains__(self, path) -> bool:
+        if self._library is not None:
+            return path in self._library
+        return path in self._added or self._find(path) is not None
+
+    def __iter__(self):
+        if self._library is not None:
+            return iter(self._library)
+        return self._paths()
+
+    def _paths(self):
+        yield from map(self._base_path, self._live_rows())
+        yield from list(self._added)
+
+    def __len__(self) -> int:
+        if self._library is not None:
+            return len(self._library)
+        return self._count - len(self._removed) + len(self._added)
+
+    def __repr__(self) -> str:
+        return f"<MappedLibrary: {len(self)} tracks>"
+
+    def items(self):
+        if self._library is not None:
+            return self._library.items()
+        return _MappedItems(self)
+
+    def values(self):
+        if self._library is not None:
+            return self._library.values()
+        return _MappedValues(self)
+
+    # Library interface
+
+    @property
+    def index(self):
+        """
+        The album and artist index, see `Library.index`. Decodes every track.
+        """
+        return self._decoded().index
+
+    def item_at(self, row: int) -> tuple[str, tuple]:
+        """
+        Returns the (path, entry) pair stored at a row, as listed by `order_by`.
+        """
+        if self._library is not None:
+            return self._library.item_at(row)
+        rows = self._live_rows()
+        if row < len(rows):
+            return self._base_item(rows[row])
+        if self._added_paths is None:
+            self._added_paths = list(self._added)
+        path = self._added_paths[row - len(rows)]
+        return path, self._added[path]
+
+    def paths_named(self, names) -> dict[str, list[str]]:
+        """
+        Returns the paths of the tracks whose file name is one of `names`, grouped by name.
+        """
+        if self._library is not None:
+            return self._library.paths_named(names)
+        found = {}
+        for path in self:
+            name = Library._split(path)[1]
+            if name in names:
+                found.setdefault(name, []).append(path)
+        return found
+
+    def order_by(self, field: str, reverse: bool = False) -> array:
+        """
+        Returns the rows sorted by one column, see `Library.order_by`.
+
+        Ordering an unchanged snapshot by path reads its path index; anything
+        else decodes every track.
+        """
+        if self._library is None and field == "path" and not (self._removed or self._added):
+            order = array('I', self._order)
+            if reverse:
+                order.reverse()
+            return order
+        return self._decoded().order_by(field, reverse)
+
+    def summary(self) -> Summary:
+        """
+        Returns the size of the library, read from the header while it is unchanged.
+        """
+        if self._library is None and not (self._replaced or self._removed or self._added):
+            return self._summary
+        return self._decoded().summary()
+
+    def to_dict(self) -> dict:
+        """
+        Returns the library as the plain dictionary stored in `za_repository.json`.
+        """
+        return dict(self.items())
+
+
+class _MappedItems(ItemsView):
+    def __iter__(self):
+        library = self._mapping
+        yield from map(library._base_item, library._live_rows())
+        yield from list(library._added.items())
+
+
+class _MappedValues(ValuesView):
+    def __iter__(self):
+        return (entry for _, entry in self._mapping.items())
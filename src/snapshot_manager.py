@@ -0,0 +1,111 @@
+import logging
+from pathlib import Path
+from . import json_manager
+from .json_manager import DEFAULT_REPO_PATH
+from .snapshot import SNAPSHOT_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_SNAPSHOT_PATH = str(Path.home() / "za_player" / f"za_repository{SNAPSHOT_SUFFIX}")
+
+
+async def load_repository(path=None):
+    """
+    Asynchronously opens the binary snapshot of the library.
+
+    The snapshot is mapped in memory and only its header is read, so opening it
+    takes the same time whatever the size of the library. Changes recorded in
+    its journal since the last compaction are applied on top, as with
+    `json_manager.load_repository`.
+
+    Args:
+        path (str | None): The snapshot file. Defaults to `DEFAULT_SNAPSHOT_PATH`.
+
+    Returns:
+        MappedLibrary | Library: The library, or an empty `Library` for a new repository.
+    """
+    return await json_manager.load_repository(path or DEFAULT_SNAPSHOT_PATH)
+
+
+def repository_signature(path=None):
+    """
+    Returns a cheap value that changes whenever the snapshot or its journal change.
+
+    See `json_manager.repository_signature`.
+    """
+    return json_manager.repository_signature(path or DEFAULT_SNAPSHOT_PATH)
+
+
+async def save_repository(data, path=None):
+    """
+    Asynchronously writes the library as a new binary snapshot, atomically.
+
+    See `json_manager.save_repository`.
+    """
+    await json_manager.save_repository(data, path or DEFAULT_SNAPSHOT_PATH)
+
+
+async def record_changes(repo, upserts, removals=(), path=None):
+    """
+    Asynchronously appends a set of changes to the journal of the snapshot.
+
+    See `json_manager.record_changes`; compactions write a new binary snapshot.
+    """
+    await json_manager.record_changes(repo, upserts, removals, path=path or DEFAULT_SNAPSHOT_PATH)
+
+
+async def update_repository(paths, mode="process", max_workers=None, repo=None, path=None):
+    """
+    Scans a folder for new audio files and records them in the journal of the snapshot.
+
+    See `json_manager.update_repository`.
+    """
+    return await json_manager.update_repository(paths, mode, max_workers, repo=repo, path=path or DEFAULT_SNAPSHOT_PATH)
+
+
+async def rescan_repository(paths, mode="process", max_workers=None, path=None):
+    """
+    Rescans a folder and records its changes in the journal of the snapshot.
+
+    See `json_manager.rescan_repository`.
+    """
+    await json_manager.rescan_repository(paths, mode, max_workers, path=path or DEFAULT_SNAPSHOT_PATH)
+
+
+async def json_to_snapshot(json_path=None, snapshot_path=None) -> int:
+    """
+    Converts `za_repository.json`, with its journal, into a binary snapshot.
+
+    The JSON repository is left untouched.
+
+    Args:
+        json_path (str | None): The JSON repository. Defaults to `DEFAULT_REPO_PATH`.
+        snapshot_path (str | None): The snapshot to write. Defaults to `DEFAULT_SNAPSHOT_PATH`.
+
+    Returns:
+        int: The number of tracks converted.
+    """
+    repo = await json_manager.load_repository(json_path or DEFAULT_REPO_PATH)
+    await json_manager.save_repository(repo, snapshot_path or DEFAULT_SNAPSHOT_PATH)
+    logger.info(f"Se han convertido {len(repo)} canciones a la instantanea binaria.")
+    return len(repo)
+
+
+async def snapshot_to_json(snapshot_path=None, json_path=None) -> int:
+    """
+    Converts a binary snapshot, with its journal, back into `za_repository.json`.
+
+    The snapshot is left untouched.
+
+    Args:
+        snapshot_path (str | None): The snapshot. Defaults to `DEFAULT_SNAPSHOT_PATH`.
+        json_path (str | None): The JSON repository to write. Defaults to `DEFAULT_REPO_PATH`.
+
+    Returns:
+        int: The number of tracks converted.
+    """
+    repo = await json_manager.load_repository(snapshot_path or DEFAULT_SNAPSHOT_PATH)
+    await json_manager.save_repository(repo, json_path or DEFAULT_REPO_PATH)
+    logger.info(f"Se han convertido {len(repo)} canciones a JSON.")
+    return len(repo)
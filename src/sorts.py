@@ -1,4 +1,127 @@
 import random
+from collections import deque
+from .library import UNKNOWN_TAGS, Library
+from .snapshot import MappedLibrary
+from .sqlite_library import SqliteLibrary
+
+# Rounds of the Feistel network behind `index_permutation`
+PERMUTATION_ROUNDS = 4
+# In spread mode, tracks that must play before the same artist or album comes back
+ARTIST_SPREAD = 4
+ALBUM_SPREAD = 8
+# In spread mode, tracks held back at most while waiting for their artist or album to be far enough
+SPREAD_HOLD_BACK = 32
+
+
+def index_permutation(n: int, rng: random.Random = random):
+    """
+    Yields the numbers 0 to `n` - 1, each once, in a random order, in constant memory.
+
+    A random Feistel network is a permutation of the integers of an even number
+    of bits. Numbers of the smallest such domain that are not below `n` are
+    skipped ("cycle walking"), which takes fewer than four steps on average,
+    since the domain is less than four times `n`. Starting the walk from a
+    number below `n` keeps the result a permutation of them.
+
+    Args:
+        n (int): How many numbers to permute.
+        rng (random.Random): Source of the permutation keys.
+    """
+    half_bits = max((n - 1).bit_length() + 1, 2) // 2
+    mask = (1 << half_bits) - 1
+    keys = [rng.getrandbits(64) for _ in range(PERMUTATION_ROUNDS)]
+
+    def permute(value: int) -> int:
+        left, right = value >> half_bits, value & mask
+        for key in keys:
+            # splitmix64 finalizer as the round function
+            mixed = (right + key) & 0xFFFFFFFFFFFFFFFF
+            mixed = ((mixed ^ (mixed >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+            mixed = ((mixed ^ (mixed >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+            left, right = right, left ^ ((mixed ^ (mixed >> 31)) & mask)
+        return (left << half_bits) | right
+
+    for index in range(n):
+        value = permute(index)
+        while value >= n:
+            value = permute(value)
+        yield value
+
+
+def _spread(tracks, artist_spread: int, album_spread: int, hold_back: int):
+    """
+    Reorders a stream of (path, entry) pairs so that the same artist or album
+    does not come back too soon, holding back at most `hold_back` tracks.
+
+    A track whose artist played within the last `artist_spread` tracks, or whose
+    album played within the last `album_spread`, waits until it fits. If every
+    held track still conflicts once `hold_back` are waiting, the one that waited
+    longest plays anyway, so the work per track never depends on the library size.
+    Unknown artists and albums, missing or tagged with the placeholder of the
+    extractor, never conflict.
+    """
+    recent_artists = deque(maxlen=artist_spread)
+    recent_albums = deque(maxlen=album_spread)
+    held = []
+
+    def fits(entry) -> bool:
+        return not (
+            (entry[2] not in UNKNOWN_TAGS and entry[2] in recent_artists)
+            or (entry[1] not in UNKNOWN_TAGS and entry[1] in recent_albums)
+        )
+
+    source = iter(tracks)
+    exhausted = False
+    while True:
+        choice = next((i for i, (_, entry) in enumerate(held) if fits(entry)), None)
+        while choice is None and not exhausted and len(held) < hold_back:
+            track = next(source, None)
+            if track is None:
+                exhausted = True
+            else:
+                held.append(track)
+                if fits(track[1]):
+                    choice = len(held) - 1
+        if choice is None:
+            if not held:
+                return
+            choice = 0
+        path, entry = held.pop(choice)
+        recent_artists.append(entry[2])
+        recent_albums.append(entry[1])
+        yield path, entry[0]
+
+
+def shuffle_stream(repo: dict, spread: bool = False, rng: random.Random = random):
+    """
+    Yields the whole repository as (path, title) tuples in random order, one at a time.
+
+    Unlike `random_sort`, no playlist is built: tracks are read through
+    `index_permutation`, so the first one is ready at once and memory does not
+    grow with the library. When `repo` is a `Library`, `MappedLibrary` or `SqliteLibrary`, tracks
+    are read by row, so the stream is only valid while the library does not change.
+
+    Args:
+        repo (dict): Dictionary with paths as keys and (title, album, artist, duration) as values.
+        spread (bool): Keep songs of the same artist or album apart, see `_spread`.
+        rng (random.Random): Source of the shuffle.
+
+    Yields:
+        tuple[str, str]: (path, title) tuples in random order.
+    """
+    if isinstance(repo, (Library, MappedLibrary, SqliteLibrary)):
+        track_at = repo.item_at
+    else:
+        paths = list(repo)  # A plain dictionary cannot be read by position
+
+        def track_at(row: int) -> tuple[str, tuple]:
+            return paths[row], repo[paths[row]]
+
+    tracks = (track_at(row) for row in index_permutation(len(repo), rng))
+    if spread:
+        yield from _spread(tracks, ARTIST_SPREAD, ALBUM_SPREAD, SPREAD_HOLD_BACK)
+    else:
+        yield from ((path, entry[0]) for path, entry in tracks)
 
 
 def random_sort(repo: dict) -> list[tuple[str, str]]:
@@ -20,6 +143,9 @@ def album_sort(repo: dict, album: str) -> list[tuple[str, str]]:
     """
     Generates a randomly shuffled playlist of songs from a specific album.
 
+    When `repo` is a `Library`, the tracks are taken from its album index instead
+    of scanning every entry.
+
     Args:
         repo (dict): Dictionary with paths as keys and (title, album, artist, duration) as values.
         album (str): Name of the album to filter by.
@@ -27,6 +153,13 @@ def album_sort(repo: dict, album: str) -> list[tuple[str, str]]:
     Returns:
         list[tuple[str, str]]: List of (path, title) tuples for the album, in random order.
     """
+    if isinstance(repo, (Library, MappedLibrary, SqliteLibrary)):
+        path_title_pairs = repo.index.album_tracks(album)
+        if album == "No album":
+            path_title_pairs += repo.index.album_tracks(None)
+        random.shuffle(path_title_pairs)
+        return path_title_pairs
+
     path_title_pairs = [
         (path, metadata[0])
         for path, metadata in repo.items()
@@ -40,6 +173,9 @@ def artist_sort(repo: dict, artist: str) -> list[tuple[str, str]]:
     """
     Generates a randomly shuffled playlist of songs by a specific artist.
 
+    When `repo` is a `Library`, the tracks are taken from its artist index instead
+    of scanning every entry.
+
     Args:
         repo (dict): Dictionary with paths as keys and (title, album, artist, duration) as values.
         artist (str): Name of the artist to filter by.
@@ -47,6 +183,13 @@ def artist_sort(repo: dict, artist: str) -> list[tuple[str, str]]:
     Returns:
         list[tuple[str, str]]: List of (path, title) tuples for the artist, in random order.
     """
+    if isinstance(repo, (Library, MappedLibrary, SqliteLibrary)):
+        path_title_pairs = repo.index.artist_tracks(artist)
+        if artist == "Unknown artist":
+            path_title_pairs += repo.index.artist_tracks(None)
+        random.shuffle(path_title_pairs)
+        return path_title_pairs
+
     path_title_pairs = [
         (path, metadata[0])
         for path, metadata in repo.items()
@@ -0,0 +1,265 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from .library import SORT_FIELDS, Facet, Library, Summary
+
+# Rows read at a time when iterating the library
+PAGE_SIZE = 1000
+
+COLUMNS = "path, title, album, artist, duration, size, mtime_ns, inode"
+
+UPSERT = f"""
+INSERT INTO tracks ({COLUMNS})
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET
+    title = excluded.title,
+    album = excluded.album,
+    artist = excluded.artist,
+    duration = excluded.duration,
+    size = excluded.size,
+    mtime_ns = excluded.mtime_ns,
+    inode = excluded.inode
+"""
+
+
+def _to_row(path: str, entry) -> tuple:
+    """
+    Flattens a repository entry into a `tracks` row.
+    """
+    title, album, artist, duration = entry[:4]
+    size, mtime_ns, inode = entry[4] if len(entry) > 4 and entry[4] else (None, None, None)
+    return (path, title, album, artist, duration, size, mtime_ns, inode)
+
+
+def _to_entry(row: tuple) -> list:
+    """
+    Converts a `tracks` row back into the repository entry used by `json_manager`.
+    """
+    path, title, album, artist, duration, size, mtime_ns, inode = row
+    fingerprint = [size, mtime_ns, inode] if size is not None else None
+    return [title, album, artist, duration, fingerprint]
+
+
+def _select_tracks(connection, column: str, value: str | None) -> list[tuple[str, str]]:
+    # IS also matches the tracks without album or artist when `value` is None
+    return connection.execute(f"SELECT path, title FROM tracks WHERE {column} IS ?", (value,)).fetchall()
+
+
+def _select_facets(connection, column: str) -> list[Facet]:
+    # Tracks without album or artist are grouped last, as in `LibraryIndex`
+    rows = connection.execute(
+        f"SELECT {column}, COUNT(*), ROUND(TOTAL(duration), 2) FROM tracks "
+        f"GROUP BY {column} ORDER BY {column} IS NULL, {column}"
+    )
+    return [Facet(*row) for row in rows]
+
+
+class SqliteLibrary(MutableMapping):
+    """
+    A music library read from the SQLite database as it is used.
+
+    Nothing is loaded up front: a track is read through the primary key when it
+    is accessed and iterating the library reads the table a page at a time.
+    Reading the n-th track, as `LibraryView` and `shuffle_stream` do, goes
+    through the rowids of the table, the only column kept in memory, read again
+    whenever the database changed. Sorting, the summary and the album and artist
+    index are SQL queries answered by the indexes of the table.
+
+    The library may be used from several threads at once: every statement, and
+    the rowid cache, is guarded by a lock, held for one statement at a time.
+
+    Changes are written to the database at once, each one in its own transaction.
+    """
+
+    def __init__(self, connection):
+        """
+        Args:
+            connection (sqlite3.Connection): An open connection to the repository
+                database, usable from any thread.
+        """
+        self._connection = connection
+        self._lock = threading.RLock()
+        self._rowids = None
+        self._version = None
+
+    def _fetchall(self, query: str, parameters=()) -> list[tuple]:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def _fetchone(self, query: str, parameters=()) -> tuple | None:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchone()
+
+    def _write(self, query: str, parameters=()) -> int:
+        with self._lock, self._connection:
+            return self._connection.execute(query, parameters).rowcount
+
+    def _pages(self, columns: str):
+        """
+        Yields `columns` of every track in storage order, reading `PAGE_SIZE` rows
+        at a time, so the lock is never held between two rows.
+        """
+        last = 0  # The rowids SQLite assigns start at 1
+        while True:
+            rows = self._fetchall(
+                f"SELECT rowid, {columns} FROM tracks WHERE rowid > ? ORDER BY rowid LIMIT {PAGE_SIZE}", (last,)
+            )
+            for row in rows:
+                yield row[1:]
+            if len(rows) < PAGE_SIZE:
+                return
+            last = rows[-1][0]
+
+    def _row_ids(self) -> array:
+        """
+        Returns the rowids of every track in storage order, the rows of `item_at`.
+        """
+        with self._lock:
+            # data_version changes with commits of other connections, total_changes with ours
+            version = (self._connection.execute("PRAGMA data_version").fetchone()[0], self._connection.total_changes)
+            if self._rowids is None or version != self._version:
+                rows = self._connection.execute("SELECT rowid FROM tracks ORDER BY rowid")
+                self._rowids = array('q', (rowid for rowid, in rows))
+                self._version = version
+            return self._rowids
+
+    @property
+    def index(self) -> "SqliteIndex":
+        """
+        The album and artist index of the library, see `Library.index`.
+        """
+        return SqliteIndex(self)
+
+    def __getitem__(self, path: str) -> list:
+        row = self._fetchone(f"SELECT {COLUMNS} FROM tracks WHERE path = ?", (path,))
+        if row is None:
+            raise KeyError(path)
+        return _to_entry(row)
+
+    def __setitem__(self, path: str, entry) -> None:
+        self._write(UPSERT, _to_row(path, entry))
+
+    def __delitem__(self, path: str) -> None:
+        if not self._write("DELETE FROM tracks WHERE path = ?", (path,)):
+            raise KeyError(path)
+
+    def __contains__(self, path) -> bool:
+        return self._fetchone("SELECT 1 FROM tracks WHERE path = ?", (path,)) is not None
+
+    def __iter__(self):
+        return (path for path, in self._pages("path"))
+
+    def __len__(self) -> int:
+        return len(self._row_ids())
+
+    def __repr__(self) -> str:
+        return f"<SqliteLibrary: {len(self)} tracks>"
+
+    def items(self):
+        return _SqliteItems(self)
+
+    def values(self):
+        return _SqliteValues(self)
+
+    def item_at(self, row: int) -> tuple[str, list]:
+        """
+        Returns the (path, entry) pair stored at a row, as listed by `order_by`.
+        """
+        with self._lock:
+            record = self._fetchone(f"SELECT {COLUMNS} FROM tracks WHERE rowid = ?", (self._row_ids()[row],))
+        return record[0], _to_entry(record)
+
+    def paths_named(self, names) -> dict[str, list[str]]:
+        """
+        Returns the paths of the tracks whose file name is one of `names`, grouped by name.
+        """
+        found = {}
+        for path in self:
+            name = Library._split(path)[1]
+            if name in names:
+                found.setdefault(name, []).append(path)
+        return found
+
+    def order_by(self, field: str, reverse: bool = False) -> array:
+        """
+        Returns the rows sorted by one column, see `Library.order_by`.
+
+        Raises:
+            ValueError: If `field` is not one of `SORT_FIELDS`.
+        """
+        if field not in SORT_FIELDS:
+            raise ValueError(f"Columna de ordenacion desconocida: {field}")
+        direction = "DESC" if reverse else "ASC"
+        with self._lock:
+            rowids = self._row_ids()
+            # Empty values go last, or first in reverse, and ties keep the storage order, as in `Library`
+            rows = self._connection.execute(
+                f"SELECT rowid FROM tracks ORDER BY {field} IS NULL {direction}, {field} {direction}, rowid"
+            )
+            return array('I', (bisect_left(rowids, rowid) for rowid, in rows))
+
+    def summary(self) -> Summary:
+        """
+        Returns the number of tracks, albums and artists and the total duration of the library.
+        """
+        # Tracks without album or artist count as one more album or artist, as in `Library`
+        return Summary(*self._fetchone(
+            "SELECT COUNT(*), COUNT(DISTINCT album) + (COUNT(*) > COUNT(album)), "
+            "COUNT(DISTINCT artist) + (COUNT(*) > COUNT(artist)), ROUND(TOTAL(duration), 2) FROM tracks"
+        ))
+
+    def to_dict(self) -> dict:
+        """
+        Returns the library as the plain dictionary stored in `za_repository.json`.
+        """
+        return dict(self.items())
+
+
+class SqliteIndex:
+    """
+    The album and artist lookups of `LibraryIndex`, answered by the indexes of the database.
+    """
+
+    __slots__ = ("_library",)
+
+    def __init__(self, library: SqliteLibrary):
+        self._library = library
+
+    def _query(self, select, *args):
+        with self._library._lock:
+            return select(self._library._connection, *args)
+
+    def album_tracks(self, album: str) -> list[tuple[str, str]]:
+        """
+        Returns the (path, title) tuples of every track of an album, in no particular order.
+        """
+        return self._query(_select_tracks, "album", album)
+
+    def artist_tracks(self, artist: str) -> list[tuple[str, str]]:
+        """
+        Returns the (path, title) tuples of every track by an artist, in no particular order.
+        """
+        return self._query(_select_tracks, "artist", artist)
+
+    def albums(self) -> list[Facet]:
+        """
+        Returns every album sorted by name, with its number of tracks and total duration.
+        """
+        return self._query(_select_facets, "album")
+
+    def artists(self) -> list[Facet]:
+        """
+        Returns every artist sorted by name, with its number of tracks and total duration.
+        """
+        return self._query(_select_facets, "artist")
+
+
+class _SqliteItems(ItemsView):
+    def __iter__(self):
+        return ((row[0], _to_entry(row)) for row in self._mapping._pages(COLUMNS))
+
+
+class _SqliteValues(ValuesView):
+    def __iter__(self):
+        return (entry for _, entry in self._mapping.items())
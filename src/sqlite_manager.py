@@ -0,0 +1,354 @@
+import os
+import random
+import sqlite3
+import asyncio
+import logging
+from pathlib import Path
+from .files_manager import scan_audio_files
+from .extractor import extract_metadata_parallel
+from .json_manager import plan_rescan, _is_under
+from .duplicates import load_merged
+from .library import Facet, Library
+from .sqlite_library import COLUMNS, UPSERT, SqliteLibrary, _select_facets, _select_tracks, _to_entry, _to_row
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_DB_PATH = str(Path.home() / "za_player" / "za_repository.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    title TEXT,
+    album TEXT,
+    artist TEXT,
+    duration REAL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER
+);
+CREATE INDEX IF NOT EXISTS tracks_album ON tracks (album);
+CREATE INDEX IF NOT EXISTS tracks_artist ON tracks (artist);
+CREATE INDEX IF NOT EXISTS tracks_title ON tracks (title);
+"""
+
+# SQLite refuses statements with too many bound parameters
+QUERY_CHUNK_SIZE = 500
+
+
+def _connect(check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Opens the repository database in WAL mode, creating it and its schema if needed.
+
+    Args:
+        check_same_thread (bool): False for a connection used from several threads.
+    """
+    path_obj = Path(DEFAULT_DB_PATH).resolve()  # Normalize path for Windows compatibility
+    path_obj.parent.mkdir(parents=True, exist_ok=True)
+
+    connection = sqlite3.connect(path_obj, check_same_thread=check_same_thread)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _run(operation, *args, connection: sqlite3.Connection | None = None):
+    """
+    Runs `operation` and commits its changes.
+
+    Args:
+        connection (sqlite3.Connection | None): The connection of an operation made
+            of several steps, opened once with `_connect(False)`. A fresh one is
+            opened and closed by default.
+    """
+    if connection is not None:
+        with connection:
+            return operation(connection, *args)
+    connection = _connect()
+    try:
+        with connection:
+            return operation(connection, *args)
+    finally:
+        connection.close()
+
+
+def _replace_all(connection: sqlite3.Connection, data: dict) -> None:
+    connection.executemany(UPSERT, (_to_row(path, entry) for path, entry in data.items()))
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS kept (path TEXT PRIMARY KEY)")
+    connection.execute("DELETE FROM kept")
+    connection.executemany("INSERT INTO kept (path) VALUES (?)", ((path,) for path in data))
+    connection.execute("DELETE FROM tracks WHERE path NOT IN (SELECT path FROM kept)")
+
+
+def _apply_changes(connection: sqlite3.Connection, upserts: dict, removals) -> None:
+    connection.executemany("DELETE FROM tracks WHERE path = ?", ((path,) for path in removals))
+    connection.executemany(UPSERT, (_to_row(path, entry) for path, entry in upserts.items()))
+
+
+def _existing_paths(connection: sqlite3.Connection, paths: list[str]) -> set[str]:
+    existing = set()
+    for start in range(0, len(paths), QUERY_CHUNK_SIZE):
+        chunk = paths[start:start + QUERY_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = connection.execute(f"SELECT path FROM tracks WHERE path IN ({placeholders})", chunk)
+        existing.update(row[0] for row in rows)
+    return existing
+
+
+def _merged_paths(connection: sqlite3.Connection) -> set[str]:
+    # Copies stay merged away only while the path kept instead is in the database
+    merged = load_merged()
+    kept = _existing_paths(connection, list(set(merged.values())))
+    return {path for path, kept_path in merged.items() if kept_path in kept}
+
+
+def _select_under(connection: sqlite3.Connection, root: str) -> dict:
+    if root == os.curdir:
+        # Relative paths share no prefix, see `json_manager._is_under`
+        rows = connection.execute(f"SELECT {COLUMNS} FROM tracks")
+        return {row[0]: _to_entry(row) for row in rows if _is_under(row[0], root)}
+    # The primary key index answers this range query without a full scan
+    prefix = root.rstrip(os.sep) + os.sep
+    upper = prefix[:-1] + chr(ord(os.sep) + 1)
+    rows = connection.execute(
+        f"SELECT {COLUMNS} FROM tracks WHERE path = ? OR (path >= ? AND path < ?)",
+        (root, prefix, upper),
+    )
+    return {row[0]: _to_entry(row) for row in rows}
+
+
+def repository_signature():
+    """
+    Returns a cheap value that changes whenever the database files change.
+
+    See `json_manager.repository_signature`.
+
+    Returns:
+        tuple: The (size, mtime_ns) of the database and its WAL file, or None for missing ones.
+    """
+    path_obj = Path(DEFAULT_DB_PATH).resolve()  # Normalize path for Windows compatibility
+    signature = []
+    for file_path in (path_obj, path_obj.with_name(path_obj.name + "-wal")):
+        try:
+            stat = file_path.stat()
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+async def load_repository():
+    """
+    Asynchronously opens the music library stored in the SQLite database.
+
+    The database is created with its schema if it does not exist yet. No track
+    is read up front: the returned `SqliteLibrary` queries the database as it is
+    used, so opening the library does not depend on its size.
+
+    Returns:
+        SqliteLibrary | Library: A mapping representing the music library, like
+            the one returned by `json_manager.load_repository`. Returns an empty
+            `Library` if the database cannot be opened.
+    """
+    try:
+        with metrics.span("repository_load"):
+            repo = SqliteLibrary(await asyncio.to_thread(_connect, False))
+        metrics.count("repository_load_bytes", sum(size for size, _ in filter(None, repository_signature())))
+        logger.info("Se ha cargado el repositorio.")
+        return repo
+    except sqlite3.Error as e:
+        logger.error(f"Error de la base de datos al cargar el repositorio en {DEFAULT_DB_PATH}: {e}")
+        return Library()
+    except OSError as e:
+        logger.error(f"Error del sistema al cargar el repositorio en {DEFAULT_DB_PATH}: {e}")
+        return Library()
+
+
+async def save_repository(data):
+    """
+    Asynchronously makes the database match the given music library.
+
+    Existing rows are updated in place, new ones are inserted and rows missing
+    from `data` are deleted, all in a single transaction. The database file is
+    never rewritten as a whole.
+
+    Args:
+        data (dict | Library): The music library data to be saved.
+    """
+    try:
+        with metrics.span("repository_save"):
+            await asyncio.to_thread(_run, _replace_all, data)
+        logger.info("Guardado exitosamente.")
+    except sqlite3.Error as e:
+        logger.error(f"Error de la base de datos al guardar el repositorio en {DEFAULT_DB_PATH}: {e}")
+    except OSError as e:
+        logger.error(f"Error del sistema al guardar el repositorio en {DEFAULT_DB_PATH}: {e}")
+
+
+async def record_changes(repo, upserts, removals=()):
+    """
+    Asynchronously persists a set of changes already applied to the repository.
+
+    The counterpart of `json_manager.record_changes`: only the changed rows are
+    written, in a single transaction.
+
+    Args:
+        repo (SqliteLibrary | Library | None): The whole repository, with the changes
+                               already applied. A `SqliteLibrary` stored them as
+                               they were made, so nothing is left to write.
+        upserts (dict): The entries added or replaced, keyed by path.
+        removals (Iterable[str]): The paths whose entries were removed.
+    """
+    if isinstance(repo, SqliteLibrary):
+        return
+    try:
+        await asyncio.to_thread(_run, _apply_changes, upserts, removals)
+        logger.info(f"Se han registrado {len(upserts) + len(removals)} cambios.")
+    except sqlite3.Error as e:
+        logger.error(f"Error de la base de datos al guardar los cambios en {DEFAULT_DB_PATH}: {e}")
+    except OSError as e:
+        logger.error(f"Error del sistema al guardar los cambios en {DEFAULT_DB_PATH}: {e}")
+
+
+async def update_repository(paths, mode="process", max_workers=None, repo=None):
+    """
+    Scans a directory for new audio files and inserts them into the database.
+
+    Every chunk produced by `scan_audio_files` is checked against the primary key
+    index, so the library is never loaded in memory. The metadata of the new files
+    is extracted in parallel and only the new rows are inserted.
+
+    Args:
+        paths (str): The path to the directory to scan for new audio files.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+        repo (SqliteLibrary | Library | None): An already loaded library to keep in
+                               sync with the new rows, so it does not need to be
+                               reloaded. A `SqliteLibrary` reads them from the database.
+
+    Returns:
+        SqliteLibrary | Library | None: `repo`, with the new tracks added.
+    """
+    async def new_paths():
+        async for chunk in scan_audio_files(paths):
+            existing = await asyncio.to_thread(_run, _existing_paths, chunk, connection=connection)
+            yield [file_path for file_path in chunk if file_path not in existing and file_path not in merged]
+
+    connection = None
+    try:
+        # One connection for the whole scan, used by one worker thread at a time
+        connection = await asyncio.to_thread(_connect, False)
+        merged = await asyncio.to_thread(_run, _merged_paths, connection=connection)
+        added = 0
+        async for batch in extract_metadata_parallel(new_paths(), mode=mode, max_workers=max_workers):
+            await asyncio.to_thread(_run, _apply_changes, batch, (), connection=connection)
+            if repo is not None and not isinstance(repo, SqliteLibrary):
+                repo.update(batch)
+            added += len(batch)
+
+        if not added:
+            logger.info("No hay archivos nuevos para agregar.")
+        else:
+            logger.info(f"Se han agregado {added} archivos nuevos.")
+    except FileNotFoundError as e:
+        logger.error(f"No se pudo escanear el directorio {paths}: {e}")
+    except Exception as e:
+        logger.error(f"Error inesperado al actualizar el repositorio: {e}")
+    finally:
+        if connection is not None:
+            connection.close()
+    return repo
+
+
+async def rescan_repository(paths, mode="process", max_workers=None):
+    """
+    Rescans a directory and brings its rows in sync with the disk.
+
+    Only the rows located under `paths` are read, and only the changed rows are
+    written. See `json_manager.plan_rescan` for how changes are detected.
+
+    Args:
+        paths (str): The path to the directory to rescan.
+        mode (str): Worker pool used for extraction, "process" or "thread".
+        max_workers (int | None): Number of workers. Defaults to the CPU count.
+    """
+    try:
+        connection = await asyncio.to_thread(_connect, False)
+        try:
+            entries = await asyncio.to_thread(_run, _select_under, str(Path(paths)), connection=connection)
+            merged = await asyncio.to_thread(_run, _merged_paths, connection=connection)
+            upserts, removals = await plan_rescan(entries, paths, mode, max_workers, merged)
+            if upserts or removals:
+                await asyncio.to_thread(_run, _apply_changes, upserts, removals, connection=connection)
+        finally:
+            connection.close()
+    except FileNotFoundError as e:
+        logger.error(f"No se pudo escanear el directorio {paths}: {e}")
+    except Exception as e:
+        logger.error(f"Error inesperado al reescanear el repositorio: {e}")
+
+
+async def album_sort(album: str) -> list[tuple[str, str]]:
+    """
+    Asynchronously generates a randomly shuffled playlist of songs from a specific album.
+
+    Args:
+        album (str): Name of the album to filter by.
+
+    Returns:
+        list[tuple[str, str]]: List of (path, title) tuples for the album, in random order.
+    """
+    path_title_pairs = await asyncio.to_thread(_run, _select_tracks, "album", album)
+    random.shuffle(path_title_pairs)
+    return path_title_pairs
+
+
+async def artist_sort(artist: str) -> list[tuple[str, str]]:
+    """
+    Asynchronously generates a randomly shuffled playlist of songs by a specific artist.
+
+    Args:
+        artist (str): Name of the artist to filter by.
+
+    Returns:
+        list[tuple[str, str]]: List of (path, title) tuples for the artist, in random order.
+    """
+    path_title_pairs = await asyncio.to_thread(_run, _select_tracks, "artist", artist)
+    random.shuffle(path_title_pairs)
+    return path_title_pairs
+
+
+async def title_search(prefix: str, limit: int = 50) -> list[tuple[str, str]]:
+    """
+    Asynchronously finds the songs whose title starts with `prefix`, in title order.
+
+    Args:
+        prefix (str): Case-sensitive beginning of the title.
+        limit (int): Maximum number of results.
+
+    Returns:
+        list[tuple[str, str]]: List of (path, title) tuples.
+    """
+    def select(connection: sqlite3.Connection) -> list[tuple[str, str]]:
+        return connection.execute(
+            "SELECT path, title FROM tracks WHERE title >= ? AND title < ? ORDER BY title LIMIT ?",
+            (prefix, prefix + "\U0010ffff", limit),
+        ).fetchall()
+
+    return await asyncio.to_thread(_run, select)
+
+
+async def albums() -> list[Facet]:
+    """
+    Asynchronously returns every album sorted by name, with its number of tracks and total duration.
+    """
+    return await asyncio.to_thread(_run, _select_facets, "album")
+
+
+async def artists() -> list[Facet]:
+    """
+    Asynchronously returns every artist sorted by name, with its number of tracks and total duration.
+    """
+    return await asyncio.to_thread(_run, _select_facets, "artist")
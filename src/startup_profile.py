@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+from rich.table import Table
+
+
+class StartupProfile:
+    """
+    Records how long each startup phase takes, for the `--profile-startup` report.
+
+    Phases are stored with their start and end times relative to `started`, so
+    phases that overlap, such as the repository load running behind a prompt,
+    show up as such in the report.
+    """
+
+    def __init__(self, started: float | None = None):
+        """
+        Args:
+            started (float | None): The `time.perf_counter()` value taken when the
+                                    process started. Defaults to now.
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.enabled = True
+        self.phases = []
+
+    def record(self, name: str, start: float, end: float | None = None) -> None:
+        """
+        Records a phase from `time.perf_counter()` values.
+
+        Args:
+            name (str): Name of the phase.
+            start (float): When the phase began.
+            end (float | None): When the phase ended. Defaults to now.
+        """
+        if self.enabled:
+            end = time.perf_counter() if end is None else end
+            self.phases.append((name, start - self.started, end - self.started))
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Records the time spent in a `with` block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    async def measure(self, name: str, awaitable):
+        """
+        Awaits `awaitable` and records the time until it finished.
+
+        Returns:
+            The result of `awaitable`.
+        """
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(name, start)
+
+    def report(self) -> Table:
+        """
+        Builds a table with every phase, in the order they started.
+        """
+        table = Table(title="Startup profile", title_style="bold blue", border_style="dim")
+        table.add_column("Phase", style="white")
+        table.add_column("Start (ms)", justify="right", style="grey78")
+        table.add_column("Duration (ms)", justify="right", style="white")
+        for name, start, end in sorted(self.phases, key=lambda phase: phase[1]):
+            table.add_row(name, f"{start * 1000:.1f}", f"{(end - start) * 1000:.1f}")
+        return table
@@ -0,0 +1,489 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import struct
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from .files_manager import AUDIO_EXTENSIONS, find_audio_files, fingerprint_files
+from .json_manager import reconcile, _is_under
+from .duplicates import merged_paths
+
+logger = logging.getLogger(__name__)
+
+# A batch is applied once no change was seen for this long...
+DEBOUNCE_SECONDS = 1.0
+# ...or once its first change is this old, even if changes keep coming
+MAX_BATCH_DELAY = 10.0
+# Seconds between two polls of the directory modification times
+POLL_INTERVAL = 2.0
+# Every this many polls, every file is checked too, to catch files rewritten in place
+FULL_POLL_EVERY = 30
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def is_audio_file(path: str) -> bool:
+    return path.lower().rsplit('.', 1)[-1] in AUDIO_EXTENSIONS
+
+
+class FileWatcher(ABC):
+    """
+    Collects the paths that changed under a set of library roots.
+
+    Use it as an asynchronous context manager and `await watcher.batch()` for
+    each group of changes. Changes are only reported once things calm down, so
+    copying an album produces a single batch instead of one per file.
+    """
+
+    def __init__(self, roots: list[str]):
+        self.roots = [str(Path(root).resolve()) for root in roots]  # Normalize path for Windows compatibility
+        self._files = set()
+        self._directories = set()
+        self._changed = asyncio.Event()
+        self._first_change = None
+        self._last_change = None
+
+    async def __aenter__(self) -> "FileWatcher":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    @abstractmethod
+    async def start(self) -> None:
+        """
+        Starts watching the roots.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Stops watching.
+        """
+
+    def report(self, path: str, is_directory: bool = False) -> None:
+        """
+        Records that a file, or everything under a directory, may have changed.
+        """
+        if is_directory:
+            self._directories.add(path)
+        elif is_audio_file(path):
+            self._files.add(path)
+        else:
+            return
+        now = time.monotonic()
+        if self._first_change is None:
+            self._first_change = now
+        self._last_change = now
+        self._changed.set()
+
+    async def batch(self, debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_BATCH_DELAY) -> tuple[set, set]:
+        """
+        Waits for changes and returns them once no new one came for `debounce`
+        seconds, or once the oldest one waited `max_delay` seconds.
+
+        Returns:
+            tuple[set, set]: The files and the directories that changed.
+        """
+        while True:
+            await self._changed.wait()
+            now = time.monotonic()
+            wait = min(self._last_change + debounce, self._first_change + max_delay) - now
+            if wait <= 0:
+                break
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                self._changed.set()  # Quiet for long enough: loop once more to return
+
+        files, directories = self._files, self._directories
+        self._files, self._directories = set(), set()
+        self._first_change = self._last_change = None
+        self._changed.clear()
+        return files, directories
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    Watches every directory of the roots with Linux inotify, read from the event loop.
+
+    The kernel reports each change as it happens, so nothing runs while the
+    library is left alone. Files are reported once they are closed after writing
+    or moved in, so a half-copied file is not read. New directories are watched
+    as soon as they appear and reported whole, since files may land in them
+    before their watch exists.
+    """
+
+    def __init__(self, roots: list[str]):
+        super().__init__(roots)
+        self._libc = None
+        self._loop = None
+        self._fd = None
+        self._watches = {}  # Watch descriptor -> directory
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux")
+
+    async def start(self) -> None:
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._fd = fd
+        try:
+            for root in self.roots:
+                await asyncio.to_thread(self._watch_tree, root)
+        except OSError:
+            self.close()
+            raise
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def _watch_tree(self, root: str) -> None:
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:  # fs.inotify.max_user_watches reached
+                    raise OSError(error, "Limite de inotify alcanzado (fs.inotify.max_user_watches)")
+                continue  # The directory vanished or cannot be read
+            self._watches[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    directories.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError as e:
+                logger.warning(f"No se pudo leer el directorio {directory}: {e}")
+
+    def _forget_tree(self, root: str) -> None:
+        for wd, directory in list(self._watches.items()):
+            if _is_under(directory, root):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Se han perdido eventos de inotify, se revisaran las carpetas completas.")
+                for root in self.roots:
+                    self.report(root, is_directory=True)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or mask & IN_DELETE_SELF:
+                continue
+
+            path = os.path.join(directory, name)
+            if not mask & IN_ISDIR:
+                if not mask & IN_CREATE:  # Wait for IN_CLOSE_WRITE, the file is still being written
+                    self.report(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._watch_tree(path)
+                except OSError as e:
+                    logger.warning(f"No se puede vigilar {path}: {e}")
+                self.report(path, is_directory=True)
+            elif mask & (IN_MOVED_FROM | IN_DELETE):
+                self._forget_tree(path)
+                self.report(path, is_directory=True)
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._watches.clear()
+
+
+class PollingWatcher(FileWatcher):
+    """
+    Watches the roots by comparing snapshots of the directory modification times.
+
+    Adding, removing or renaming a file changes the modification time of its
+    directory, so each poll costs one `os.stat` per directory and only the
+    directories that changed are listed again. Files rewritten in place do not
+    touch their directory, so every `FULL_POLL_EVERY` polls each file is checked too.
+    """
+
+    def __init__(self, roots: list[str], interval: float = POLL_INTERVAL, full_every: int = FULL_POLL_EVERY):
+        super().__init__(roots)
+        self.interval = interval
+        self.full_every = full_every
+        self._snapshot = {}  # Directory -> (mtime_ns, {audio file name: mtime_ns}, {subdirectory names})
+        self._task = None
+
+    async def start(self) -> None:
+        for root in self.roots:
+            await asyncio.to_thread(self._snapshot_tree, root)
+        self._task = asyncio.create_task(self._poll())
+
+    def _list(self, directory: str):
+        mtime = os.stat(directory).st_mtime_ns
+        files = {}
+        subdirectories = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.add(entry.name)
+                elif is_audio_file(entry.name):
+                    try:
+                        files[entry.name] = entry.stat().st_mtime_ns
+                    except OSError:
+                        pass
+        return mtime, files, subdirectories
+
+    def _snapshot_tree(self, root: str) -> None:
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            try:
+                self._snapshot[directory] = snapshot = self._list(directory)
+            except OSError:
+                continue
+            directories.extend(os.path.join(directory, name) for name in snapshot[2])
+
+    def _forget_tree(self, root: str) -> None:
+        for directory in [directory for directory in self._snapshot if _is_under(directory, root)]:
+            del self._snapshot[directory]
+
+    def _scan(self, full: bool) -> list[tuple[str, bool]]:
+        """
+        Compares the disk with the snapshot, updates it and returns the changes.
+        """
+        changes = []
+        for directory, (mtime, files, subdirectories) in list(self._snapshot.items()):
+            if directory not in self._snapshot:
+                continue  # Forgotten with a parent during this scan
+            try:
+                current_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._forget_tree(directory)
+                changes.append((directory, True))
+                continue
+
+            if current_mtime != mtime:
+                try:
+                    snapshot = self._list(directory)
+                except OSError:
+                    continue
+                self._snapshot[directory] = snapshot
+                for name in files.keys() | snapshot[1].keys():
+                    if files.get(name) != snapshot[1].get(name):
+                        changes.append((os.path.join(directory, name), False))
+                for name in subdirectories - snapshot[2]:
+                    self._forget_tree(os.path.join(directory, name))
+                    changes.append((os.path.join(directory, name), True))
+                for name in snapshot[2] - subdirectories:
+                    self._snapshot_tree(os.path.join(directory, name))
+                    changes.append((os.path.join(directory, name), True))
+            elif full:
+                for name, file_mtime in files.items():
+                    try:
+                        current = os.stat(os.path.join(directory, name)).st_mtime_ns
+                    except OSError:
+                        current = None
+                    if current != file_mtime:
+                        files[name] = current
+                        changes.append((os.path.join(directory, name), False))
+        return changes
+
+    async def _poll(self) -> None:
+        polls = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            polls += 1
+            for path, is_directory in await asyncio.to_thread(self._scan, polls % self.full_every == 0):
+                self.report(path, is_directory)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def create_watcher(roots: list[str]) -> FileWatcher:
+    """
+    Returns a started watcher for the roots: an `InotifyWatcher` on Linux, a
+    `PollingWatcher` elsewhere or when inotify cannot watch every directory.
+    """
+    if InotifyWatcher.available():
+        watcher = InotifyWatcher(roots)
+        try:
+            await watcher.start()
+            return watcher
+        except OSError as e:
+            logger.warning(f"No se puede usar inotify, se comprobaran las carpetas cada {POLL_INTERVAL} s: {e}")
+    watcher = PollingWatcher(roots)
+    await watcher.start()
+    return watcher
+
+
+def stored_roots(repo, roots: list[str], resolved: list[str]) -> dict[str, str]:
+    """
+    Works out how the repository spells each watched root in its keys.
+
+    Keys keep the folder as it was given when its songs were added, maybe
+    relative or through a symbolic link, while watchers report resolved paths.
+    Subfolders are never entered through links, so only the root part of a key
+    can differ: it is read from the first entry found under each root. Roots
+    without entries yet are spelled as given, as `scan_audio_files` would.
+
+    Args:
+        repo (dict | Library): The repository.
+        roots (list[str]): The roots, as given.
+        resolved (list[str]): The same roots, resolved, such as `FileWatcher.roots`.
+
+    Returns:
+        dict[str, str]: Resolved root -> root as spelled in the keys, "" for the
+        current directory.
+    """
+    pending = dict(zip(resolved, roots))
+    stored = {}
+    checked = set()
+    for path in repo:
+        if not pending:
+            break
+        directory = os.path.dirname(path)
+        if directory in checked:
+            continue
+        checked.add(directory)
+        real = os.path.realpath(directory)
+        for root in [root for root in pending if _is_under(real, root)]:
+            relative = os.path.relpath(real, root)
+            if relative == os.curdir:
+                stored[root] = directory
+            elif directory.endswith(os.sep + relative):
+                stored[root] = directory[:-len(relative) - 1]
+            else:
+                continue
+            del pending[root]
+    for root, given in pending.items():
+        given = str(Path(given))
+        stored[root] = "" if given == os.curdir else given
+    return stored
+
+
+def to_stored_path(path: str, stored: dict[str, str]) -> str:
+    """
+    Spells a resolved path reported by a watcher as the repository keys do, see `stored_roots`.
+    """
+    for root, prefix in stored.items():
+        if _is_under(path, root):
+            relative = path[len(root):].lstrip(os.sep)
+            if not relative:
+                return prefix or os.curdir
+            return prefix + os.sep + relative if prefix else relative
+    return path
+
+
+async def plan_changes(repo, files: set, directories: set, merged: set, mode: str = "thread"):
+    """
+    Works out the repository changes for a batch of changed files and directories.
+
+    Directories are expanded to the audio files they hold and to the entries
+    located under them, then everything goes through `json_manager.reconcile`,
+    so a renamed folder keeps its entries without reading any tag.
+
+    Returns:
+        tuple[dict, set, int]: The entries to add or replace, the paths to remove
+        and how many entries were moved.
+    """
+    paths = set(files)
+    for directory in directories:
+        if os.path.isdir(directory):
+            paths.update(await find_audio_files(directory))
+    if directories:
+        paths.update(await asyncio.to_thread(
+            lambda: [file_path for file_path in repo if any(_is_under(file_path, d) for d in directories)]
+        ))
+
+    on_disk = await fingerprint_files([path for path in paths if path not in merged])
+    vanished = {path for path in paths if path in repo and path not in on_disk}
+    return await reconcile(repo, on_disk, vanished, mode=mode)
+
+
+async def watch_repository(repository, roots: list[str], repo=None, stop_event: asyncio.Event | None = None):
+    """
+    Keeps the repository in sync with the library roots until `stop_event` is set.
+
+    Changes are gathered by the watcher from `create_watcher`, spelled as the
+    repository keys with `to_stored_path`, and applied in batches: each batch is reconciled with `plan_changes` and written at once
+    with the `record_changes` of the storage backend. Extraction uses a thread
+    pool, since batches are small and a process pool would take longer to start.
+
+    Args:
+        repository (module): The storage backend, `json_manager` or `sqlite_manager`.
+        roots (list[str]): The directories to watch.
+        repo (Library | None): The loaded repository, updated in place. Loaded
+                               from the backend when omitted.
+        stop_event (asyncio.Event | None): Stops watching when set. Without it,
+                                           watching goes on until cancelled.
+    """
+    if repo is None:
+        repo = await repository.load_repository()
+    stop_event = stop_event or asyncio.Event()
+    stopped = asyncio.create_task(stop_event.wait())
+
+    watcher = await create_watcher(roots)
+    stored = await asyncio.to_thread(stored_roots, repo, roots, watcher.roots)
+    logger.info(f"Vigilando {', '.join(watcher.roots)} con {type(watcher).__name__}.")
+    try:
+        while not stop_event.is_set():
+            batch = asyncio.create_task(watcher.batch())
+            await asyncio.wait({batch, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            if not batch.done():
+                batch.cancel()
+                break
+            files, directories = ({to_stored_path(path, stored) for path in paths} for paths in batch.result())
+            # Read for every batch, as the copies of a removed track must come back
+            merged = await asyncio.to_thread(merged_paths, repo)
+            upserts, removals, moved = await plan_changes(repo, files, directories, merged)
+            if not upserts and not removals:
+                continue
+            for file_path in removals:
+                del repo[file_path]
+            repo.update(upserts)
+            await repository.record_changes(repo, upserts, removals)
+            logger.info(
+                f"Cambios aplicados: {len(upserts) - moved} extraidos, {moved} movidos, "
+                f"{len(removals) - moved} eliminados."
+            )
+    finally:
+        stopped.cancel()
+        watcher.close()
@@ -0,0 +1,305 @@
+import os
+import json
+import asyncio
+import logging
+from pathlib import Path
+from .files_manager import fingerprint_files, file_fingerprint
+from .loudness import decodable, decode_file, run_decoders
+
+logger = logging.getLogger(__name__)
+
+# Use pathlib to ensure cross-platform compatibility
+DEFAULT_WAVEFORMS_PATH = str(Path.home() / "za_player" / "za_waveforms.bin")
+
+# Points of every waveform, whatever the length of the track: enough for a wide terminal
+WAVEFORM_POINTS = 512
+# Record: fingerprint (size, mtime_ns, inode), then the (min, max) peaks of every point as int8
+HEADER_SIZE = 24
+RECORD_SIZE = HEADER_SIZE + WAVEFORM_POINTS * 2
+# The sidecar is rewritten without stale records once they take this share of it
+COMPACT_RATIO = 0.5
+PROGRESS_EVERY = 1000
+# Bar heights used by `render_waveform`, from silence to full scale
+LEVELS = " ▁▂▃▄▅▆▇█"
+
+
+def _index_path(path_obj: Path) -> Path:
+    return path_obj.with_suffix(".index.jsonl")
+
+
+def _record_dtype():
+    import numpy as np
+    return np.dtype([
+        ("size", "<u8"), ("mtime_ns", "<i8"), ("inode", "<u8"),
+        ("peaks", "i1", (WAVEFORM_POINTS, 2)),
+    ])
+
+
+def compute_peaks(samples, points: int = WAVEFORM_POINTS):
+    """
+    Downsamples decoded audio to the minimum and maximum sample of `points` equal slices.
+
+    Channels are mixed by taking their extremes, and both peaks are scaled to
+    int8, so a waveform takes `2 * points` bytes whatever the length of the track.
+
+    Args:
+        samples (numpy.ndarray): Integer samples, shaped (frames,) or (frames, channels).
+        points (int): Number of slices.
+
+    Returns:
+        numpy.ndarray: A (points, 2) int8 array of (min, max) pairs.
+    """
+    import numpy as np
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    peaks = np.zeros((points, 2), dtype=np.int8)
+    if not len(samples):
+        return peaks
+    scale = 127 / (np.iinfo(samples.dtype).max + 1) if samples.dtype.kind in "iu" else 127
+    lows, highs = samples.min(axis=1), samples.max(axis=1)
+    # Tracks shorter than `points` frames fill the first slices only
+    starts = (np.arange(min(points, len(samples))) * len(samples)) // points
+    count = len(starts)
+    peaks[:count, 0] = np.round(np.minimum.reduceat(lows, starts) * scale)
+    peaks[:count, 1] = np.round(np.maximum.reduceat(highs, starts) * scale)
+    return peaks
+
+
+def analyze_file(path: str):
+    """
+    Decodes an audio file inside a worker and computes its waveform.
+
+    Returns:
+        tuple: The fingerprint of the file and its peaks as bytes, or (None, None)
+        when the file cannot be decoded.
+    """
+    try:
+        fingerprint, samples, _ = decode_file(path)
+        return fingerprint, compute_peaks(samples).tobytes()
+    except Exception as e:
+        logger.warning(f"No se pudo calcular la forma de onda de {path}: {e}")
+        return None, None
+
+
+class WaveformStore:
+    """
+    The waveforms of the library files, in a single sidecar file read through a memory map.
+
+    The sidecar is a table of fixed-size records, one per track, so the id of a
+    track is the position of its record. Each record holds the fingerprint of
+    its file followed by the (min, max) peaks of `WAVEFORM_POINTS` slices of the
+    track. A JSON Lines index next to it maps fingerprints to record ids, and is
+    rebuilt from the records themselves if it is lost or out of date.
+
+    Records are only appended, and the index line of a record is written after
+    the record, so an interrupted build keeps every complete record. Reading a
+    waveform maps the sidecar and returns a view of its record: nothing is
+    copied or decoded, and pages are shared by every process reading it.
+    """
+
+    def __init__(self, path: str = DEFAULT_WAVEFORMS_PATH):
+        self.path = Path(path).resolve()  # Normalize path for Windows compatibility
+        self.index = {}  # Fingerprint -> record id
+        self._records = None
+        self._file = None
+        self._index_file = None
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_WAVEFORMS_PATH) -> "WaveformStore":
+        """
+        Reads the index of the sidecar, rebuilding it from the records if needed.
+        """
+        store = cls(path)
+        index_path = _index_path(store.path)
+        try:
+            with open(index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        size, mtime_ns, inode, record = json.loads(line)
+                    except ValueError:
+                        continue  # Cut short by a crash, the record is recovered below
+                    store.index[(size, mtime_ns, inode)] = record
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"No se pudo leer {index_path}: {e}")
+
+        records = store.path.stat().st_size // RECORD_SIZE if store.path.exists() else 0
+        if len(set(store.index.values())) != records or any(record >= records for record in store.index.values()):
+            store._rebuild_index()
+        return store
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _map(self):
+        import numpy as np
+        records = self.path.stat().st_size // RECORD_SIZE if self.path.exists() else 0
+        if self._records is None or len(self._records) != records:
+            self._records = np.memmap(self.path, dtype=_record_dtype(), mode="r", shape=(records,)) if records else []
+        return self._records
+
+    def _rebuild_index(self) -> None:
+        """
+        Rebuilds the index from the fingerprints stored in the records. If a
+        fingerprint has several records, the newest one wins.
+        """
+        records = self._map()
+        self.index = {}
+        if len(records):
+            headers = zip(records["size"].tolist(), records["mtime_ns"].tolist(), records["inode"].tolist())
+            self.index = {fingerprint: record for record, fingerprint in enumerate(headers)}
+        temp_path = _index_path(self.path).with_suffix(".tmp")
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                for fingerprint, record in self.index.items():
+                    file.write(json.dumps([*fingerprint, record]) + "\n")
+            temp_path.replace(_index_path(self.path))
+        except OSError as e:
+            logger.error(f"No se pudo reconstruir {_index_path(self.path)}: {e}")
+        logger.info(f"Se ha reconstruido el indice de {len(self.index)} formas de onda.")
+
+    def track_id(self, path: str) -> int | None:
+        """
+        Returns the id of the record of a file, or None if it has no waveform or changed since.
+        """
+        fingerprint = file_fingerprint(path)
+        return self.index.get(fingerprint) if fingerprint is not None else None
+
+    def peaks(self, path: str):
+        """
+        Returns the waveform of a file without reading or decoding the file.
+
+        Returns:
+            numpy.ndarray | None: A read-only (WAVEFORM_POINTS, 2) int8 view of
+            the sidecar, with the (min, max) peak of every slice, or None if the
+            file has no waveform.
+        """
+        record = self.track_id(path)
+        if record is None:
+            return None
+        records = self._map()
+        if record >= len(records):
+            return None
+        return records[record]["peaks"]
+
+    def append(self, fingerprint: tuple, peaks: bytes) -> int:
+        """
+        Appends the waveform of a file to the sidecar and returns its id.
+        """
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+            # Drop a record cut short by a crash, so every record stays aligned
+            self._file.truncate(self._file.tell() // RECORD_SIZE * RECORD_SIZE)
+            self._file.seek(0, os.SEEK_END)
+            self._index_file = open(_index_path(self.path), "a", encoding="utf-8")
+        record = self._file.tell() // RECORD_SIZE
+        self._file.write(b"".join(value.to_bytes(8, "little", signed=True) for value in fingerprint) + peaks)
+        self._file.flush()
+        self._index_file.write(json.dumps([*fingerprint, record]) + "\n")
+        self._index_file.flush()
+        self.index[tuple(fingerprint)] = record
+        return record
+
+    def compact(self, fingerprints) -> None:
+        """
+        Rewrites the sidecar atomically with the records of `fingerprints` only,
+        dropping those of files that were modified or removed. Ids change.
+        """
+        self.close()
+        keep = [self.index[fingerprint] for fingerprint in map(tuple, fingerprints) if fingerprint in self.index]
+        records = self._map()
+        temp_path = self.path.with_suffix(".tmp")
+        try:
+            with open(temp_path, "wb") as file:
+                for record in sorted(keep):
+                    file.write(records[record].tobytes())
+            # The old sidecar must not stay mapped while it is replaced
+            del records
+            self._records = None
+            temp_path.replace(self.path)
+        except OSError as e:
+            logger.error(f"No se pudo compactar {self.path}: {e}")
+            return
+        # The index is rebuilt from the new records; until then, `load` would rebuild it too
+        self._rebuild_index()
+
+    def close(self) -> None:
+        for file in (self._file, self._index_file):
+            if file is not None:
+                file.close()
+        self._file = self._index_file = None
+
+
+def render_waveform(peaks, width: int = 80, position: float | None = None) -> str:
+    """
+    Draws a waveform as a line of block characters.
+
+    Args:
+        peaks (numpy.ndarray): (min, max) pairs, such as those of `WaveformStore.peaks`.
+        width (int): Number of characters.
+        position (float | None): Share of the track already played, from 0 to 1,
+                                 marked with a `┃` cursor.
+
+    Returns:
+        str: The waveform.
+    """
+    import numpy as np
+    amplitude = np.maximum(np.abs(peaks[:, 0].astype(np.int16)), np.abs(peaks[:, 1].astype(np.int16)))
+    width = max(min(width, len(amplitude)), 1)
+    columns = np.maximum.reduceat(amplitude, (np.arange(width) * len(amplitude)) // width)
+    levels = np.minimum(columns * (len(LEVELS) - 1) // 127, len(LEVELS) - 1)
+    bars = [LEVELS[level] for level in levels.tolist()]
+    if position is not None:
+        bars[min(int(min(max(position, 0.0), 1.0) * width), width - 1)] = "┃"
+    return "".join(bars)
+
+
+async def build_waveforms(
+    repo, max_workers: int = 1, rate: float | None = None, stop_event: asyncio.Event | None = None,
+) -> int:
+    """
+    Computes the waveform of every library track missing from the `WaveformStore`.
+
+    Files are decoded in the low priority workers of `loudness.run_decoders`,
+    one file per worker at a time, and the job can be throttled so it runs
+    during playback. Tracks longer than `loudness.MAX_DECODE_SECONDS` are
+    skipped, see `loudness.decodable`.
+    Waveforms are appended to the sidecar one by one, so an interrupted build
+    resumes where it stopped.
+
+    Args:
+        repo (dict | Library): The repository.
+        max_workers (int): Number of worker processes.
+        rate (float | None): Maximum tracks started per second. Unlimited by default.
+        stop_event (asyncio.Event | None): Stops the build once set, after the
+                                           tracks being decoded.
+
+    Returns:
+        int: The number of waveforms computed.
+    """
+    store = await asyncio.to_thread(WaveformStore.load)
+    fingerprints = await fingerprint_files(list(repo))
+    pending = decodable(repo, [path for path, fingerprint in fingerprints.items() if fingerprint not in store.index])
+    logger.info(f"{len(fingerprints) - len(pending)} formas de onda ya calculadas, {len(pending)} pendientes.")
+
+    built = 0
+    try:
+        async for fingerprint, peaks in run_decoders(analyze_file, pending, max_workers, rate, stop_event):
+            if fingerprint is None:
+                continue
+            store.append(fingerprint, peaks)
+            built += 1
+            if built % PROGRESS_EVERY == 0:
+                logger.info(f"Se han calculado {built} de {len(pending)} formas de onda.")
+    finally:
+        store.close()
+
+    live = set(fingerprints.values())
+    stale = sum(fingerprint not in live for fingerprint in store.index)
+    records = store.path.stat().st_size // RECORD_SIZE if store.path.exists() else 0
+    if records and (records - len(store.index) + stale) / records > COMPACT_RATIO:
+        await asyncio.to_thread(store.compact, live)
+    logger.info(f"Se han calculado {built} formas de onda.")
+    return built
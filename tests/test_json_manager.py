@@ -0,0 +1,60 @@
+import asyncio
+import json
+from src import json_manager
+from src.json_manager import _journal_path, load_repository, record_changes, save_repository
+
+ENTRY = ["Song", "Album", "Artist", 120.0, [1, 2, 3]]
+
+
+def _load(path):
+    return asyncio.run(load_repository(str(path)))
+
+
+def test_missing_repository_is_created_empty(tmp_path):
+    path = tmp_path / "repo.json"
+    assert len(_load(path)) == 0
+    assert json.loads(path.read_text()) == {}
+
+
+def test_changes_are_replayed_over_the_snapshot(tmp_path):
+    path = tmp_path / "repo.json"
+    asyncio.run(save_repository({"/a.mp3": ENTRY, "/b.mp3": ENTRY}, str(path)))
+    asyncio.run(record_changes(None, {"/c.mp3": ENTRY}, ["/a.mp3"], path=str(path)))
+    asyncio.run(record_changes(None, {"/a.mp3": ["New", None, None, 1.0, None]}, path=str(path)))
+
+    # The snapshot is untouched, the changes only live in the journal
+    assert set(json.loads(path.read_text())) == {"/a.mp3", "/b.mp3"}
+    repo = _load(path)
+    assert sorted(repo) == ["/a.mp3", "/b.mp3", "/c.mp3"]
+    assert repo["/a.mp3"] == ("New", None, None, 1.0, None)
+    assert repo["/c.mp3"] == ("Song", "Album", "Artist", 120.0, (1, 2, 3))
+
+
+def test_save_empties_the_journal(tmp_path):
+    path = tmp_path / "repo.json"
+    asyncio.run(record_changes(None, {"/a.mp3": ENTRY}, path=str(path)))
+    assert _journal_path(path).exists()
+    repo = _load(path)
+    asyncio.run(save_repository(repo, str(path)))
+    assert not _journal_path(path).exists()
+    assert list(_load(path)) == ["/a.mp3"]
+
+
+def test_torn_record_is_ignored_and_not_glued_to_the_next(tmp_path):
+    path = tmp_path / "repo.json"
+    asyncio.run(record_changes(None, {"/a.mp3": ENTRY}, path=str(path)))
+    with open(_journal_path(path), "a", encoding="utf-8") as file:
+        file.write('["set", "/torn.mp3", ["Cut')  # A crash in the middle of a write
+    asyncio.run(record_changes(None, {"/b.mp3": ENTRY}, path=str(path)))
+    assert sorted(_load(path)) == ["/a.mp3", "/b.mp3"]
+
+
+def test_large_journal_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_manager, "JOURNAL_MIN_COMPACT_BYTES", 0)
+    path = tmp_path / "repo.json"
+    asyncio.run(save_repository({"/a.mp3": ENTRY}, str(path)))
+    repo = _load(path)
+    repo["/b.mp3"] = ENTRY
+    asyncio.run(record_changes(repo, {"/b.mp3": ENTRY}, path=str(path)))
+    assert not _journal_path(path).exists()
+    assert set(json.loads(path.read_text())) == {"/a.mp3", "/b.mp3"}
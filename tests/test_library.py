@@ -0,0 +1,96 @@
+from src.library import Facet, Library, Summary
+
+
+def _entries():
+    return {
+        "/music/a/1.mp3": ("One", "Album A", "Artist X", 100.0, (10, 20, 30)),
+        "/music/a/2.mp3": ("Two", "Album A", "Artist X", 50.0, None),
+        "/music/b/3.mp3": ("Three", "Album B", "Artist Y", 25.5, None),
+        "/music/b/4.mp3": ("Four", "Album B", "Artist X", 10.0, (1, 2, 3)),
+    }
+
+
+def test_entries_round_trip():
+    entries = _entries()
+    library = Library(entries)
+    assert len(library) == 4
+    assert library.to_dict() == entries
+    assert "/music/a/1.mp3" in library
+    assert "/music/c/1.mp3" not in library
+
+
+def test_delete_moves_last_row_into_the_gap():
+    library = Library(_entries())
+    del library["/music/a/1.mp3"]
+    assert len(library) == 3
+    # The last row took the place of the removed one and is still found by path
+    assert library["/music/b/4.mp3"] == ("Four", "Album B", "Artist X", 10.0, (1, 2, 3))
+    assert library.item_at(0)[0] == "/music/b/4.mp3"
+    assert "/music/a/1.mp3" not in library
+    expected = _entries()
+    del expected["/music/a/1.mp3"]
+    assert library.to_dict() == expected
+
+
+def test_delete_last_row_and_every_row():
+    library = Library(_entries())
+    del library["/music/b/4.mp3"]
+    assert list(library) == ["/music/a/1.mp3", "/music/a/2.mp3", "/music/b/3.mp3"]
+    for path in list(library):
+        del library[path]
+    assert len(library) == 0
+    assert library.to_dict() == {}
+
+
+def test_index_follows_deletes():
+    library = Library(_entries())
+    index = library.index
+    del library["/music/a/1.mp3"]  # Moves "/music/b/4.mp3" to row 0
+    assert sorted(index.album_tracks("Album B")) == [("/music/b/3.mp3", "Three"), ("/music/b/4.mp3", "Four")]
+    assert index.album_tracks("Album A") == [("/music/a/2.mp3", "Two")]
+    assert index.albums() == [Facet("Album A", 1, 50.0), Facet("Album B", 2, 35.5)]
+    assert index.artists() == [Facet("Artist X", 2, 60.0), Facet("Artist Y", 1, 25.5)]
+
+    del library["/music/a/2.mp3"]
+    assert index.album_tracks("Album A") == []
+    assert [facet.name for facet in index.albums()] == ["Album B"]
+
+
+def test_index_follows_inserts_and_replacements():
+    library = Library(_entries())
+    index = library.index
+    library["/music/a/2.mp3"] = ("Two", "Album C", "Artist Y", 50.0)
+    library["/music/c/5.mp3"] = ("Five", "Album C", "Artist Z", 5.0)
+    assert sorted(index.album_tracks("Album C")) == [("/music/a/2.mp3", "Two"), ("/music/c/5.mp3", "Five")]
+    assert index.album_tracks("Album A") == [("/music/a/1.mp3", "One")]
+    assert index.albums() == [Facet("Album A", 1, 100.0), Facet("Album B", 2, 35.5), Facet("Album C", 2, 55.0)]
+    assert sorted(path for path, _ in index.artist_tracks("Artist Y")) == ["/music/a/2.mp3", "/music/b/3.mp3"]
+
+
+def test_index_built_after_changes_matches_maintained_one():
+    maintained = Library(_entries())
+    maintained.index
+    rebuilt = Library(_entries())
+    for library in (maintained, rebuilt):
+        del library["/music/a/2.mp3"]
+        library["/music/d/6.mp3"] = ("Six", "Album A", "Artist Z", 1.0)
+        del library["/music/b/3.mp3"]
+    assert maintained.index.albums() == rebuilt.index.albums()
+    assert maintained.index.artists() == rebuilt.index.artists()
+    assert maintained.summary() == rebuilt.summary() == Summary(3, 2, 2, 111.0)
+
+
+def test_order_by():
+    library = Library(_entries())
+    rows = library.order_by("duration")
+    assert [library.item_at(row)[0] for row in rows] == [
+        "/music/b/4.mp3", "/music/b/3.mp3", "/music/a/2.mp3", "/music/a/1.mp3",
+    ]
+    rows = library.order_by("title", reverse=True)
+    assert [library.item_at(row)[1][0] for row in rows] == ["Two", "Three", "One", "Four"]
+
+
+def test_paths_named():
+    library = Library(_entries())
+    library["/other/1.mp3"] = ("Copy", None, None, 0.0)
+    assert library.paths_named({"1.mp3"}) == {"1.mp3": ["/music/a/1.mp3", "/other/1.mp3"]}
@@ -0,0 +1,72 @@
+import os
+from src.playlist_files import PlaylistEntry, read_m3u, resolve_playlist, write_m3u
+
+REPO = {
+    "/music/Artist/Album/01 Song.mp3": ("Song", "Album", "Artist", 181.4),
+    "/music/Other/Album/01 Song.mp3": ("Other song", "Album", "Other", 90.0),
+    "/music/Artist/Album/02 Next.flac": ("Next", "Album", None, 60.0),
+}
+
+
+def test_write_and_read_round_trip(tmp_path):
+    path = tmp_path / "list.m3u8"
+    tracks = [(file_path, entry[0]) for file_path, entry in REPO.items()]
+    assert write_m3u(str(path), tracks, REPO) == 3
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[:3] == ["#EXTM3U", "#EXTINF:181,Artist - Song", "/music/Artist/Album/01 Song.mp3"]
+    assert lines[5] == "#EXTINF:60,Next"
+    assert list(read_m3u(str(path))) == [
+        PlaylistEntry("/music/Artist/Album/01 Song.mp3", "Artist - Song", 181.0),
+        PlaylistEntry("/music/Other/Album/01 Song.mp3", "Other - Other song", 90.0),
+        PlaylistEntry("/music/Artist/Album/02 Next.flac", "Next", 60.0),
+    ]
+
+
+def test_read_resolves_relative_entries_and_urls(tmp_path):
+    path = tmp_path / "list.m3u"
+    path.write_text(
+        "#EXTM3U\n\nsub/a.mp3\n../b.mp3\nfile:///music/c%20d.mp3\n"
+        "#EXTINF:10,Radio\nhttp://radio.example/stream\n#EXTINF:-1,E\ne.mp3\n",
+        encoding="utf-8",
+    )
+    entries = list(read_m3u(str(path)))
+    assert [entry.path for entry in entries] == [
+        str(tmp_path / "sub" / "a.mp3"),
+        str(tmp_path.parent / "b.mp3"),
+        "/music/c d.mp3",
+        str(tmp_path / "e.mp3"),
+    ]
+    # The #EXTINF line of the skipped URL does not leak into the next entry
+    assert entries[2].title is None and entries[3].title == "E"
+    assert [entry.path for entry in read_m3u(str(path), keys=True)] == ["sub/a.mp3", "../b.mp3", "/music/c d.mp3", "e.mp3"]
+
+
+def test_write_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "out" / "list.m3u8"
+    path.parent.mkdir()
+    write_m3u(str(path), [("music/a.mp3", "A")], absolute=True)
+    assert [entry.path for entry in read_m3u(str(path))] == [str(tmp_path / "music" / "a.mp3")]
+    assert not (tmp_path / "out" / "list.m3u8.tmp").exists()
+
+
+def test_resolve_by_longest_common_suffix(tmp_path):
+    entries = [
+        PlaylistEntry("/music/Artist/Album/02 Next.flac", None, None),
+        PlaylistEntry("/home/old/Musica/Other/Album/01 Song.mp3", None, None),
+        PlaylistEntry(str(tmp_path / "gone.mp3"), None, None),
+    ]
+    tracks, missing = resolve_playlist(entries, REPO)
+    assert tracks == [
+        ("/music/Artist/Album/02 Next.flac", "Next"),
+        ("/music/Other/Album/01 Song.mp3", "Other song"),
+    ]
+    assert missing == 1
+
+
+def test_resolve_keeps_existing_files_outside_the_repository(tmp_path):
+    song = tmp_path / "loose.mp3"
+    song.write_bytes(b"")
+    tracks, missing = resolve_playlist([PlaylistEntry(str(song), None, None)], REPO)
+    assert tracks == [(str(song), "loose")] and missing == 0
+    assert os.path.isfile(tracks[0][0])
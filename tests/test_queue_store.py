@@ -0,0 +1,108 @@
+import random
+from src.queue_store import CHECKPOINT_SLOT, QueueStore
+from src.sorts import shuffle_stream
+
+REPO = {f"music/{i:02}.mp3": (f"Song {i}", f"Album {i % 3}", f"Artist {i % 4}", 60.0) for i in range(20)}
+
+
+def _saved_queue(path, tracks):
+    store = QueueStore(str(path))
+    store.new_queue()
+    store.save(tracks, REPO)
+    return store
+
+
+def test_queue_keeps_relative_keys(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tracks = [(key, entry[0]) for key, entry in list(REPO.items())[:5]]
+    store = _saved_queue(tmp_path / "queue" / "q.m3u8", tracks)
+    store.close()
+
+    loaded = QueueStore(str(tmp_path / "queue" / "q.m3u8"))
+    assert loaded.load()
+    assert loaded.queue_id == store.queue_id
+    assert loaded.shuffle is None
+    assert list(loaded.tracks(repo=REPO)) == [(key, title, index) for index, (key, title) in enumerate(tracks)]
+    assert list(loaded.tracks(3, repo=REPO))[0] == (tracks[3][0], tracks[3][1], 3)
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    store = _saved_queue(tmp_path / "q.m3u8", [(key, entry[0]) for key, entry in REPO.items()])
+    store.checkpoint(4, 12.5)
+    store.checkpoint(7, 30.0)
+    store.close()
+
+    loaded = QueueStore(str(tmp_path / "q.m3u8"))
+    assert loaded.load()
+    assert (loaded.index, loaded.offset) == (7, 30.0)
+    assert next(loaded.tracks(repo=REPO))[2] == 7
+
+
+def test_torn_checkpoint_falls_back_to_the_other_slot(tmp_path):
+    store = _saved_queue(tmp_path / "q.m3u8", [(key, entry[0]) for key, entry in REPO.items()])
+    store.checkpoint(4, 12.5)
+    store.checkpoint(7, 30.0)
+    store.close()
+
+    # The last write went to the slot of the current sequence number
+    with open(store.checkpoint_path, "r+b") as file:
+        file.seek((store._sequence % 2) * CHECKPOINT_SLOT.size + 20)
+        file.write(b"\xff\xff")
+    loaded = QueueStore(str(tmp_path / "q.m3u8"))
+    assert loaded.load()
+    assert (loaded.index, loaded.offset) == (4, 12.5)
+
+
+def test_unsaved_queue_does_not_replace_the_saved_one(tmp_path):
+    store = _saved_queue(tmp_path / "q.m3u8", [("music/00.mp3", "Song 0"), ("music/01.mp3", "Song 1")])
+    store.checkpoint(1, 5.0)
+    saved_id = store.queue_id
+    store.new_queue()
+    store.checkpoint(0, 1.0)  # Only kept in memory until the new queue is written
+    store.close()
+
+    loaded = QueueStore(str(tmp_path / "q.m3u8"))
+    assert loaded.load()
+    assert (loaded.queue_id, loaded.index, loaded.offset) == (saved_id, 1, 5.0)
+
+
+def test_checkpoints_of_an_older_queue_are_ignored(tmp_path):
+    store = _saved_queue(tmp_path / "q.m3u8", [("music/00.mp3", "Song 0")])
+    store.checkpoint(0, 40.0)
+    store.new_queue()
+    store.save([("music/01.mp3", "Song 1")])
+    store.close()
+
+    loaded = QueueStore(str(tmp_path / "q.m3u8"))
+    assert loaded.load()
+    assert (loaded.index, loaded.offset) == (0, 0.0)
+
+
+def test_shuffle_is_saved_as_its_seed(tmp_path):
+    store = QueueStore(str(tmp_path / "q.m3u8"))
+    store.new_queue()
+    store.save_shuffle(0xBEEF, spread=True)
+    store.checkpoint(5, 2.0)
+    store.close()
+    assert len((tmp_path / "q.m3u8").read_text().splitlines()) == 3
+
+    loaded = QueueStore(str(tmp_path / "q.m3u8"))
+    assert loaded.load()
+    assert loaded.shuffle == (0xBEEF, True)
+    expected = list(shuffle_stream(REPO, True, random.Random(0xBEEF)))
+    assert [(path, title) for path, title, _ in loaded.tracks(repo=REPO)] == expected[5:]
+    assert next(loaded.tracks(repo=REPO))[2] == 5
+
+
+def test_finished_queue_starts_over(tmp_path):
+    store = _saved_queue(tmp_path / "q.m3u8", [("music/00.mp3", "Song 0")])
+    store.checkpoint(3, 9.0)
+    store.progress(None, 0.0)
+    store.close()
+    loaded = QueueStore(str(tmp_path / "q.m3u8"))
+    assert loaded.load()
+    assert (loaded.index, loaded.offset) == (0, 0.0)
+
+
+def test_missing_queue(tmp_path):
+    assert not QueueStore(str(tmp_path / "none.m3u8")).load()
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from src import shard_manager
+from src.json_manager import _journal_path
+
+ENTRY = ["Song", "Album", "Artist", 30.0, None]
+
+
+@pytest.fixture
+def shards_dir(tmp_path, monkeypatch):
+    shards = tmp_path / "shards"
+    monkeypatch.setattr(shard_manager, "DEFAULT_SHARDS_DIR", str(shards))
+    return shards
+
+
+@pytest.fixture
+def music(tmp_path):
+    for folder in ("music/rock/old", "music/rock/new", "music/jazz"):
+        (tmp_path / folder).mkdir(parents=True)
+    return (tmp_path / "music").resolve()
+
+
+def _claim(root):
+    return asyncio.run(shard_manager.claim_root(str(root)))
+
+
+def _record(upserts, removals=()):
+    asyncio.run(shard_manager.record_changes(None, upserts, removals))
+
+
+def test_missing_folder_is_not_claimed(shards_dir, tmp_path):
+    with pytest.raises(NotADirectoryError):
+        _claim(tmp_path / "nowhere")
+    assert shard_manager.read_manifest() == {}
+
+
+def test_folders_under_a_root_belong_to_its_shard(shards_dir, music):
+    root = _claim(music / "rock")
+    assert root == str(music / "rock")
+    assert _claim(music / "rock" / "old") == root
+    assert list(shard_manager.read_manifest()) == [root]
+
+
+def test_changes_go_to_the_shard_of_their_root(shards_dir, music):
+    rock, jazz = _claim(music / "rock"), _claim(music / "jazz")
+    _record({str(music / "rock/a.mp3"): ENTRY, str(music / "jazz/b.mp3"): ENTRY, "/elsewhere/c.mp3": ENTRY})
+
+    assert list(asyncio.run(shard_manager.load_repository([rock]))) == [str(music / "rock/a.mp3")]
+    assert list(asyncio.run(shard_manager.load_repository([str(music / "jazz")]))) == [str(music / "jazz/b.mp3")]
+    assert sorted(asyncio.run(shard_manager.load_repository())) == [str(music / "jazz/b.mp3"), str(music / "rock/a.mp3")]
+    assert sorted(shard_manager.roots()) == [(jazz, 1, 30.0), (rock, 1, 30.0)]
+
+
+def test_parent_root_folds_nested_shards(shards_dir, music):
+    old, new = _claim(music / "rock/old"), _claim(music / "rock/new")
+    jazz = _claim(music / "jazz")
+    _record({str(music / "rock/old/a.mp3"): ENTRY, str(music / "rock/new/b.mp3"): ENTRY})
+    _record({}, [str(music / "rock/new/b.mp3")])
+    _record({str(music / "rock/new/c.mp3"): ENTRY})
+    shards = shard_manager.read_manifest()
+    folded = [shards_dir / shards[root]["file"] for root in (old, new)]
+
+    rock = _claim(music / "rock")
+    shards = shard_manager.read_manifest()
+    assert sorted(shards) == sorted([rock, jazz])
+    assert shards[rock]["tracks"] == 2
+    # The nested shards and their journals are gone, their tracks live on in the new shard
+    for snapshot in folded:
+        assert not snapshot.exists()
+        assert not _journal_path(snapshot).exists()
+    assert sorted(asyncio.run(shard_manager.load_repository([rock]))) == [
+        str(music / "rock/new/c.mp3"), str(music / "rock/old/a.mp3"),
+    ]
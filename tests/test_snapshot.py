@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from src import snapshot_manager
+from src.library import Library, Summary
+from src.snapshot import MappedLibrary, write_snapshot
+
+ENTRIES = {
+    "/music/b/2.mp3": ("Two", "Album B", "Artist Y", 20.0, (200, 2, 22)),
+    "/music/a/1.mp3": ("One", "Album A", "Artist X", 10.0, None),
+    "/music/a/3.mp3": ("Three", None, None, 30.5, (300, 3, 33)),
+    "/music/\udcff/4.mp3": ("Four", "Album A", "Artist X", 0.0, None),  # Not valid UTF-8
+}
+
+
+@pytest.fixture
+def mapped(tmp_path):
+    path = tmp_path / "repo.zsnap"
+    with open(path, "wb") as file:
+        write_snapshot(file, ENTRIES)
+    return MappedLibrary(str(path))
+
+
+def test_snapshot_round_trip(mapped):
+    assert len(mapped) == 4
+    assert mapped.to_dict() == ENTRIES
+    assert list(mapped) == list(ENTRIES)
+    for path, entry in ENTRIES.items():
+        assert mapped[path] == entry
+    assert "/music/a/2.mp3" not in mapped
+    with pytest.raises(KeyError):
+        mapped["/music/a/2.mp3"]
+
+
+def test_summary_is_read_from_the_header(mapped):
+    assert mapped.summary() == Summary(4, 3, 3, 60.5) == Library(ENTRIES).summary()
+    assert mapped._library is None
+
+
+def test_order_by_path_uses_the_path_index(mapped):
+    rows = mapped.order_by("path")
+    assert [mapped.item_at(row)[0] for row in rows] == sorted(ENTRIES)
+    assert mapped._library is None
+    assert [mapped.item_at(row)[0] for row in mapped.order_by("path", reverse=True)] == sorted(ENTRIES, reverse=True)
+
+
+def test_changes_overlay_the_snapshot(mapped):
+    expected = dict(ENTRIES)
+    mapped["/music/a/1.mp3"] = ["Uno", "Album A", "Artist X", 11.0, None]
+    expected["/music/a/1.mp3"] = ("Uno", "Album A", "Artist X", 11.0, None)
+    del mapped["/music/b/2.mp3"]
+    del expected["/music/b/2.mp3"]
+    mapped["/music/c/5.mp3"] = ("Five", "Album C", "Artist Z", 5.0, None)
+    expected["/music/c/5.mp3"] = ("Five", "Album C", "Artist Z", 5.0, None)
+    mapped["/music/c/6.mp3"] = ("Six", "Album C", "Artist Z", 6.0, None)
+    del mapped["/music/c/6.mp3"]
+
+    assert mapped._library is None
+    assert len(mapped) == 4
+    assert mapped.to_dict() == expected
+    assert "/music/b/2.mp3" not in mapped and "/music/c/6.mp3" not in mapped
+    assert [mapped.item_at(row) for row in range(len(mapped))] == list(expected.items())
+    with pytest.raises(KeyError):
+        del mapped["/music/b/2.mp3"]
+
+    # Operations needing every track decode the overlaid library once
+    assert mapped.summary() == Library(expected).summary()
+    assert sorted(path for path, _ in mapped.index.album_tracks("Album A")) == ["/music/a/1.mp3", "/music/\udcff/4.mp3"]
+    mapped["/music/d/7.mp3"] = ("Seven", None, None, 7.0, None)
+    expected["/music/d/7.mp3"] = ("Seven", None, None, 7.0, None)
+    assert mapped.to_dict() == expected
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "bad.zsnap"
+    path.write_bytes(b"{}" * 64)
+    with pytest.raises(ValueError):
+        MappedLibrary(str(path))
+
+
+def test_snapshot_repository_with_journal(tmp_path):
+    json_path, snapshot_path = str(tmp_path / "repo.json"), str(tmp_path / "repo.zsnap")
+    # The JSON files are strict UTF-8, so every path here is valid UTF-8
+    entries = {path: entry for path, entry in ENTRIES.items() if path.isascii()}
+    asyncio.run(snapshot_manager.save_repository(entries, snapshot_path))
+    asyncio.run(snapshot_manager.record_changes(
+        None, {"/music/c/5.mp3": ["Five", None, None, 5.0, None]}, ["/music/a/1.mp3"], path=snapshot_path,
+    ))
+    repo = asyncio.run(snapshot_manager.load_repository(snapshot_path))
+    assert isinstance(repo, MappedLibrary)
+    expected = {path: entry for path, entry in entries.items() if path != "/music/a/1.mp3"}
+    expected["/music/c/5.mp3"] = ("Five", None, None, 5.0, None)
+    assert repo.to_dict() == expected
+
+    # The JSON conversion keeps the journaled changes, and converting back gives the same library
+    assert asyncio.run(snapshot_manager.snapshot_to_json(snapshot_path, json_path)) == 3
+    assert asyncio.run(snapshot_manager.json_to_snapshot(json_path, str(tmp_path / "copy.zsnap"))) == 3
+    copy = asyncio.run(snapshot_manager.load_repository(str(tmp_path / "copy.zsnap")))
+    assert copy.to_dict() == expected
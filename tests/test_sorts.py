@@ -0,0 +1,64 @@
+import random
+from src.library import Library
+from src.sorts import ARTIST_SPREAD, ALBUM_SPREAD, _spread, index_permutation, shuffle_stream
+
+
+def _repo(artists=10, albums_per_artist=2, tracks_per_album=5):
+    repo = {}
+    for artist in range(artists):
+        for album in range(albums_per_artist):
+            for track in range(tracks_per_album):
+                path = f"/music/{artist}/{album}/{track}.mp3"
+                repo[path] = (f"T{artist}.{album}.{track}", f"Album {artist}.{album}", f"Artist {artist}", 60.0)
+    return repo
+
+
+def test_index_permutation_is_a_permutation():
+    for n in (0, 1, 2, 3, 4, 5, 7, 8, 100, 257, 1000):
+        assert sorted(index_permutation(n, random.Random(n))) == list(range(n))
+
+
+def test_index_permutation_depends_on_the_seed_only():
+    first = list(index_permutation(500, random.Random(7)))
+    assert list(index_permutation(500, random.Random(7))) == first
+    assert list(index_permutation(500, random.Random(8))) != first
+    assert first != list(range(500))
+
+
+def test_shuffle_stream_plays_every_track_once():
+    repo = _repo()
+    for spread in (False, True):
+        tracks = list(shuffle_stream(repo, spread, random.Random(1)))
+        assert sorted(path for path, _ in tracks) == sorted(repo)
+        assert all(repo[path][0] == title for path, title in tracks)
+
+
+def test_shuffle_stream_reads_a_library_by_row():
+    repo = _repo()
+    # Rows of a Library follow insertion order, so both streams draw the same permutation
+    assert list(shuffle_stream(Library(repo), True, random.Random(3))) == list(
+        shuffle_stream(repo, True, random.Random(3))
+    )
+
+
+def test_spread_keeps_artists_and_albums_apart():
+    repo = _repo()
+    paths = [path for path, _ in shuffle_stream(repo, True, random.Random(5))]
+    artists = [repo[path][2] for path in paths]
+    albums = [repo[path][1] for path in paths]
+    # Only the tail, where few artists are left, may be forced to repeat
+    body = len(paths) - 2 * ALBUM_SPREAD
+    for position in range(body):
+        assert artists[position] not in artists[max(0, position - ARTIST_SPREAD):position]
+        assert albums[position] not in albums[max(0, position - ALBUM_SPREAD):position]
+
+
+def test_spread_gives_up_after_hold_back():
+    tracks = [(f"/{i}.mp3", (str(i), "Album", "Artist", 1.0)) for i in range(10)]
+    # Every track conflicts with the previous one, so they play in order anyway
+    assert [path for path, _ in _spread(tracks, 4, 8, 3)] == [path for path, _ in tracks]
+
+
+def test_spread_ignores_unknown_tags():
+    tracks = [(f"/{i}.mp3", (str(i), "Desconocido", None, 1.0)) for i in range(5)]
+    assert [title for _, title in _spread(iter(tracks), 4, 8, 1)] == ["0", "1", "2", "3", "4"]